@@ -0,0 +1,225 @@
+import os
+from datetime import date, timedelta
+import numpy as np
+from query_cache import QueryCache
+from rollups import COMPLETED
+from versions import range_version, tracking_version
+
+# Heatmap and trend aggregation over raw completions and occurrences. Both
+# tables are indexed by date, so SQLite hands back one row per day with that
+# day's habit ids as a group_concat string; NumPy parses the ids without
+# building a Python object per row, and everything after that is bincount
+# and cumsum.
+
+ANALYTICS_CACHE_ENTRIES = int(os.getenv('ANALYTICS_CACHE_ENTRIES', 64))
+ANALYTICS_CACHE_BYTES = int(os.getenv('ANALYTICS_CACHE_BYTES', 16 * 1024 * 1024))
+
+HEATMAP_DAYS = 365
+TREND_WEEKS = 26
+
+# Weeks averaged by the smoothed trend line
+ROLLING_WEEKS = 4
+
+# Longest window /analytics, the heatmap and the trends aggregate in one request
+MAX_ANALYTICS_DAYS = 3 * 366
+
+# Intensity levels of a heatmap cell, GitHub style: 0 for none, then quartiles
+HEATMAP_LEVELS = 4
+
+EPOCH = date(1970, 1, 1).toordinal()
+
+# Per-day (date, count, group_concat of habit ids) over a window, for all
+# habits or one
+COMPLETIONS_BY_DAY = f"""
+    SELECT tracked_date, COUNT(*), group_concat(habit_id) FROM habit_tracking
+    WHERE status = '{COMPLETED}' AND tracked_date >= ? AND tracked_date < ?
+    AND habit_id IS NOT NULL
+    GROUP BY tracked_date
+"""
+
+HABIT_COMPLETIONS_BY_DAY = f"""
+    SELECT tracked_date, COUNT(*), group_concat(habit_id) FROM habit_tracking
+    WHERE habit_id = ? AND status = '{COMPLETED}'
+    AND tracked_date >= ? AND tracked_date < ?
+    GROUP BY tracked_date
+"""
+
+OCCURRENCES_BY_DAY = """
+    SELECT date, COUNT(*), group_concat(habit_id) FROM habit_occurrences
+    WHERE date >= ? AND date < ?
+    GROUP BY date
+"""
+
+HABIT_OCCURRENCES_BY_DAY = """
+    SELECT date, COUNT(*), group_concat(habit_id) FROM habit_occurrences
+    WHERE habit_id = ? AND date >= ? AND date < ?
+    GROUP BY date
+"""
+
+analytics_cache = QueryCache(max_entries=ANALYTICS_CACHE_ENTRIES, max_bytes=ANALYTICS_CACHE_BYTES)
+
+def epoch_day(day):
+    """Days since 1970-01-01 for an ISO date string"""
+    return date.fromisoformat(day).toordinal() - EPOCH
+
+def load_columns(conn, sql, params):
+    """(habit_ids, days) arrays from a query returning (date, count, group_concat of ids) per day"""
+    c = conn.cursor()
+    c.execute(sql, params)
+    days, counts, ids = [], [], []
+    for day, count, members in c.fetchall():
+        try:
+            days.append(epoch_day(day[:10]))
+        except ValueError:
+            continue
+        counts.append(count)
+        ids.append(members)
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return (
+        np.fromstring(','.join(ids), dtype=np.int64, sep=','),
+        np.repeat(np.array(days, dtype=np.int64), counts),
+    )
+
+def load_completions(conn, window_start, window_end, habit_id=None):
+    """(habit_ids, days) of the completions in [window_start, window_end)"""
+    if habit_id is not None:
+        return load_columns(conn, HABIT_COMPLETIONS_BY_DAY, (habit_id, window_start, window_end))
+    return load_columns(conn, COMPLETIONS_BY_DAY, (window_start, window_end))
+
+def load_occurrences(conn, window_start, window_end, habit_id=None):
+    """(habit_ids, days) of the materialized occurrences in [window_start, window_end)"""
+    if habit_id is not None:
+        return load_columns(conn, HABIT_OCCURRENCES_BY_DAY, (habit_id, window_start, window_end))
+    return load_columns(conn, OCCURRENCES_BY_DAY, (window_start, window_end))
+
+def load_categories(conn):
+    """(names, codes) where codes[habit_id] indexes names, -1 for unknown ids"""
+    c = conn.cursor()
+    c.execute("""
+        SELECT COALESCE(category, 'default'), group_concat(id) FROM habits
+        GROUP BY COALESCE(category, 'default') ORDER BY 1
+    """)
+    rows = c.fetchall()
+    names = [name for name, _ in rows]
+    ids = [np.fromstring(members, dtype=np.int64, sep=',') for _, members in rows]
+    size = max((int(members.max()) for members in ids), default=0) + 1
+    codes = np.full(size, -1, dtype=np.int64)
+    for code, members in enumerate(ids):
+        codes[members] = code
+    return names, codes
+
+def category_of(codes, habit_ids):
+    """Category code per habit id (-1 for habits that no longer exist)"""
+    known = habit_ids < len(codes)
+    result = np.full(len(habit_ids), -1, dtype=np.int64)
+    result[known] = codes[habit_ids[known]]
+    return result
+
+def daily_counts(days, first_day, length, mask=None):
+    """Per-day counts over `length` days from first_day, ignoring days outside"""
+    offsets = days - first_day
+    inside = (offsets >= 0) & (offsets < length)
+    if mask is not None:
+        inside &= mask
+    return np.bincount(offsets[inside], minlength=length)
+
+def levels(counts):
+    """Heatmap intensity per cell: 0 for no completions, else the quartile of the count"""
+    active = counts[counts > 0]
+    if not len(active):
+        return np.zeros(len(counts), dtype=np.int64)
+    cuts = np.percentile(active, np.linspace(0, 100, HEATMAP_LEVELS + 1)[1:-1])
+    return np.where(counts > 0, np.searchsorted(cuts, counts, side='left') + 1, 0)
+
+def heatmap(conn, window_start, window_end, category=None, habit_id=None):
+    """Completed and scheduled counts per day, with heatmap levels"""
+    first_day = epoch_day(window_start)
+    length = epoch_day(window_end) - first_day
+    # A single habit is cheaper to select by index than to mask afterwards
+    done_ids, done_days = load_completions(conn, window_start, window_end, habit_id)
+    due_ids, due_days = load_occurrences(conn, window_start, window_end, habit_id)
+
+    done_mask = due_mask = None
+    if habit_id is None and category is not None:
+        names, codes = load_categories(conn)
+        code = names.index(category) if category in names else -2
+        done_mask = category_of(codes, done_ids) == code
+        due_mask = category_of(codes, due_ids) == code
+
+    completed = daily_counts(done_days, first_day, length, done_mask)
+    scheduled = daily_counts(due_days, first_day, length, due_mask)
+    return {
+        'start': window_start,
+        'end': window_end,
+        'category': category,
+        'habitId': habit_id,
+        'completed': completed.tolist(),
+        'scheduled': scheduled.tolist(),
+        'levels': levels(completed).tolist(),
+        'total': int(completed.sum()),
+        'max': int(completed.max()) if length else 0,
+        'activeDays': int((completed > 0).sum()),
+    }
+
+def weekly_counts(habit_ids, days, codes, category_count, first_day, weeks):
+    """(categories x weeks) counts, one row per category code"""
+    offsets = days - first_day
+    category = category_of(codes, habit_ids)
+    inside = (offsets >= 0) & (offsets < weeks * 7) & (category >= 0)
+    cells = category[inside] * weeks + offsets[inside] // 7
+    return np.bincount(cells, minlength=category_count * weeks).reshape(category_count, weeks)
+
+def rolling_sum(counts, window):
+    """Sum over the trailing `window` columns, per row (shorter at the start)"""
+    totals = np.cumsum(counts, axis=1)
+    shifted = np.zeros_like(totals)
+    shifted[:, window:] = totals[:, :-window]
+    return totals - shifted
+
+def rates(completed, scheduled):
+    """Completion percentage per cell, NaN where nothing was scheduled"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(scheduled > 0, completed * 100.0 / scheduled, np.nan)
+
+def as_list(values):
+    """Rounded floats for JSON, with None for NaN"""
+    return [None if np.isnan(value) else round(float(value), 1) for value in values]
+
+def trends(conn, window_start, window_end, category=None):
+    """Weekly completions, completion rates and smoothed rates per category
+
+    Weeks start on window_start, which callers align to a Monday.
+    """
+    first_day = epoch_day(window_start)
+    weeks = -(-(epoch_day(window_end) - first_day) // 7)
+    names, codes = load_categories(conn)
+    done = weekly_counts(*load_completions(conn, window_start, window_end), codes, len(names), first_day, weeks)
+    due = weekly_counts(*load_occurrences(conn, window_start, window_end), codes, len(names), first_day, weeks)
+    rate = rates(done, due)
+    rolling = rates(rolling_sum(done, ROLLING_WEEKS), rolling_sum(due, ROLLING_WEEKS))
+
+    start = date.fromisoformat(window_start)
+    categories = {}
+    for code, name in enumerate(names):
+        if category is not None and name != category:
+            continue
+        if not (done[code].any() or due[code].any()):
+            continue
+        categories[name] = {
+            'completed': done[code].tolist(),
+            'scheduled': due[code].tolist(),
+            'rate': as_list(rate[code]),
+            'rollingRate': as_list(rolling[code]),
+        }
+    return {
+        'start': window_start,
+        'end': window_end,
+        'rollingWeeks': ROLLING_WEEKS,
+        'weeks': [(start + timedelta(weeks=week)).isoformat() for week in range(weeks)],
+        'categories': categories,
+    }
+
+def cache_token(conn, window_start, window_end):
+    """Version token covering habit, occurrence and tracking changes for a window"""
+    return f"{range_version(conn, window_start, window_end)[0]}|{tracking_version(conn)}"
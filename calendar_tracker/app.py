@@ -3,7 +3,11 @@ from flask_cors import CORS
 from flask_session import Session
 from datetime import timedelta
 from routes import main_bp
-from models import init_db
+from migrate import run_migrations
+from occurrences import start_horizon_job
+from reminders import start_reminder_scheduler
+from journal import start_compaction_job
+from broker import start_change_feed
 from dotenv import load_dotenv
 import os
 
@@ -27,6 +31,21 @@ def create_app():
     # Initialize Flask-Session
     Session(app)
 
+    # Bring the schema up to date once per worker, never per request
+    run_migrations()
+
+    # Keep materialized recurring occurrences ahead of today
+    start_horizon_job()
+
+    # Fire reminder_time notifications in the background
+    start_reminder_scheduler()
+
+    # Drop superseded change journal entries and old tombstones
+    start_compaction_job()
+
+    # Push committed changes to /events/stream subscribers
+    start_change_feed()
+
     # Check environment and service status
     gemini_status = {
         'available': True,
@@ -83,7 +102,6 @@ def create_app():
 # Initialize app
 app = create_app()
 
-# Initialize database if running directly
+# Run the development server if executed directly
 if __name__ == '__main__':
-    init_db()
     app.run(debug=True)
@@ -0,0 +1,303 @@
+from datetime import datetime
+from itertools import groupby
+from recurrence import load_exceptions, set_exception
+from mutations import habits_changed
+from intervals import format_minutes, interval_index, proposed_intervals
+
+# Upper bound on operations accepted in one /habits/batch request
+MAX_BATCH_OPERATIONS = 20000
+
+OPERATIONS = ('create', 'update', 'reschedule', 'delete')
+
+def _blank_to_none(value):
+    """Treat empty strings like the form routes do"""
+    if isinstance(value, str):
+        value = value.strip()
+    return value or None
+
+def _check_date(value):
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def _check_time(value):
+    try:
+        datetime.strptime(value, '%H:%M')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def _normalize(op):
+    """Validate one operation; returns (normalized op, error message)"""
+    if not isinstance(op, dict):
+        return None, "Operation must be an object"
+
+    kind = op.get('op')
+    if kind not in OPERATIONS:
+        return None, f"Unknown op '{kind}'"
+
+    if kind == 'create':
+        habit = _blank_to_none(op.get('habit'))
+        date = _blank_to_none(op.get('date'))
+        if not habit or not date:
+            return None, "Missing required fields"
+        if not _check_date(date):
+            return None, "Invalid date format"
+        start_time = _blank_to_none(op.get('start_time'))
+        end_time = _blank_to_none(op.get('end_time'))
+        if start_time and end_time and not (_check_time(start_time) and _check_time(end_time)):
+            return None, "Invalid time format"
+        return {
+            'op': kind,
+            'allow_conflict': bool(op.get('allow_conflict')),
+            'values': (
+                date, habit, start_time, end_time, op.get('description'),
+                op.get('category') or 'default', op.get('priority') or 1, op.get('color'),
+                _blank_to_none(op.get('recurrence')), _blank_to_none(op.get('reminder'))
+            )
+        }, None
+
+    try:
+        habit_id = int(op.get('id'))
+    except (TypeError, ValueError):
+        return None, "Missing habit ID"
+
+    if kind == 'update':
+        habit = _blank_to_none(op.get('habit'))
+        if not habit:
+            return None, "Missing required fields"
+        return {
+            'op': kind,
+            'id': habit_id,
+            'values': (
+                habit, op.get('description'), op.get('category'),
+                op.get('priority'), op.get('color'), habit_id
+            )
+        }, None
+
+    occurrence_date = _blank_to_none(op.get('occurrence_date'))
+    if occurrence_date and not _check_date(occurrence_date):
+        return None, "Invalid occurrence date"
+
+    if kind == 'reschedule':
+        date = _blank_to_none(op.get('date'))
+        if not date:
+            return None, "Missing required fields"
+        if not _check_date(date):
+            return None, "Invalid date format"
+        start_time = _blank_to_none(op.get('start_time'))
+        end_time = _blank_to_none(op.get('end_time'))
+        if (start_time and not _check_time(start_time)) or (end_time and not _check_time(end_time)):
+            return None, "Invalid time format"
+        return {
+            'op': kind,
+            'id': habit_id,
+            'occurrence_date': occurrence_date,
+            'allow_conflict': bool(op.get('allow_conflict')),
+            'values': (date, start_time, end_time)
+        }, None
+
+    return {'op': kind, 'id': habit_id, 'occurrence_date': occurrence_date}, None
+
+def validate_operations(conn, operations, allow_conflict=False):
+    """Check a whole batch before anything is written
+
+    Returns (normalized ops, errors) where errors is a list of
+    {'index', 'error'} dicts; the batch must be rejected if it is non-empty.
+    Creates and reschedules that would overlap an existing occurrence or
+    another slot in the batch are errors too, unless allow_conflict is set
+    for the batch or the op. Call it under the write lock so the checks
+    still hold when the batch is applied.
+    """
+    if not isinstance(operations, list) or not operations:
+        return [], [{'index': None, 'error': "Expected a non-empty list of operations"}]
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return [], [{'index': None, 'error': f"At most {MAX_BATCH_OPERATIONS} operations per batch"}]
+
+    normalized = []
+    errors = []
+    for index, op in enumerate(operations):
+        result, error = _normalize(op)
+        if error:
+            errors.append({'index': index, 'error': error})
+        normalized.append(result)
+
+    referenced = list({op['id'] for op in normalized if op and 'id' in op})
+    existing = {}
+    c = conn.cursor()
+    for offset in range(0, len(referenced), 900):
+        chunk = referenced[offset:offset + 900]
+        c.execute(f"""
+            SELECT id, habit, recurrence_pattern FROM habits WHERE id IN ({','.join('?' * len(chunk))})
+        """, chunk)
+        existing.update((row[0], row[1:]) for row in c.fetchall())
+
+    # A habit deleted earlier in the batch must not be touched again later
+    deleted = set()
+    for index, op in enumerate(normalized):
+        if not op or 'id' not in op:
+            continue
+        if op['id'] not in existing or op['id'] in deleted:
+            errors.append({'index': index, 'error': "Habit not found"})
+            normalized[index] = None
+        elif op['op'] == 'delete' and not op['occurrence_date']:
+            deleted.add(op['id'])
+
+    if not allow_conflict:
+        errors.extend(find_conflicts(conn, normalized, existing, deleted))
+
+    errors.sort(key=lambda error: error['index'])
+    return normalized, errors
+
+def find_conflicts(conn, normalized, existing, deleted):
+    """Errors for creates and reschedules overlapping the calendar or each other"""
+    proposals = []
+    moved = set(deleted)
+    single = []
+    for index, op in enumerate(normalized):
+        if not op or op['op'] not in ('create', 'reschedule') or op['allow_conflict']:
+            continue
+        if op['op'] == 'create':
+            day, title, start_time, end_time = op['values'][:4]
+            pattern = op['values'][8]
+        else:
+            day, start_time, end_time = op['values']
+            title, pattern = existing[op['id']]
+            if op['occurrence_date']:
+                # A single moved occurrence only occupies its new slot
+                pattern = None
+                single.append((op['id'], op['occurrence_date']))
+            else:
+                moved.add(op['id'])
+        slots = proposed_intervals(day, start_time, end_time, pattern)
+        if slots:
+            proposals.append((index, op.get('id'), title, slots))
+
+    # A single moved occurrence only frees the day it is on now: its
+    # occurrence date, or where an earlier override put it
+    freed = set()
+    if single:
+        exceptions = load_exceptions(conn, list({habit_id for habit_id, _ in single}))
+        for habit_id, occurrence_date in single:
+            overrides = {row[0]: row[2] for row in exceptions.get(habit_id, ())}
+            freed.add((overrides.get(occurrence_date) or occurrence_date, habit_id))
+
+    errors = {}
+    # Habits the batch deletes or moves no longer hold their old slots
+    for index, habit_id, _, slots in proposals:
+        conflicts = interval_index.conflicts(conn, slots, exclude=moved, exclude_on=freed)
+        if conflicts:
+            errors[index] = conflicts
+
+    # Slots claimed by two ops of the same batch
+    by_day = {}
+    for index, habit_id, title, slots in proposals:
+        for day, start, end in slots:
+            by_day.setdefault(day, []).append((start, end, index, title))
+    for day, slots in by_day.items():
+        slots.sort()
+        latest = None
+        for slot in slots:
+            start, end, index, title = slot
+            if latest is not None and latest[1] > start and latest[2] != index:
+                for one, other in ((index, latest), (latest[2], slot)):
+                    errors.setdefault(one, []).append({
+                        'index': other[2],
+                        'title': other[3],
+                        'date': day,
+                        'start': format_minutes(other[0]),
+                        'end': format_minutes(other[1]),
+                    })
+            if latest is None or end > latest[1]:
+                latest = slot
+
+    return [
+        {'index': index, 'error': "Time conflict", 'conflicts': conflicts}
+        for index, conflicts in errors.items()
+    ]
+
+def _create(conn, ops):
+    """Insert a run of creates; returns the new habit ids in op order"""
+    c = conn.cursor()
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM habits")
+    last_id = c.fetchone()[0]
+    c.executemany("""
+        INSERT INTO habits (
+            date, habit, start_time, end_time, description,
+            category, priority, color, recurrence_pattern, reminder_time
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [op['values'] for op in ops])
+    # Inserted in one write transaction, so the new ids are the next ones in order
+    c.execute("SELECT id FROM habits WHERE id > ? ORDER BY id LIMIT ?", (last_id, len(ops)))
+    new_ids = [row[0] for row in c.fetchall()]
+    c.executemany("""
+        INSERT INTO habit_tracking (habit_id, tracked_date)
+        VALUES (?, date('now'))
+    """, [(habit_id,) for habit_id in new_ids])
+    return new_ids
+
+def _update(conn, ops):
+    """Apply a run of updates; returns their habit ids"""
+    conn.cursor().executemany("""
+        UPDATE habits
+        SET habit = ?, description = ?, category = ?,
+            priority = ?, color = ?, last_modified = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, [op['values'] for op in ops])
+    return [op['id'] for op in ops]
+
+def _reschedule(conn, ops):
+    """Move a run of habits or single occurrences; returns their habit ids"""
+    moves = []
+    for op in ops:
+        if op['occurrence_date']:
+            date, start_time, end_time = op['values']
+            set_exception(
+                conn, op['id'], op['occurrence_date'],
+                new_date=date, new_start_time=start_time, new_end_time=end_time
+            )
+        else:
+            moves.append(op['values'] + (op['id'],))
+    conn.cursor().executemany("""
+        UPDATE habits
+        SET date = ?, start_time = ?, end_time = ?,
+            last_modified = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, moves)
+    return [op['id'] for op in ops]
+
+def _delete(conn, ops):
+    """Delete a run of habits or cancel single occurrences; returns their habit ids"""
+    removed = []
+    for op in ops:
+        if op['occurrence_date']:
+            set_exception(conn, op['id'], op['occurrence_date'], cancelled=True)
+        else:
+            removed.append((op['id'],))
+    c = conn.cursor()
+    c.executemany("DELETE FROM habit_tracking WHERE habit_id = ?", removed)
+    c.executemany("DELETE FROM habit_exceptions WHERE habit_id = ?", removed)
+    c.executemany("DELETE FROM habits WHERE id = ?", removed)
+    return [op['id'] for op in ops]
+
+APPLY = {'create': _create, 'update': _update, 'reschedule': _reschedule, 'delete': _delete}
+
+def apply_operations(conn, operations):
+    """Apply validated ops inside the caller's transaction; returns per-op results
+
+    Ops take effect in index order. Each run of consecutive ops of the same
+    kind is written with executemany.
+    """
+    results = []
+    index = 0
+    for kind, run in groupby(operations, key=lambda op: op['op']):
+        run = list(run)
+        for habit_id in APPLY[kind](conn, run):
+            results.append({'index': index, 'op': kind, 'id': habit_id, 'status': 'ok'})
+            index += 1
+
+    habits_changed(conn, [result['id'] for result in results])
+    return results
@@ -0,0 +1,104 @@
+"""Measure /analytics/heatmap and /analytics/trends aggregation.
+
+Seeds a temporary database with daily habits spread over a few categories
+(materialized into habit_occurrences) and --rows completed habit_tracking
+rows over the past two years, then times the heatmap and trend builders
+cold (straight from SQLite) and through the version-checked cache.
+
+    python benchmarks/analytics_benchmark.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = ('fitness', 'work', 'learning', 'health', 'default')
+
+def seed(conn, habits, rows):
+    from occurrences import rebuild_occurrences
+
+    rng = random.Random(11)
+    today = date.today()
+    c = conn.cursor()
+    c.executemany("""
+        INSERT INTO habits (date, habit, start_time, end_time, category, recurrence_pattern)
+        VALUES (?, ?, '07:00', '07:30', ?, 'daily')
+    """, [
+        ((today - timedelta(days=730)).isoformat(), f"Habit {i}", CATEGORIES[i % len(CATEGORIES)])
+        for i in range(habits)
+    ])
+    conn.commit()
+    rebuild_occurrences(conn, progress=lambda message: None)
+    conn.commit()
+
+    days = [(today - timedelta(days=offset)).isoformat() for offset in range(730)]
+    for offset in range(0, rows, 100000):
+        c.executemany(
+            "INSERT INTO habit_tracking (habit_id, tracked_date, status) VALUES (?, ?, 'completed')",
+            [(rng.randrange(1, habits + 1), rng.choice(days)) for _ in range(min(100000, rows - offset))]
+        )
+        conn.commit()
+
+def timed(label, build):
+    started = time.perf_counter()
+    result = build()
+    print(f"{label:<34} {(time.perf_counter() - started) * 1000:>9.1f} ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--habits', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'bench.db')
+
+    from migrate import run_migrations
+    import analytics
+    from utils import get_db_connection
+    run_migrations(progress=lambda message: None)
+
+    with get_db_connection() as conn:
+        started = time.perf_counter()
+        seed(conn, args.habits, args.rows)
+        print(f"seeded {args.rows} completions and {args.habits} daily habits "
+              f"in {time.perf_counter() - started:.1f} s")
+
+        today = date.today()
+        year_start = (today - timedelta(days=364)).isoformat()
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        monday = today - timedelta(days=today.weekday())
+        weeks_start = (monday - timedelta(weeks=51)).isoformat()
+        weeks_end = (monday + timedelta(weeks=1)).isoformat()
+
+        result = timed('heatmap, year', lambda: analytics.heatmap(conn, year_start, tomorrow))
+        print(f"{'':<34} {result['total']} completions, busiest day {result['max']}")
+        result = timed('heatmap, two years (every row)',
+                       lambda: analytics.heatmap(conn, (today - timedelta(days=729)).isoformat(), tomorrow))
+        print(f"{'':<34} {result['total']} completions")
+        timed('heatmap, year, one category',
+              lambda: analytics.heatmap(conn, year_start, tomorrow, category='fitness'))
+        timed('heatmap, year, one habit', lambda: analytics.heatmap(conn, year_start, tomorrow, habit_id=1))
+        result = timed('trends, 52 weeks', lambda: analytics.trends(conn, weeks_start, weeks_end))
+        print(f"{'':<34} {len(result['categories'])} categories x {len(result['weeks'])} weeks")
+
+        def cached():
+            token = analytics.cache_token(conn, year_start, tomorrow)
+            key = (year_start, tomorrow, 'heatmap')
+            body = analytics.analytics_cache.get(key, token)
+            if body is None:
+                body = str(analytics.heatmap(conn, year_start, tomorrow)).encode()
+                analytics.analytics_cache.put(key, token, body, True)
+            return body
+
+        timed('heatmap through cache, miss', cached)
+        timed('heatmap through cache, hit', cached)
+
+if __name__ == '__main__':
+    main()
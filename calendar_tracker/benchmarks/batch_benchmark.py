@@ -0,0 +1,108 @@
+"""Compare /habits/batch with the per-habit routes.
+
+Runs N creates, N reschedules and N deletes through /addHabit,
+/rescheduleHabit and /removeHabit one request at a time, then the same
+work as three /habits/batch requests, each against a fresh temporary
+database.
+
+    python benchmarks/batch_benchmark.py --ops 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+def build_app(db_path):
+    """Import the app against a scratch database"""
+    os.environ['DATABASE_PATH'] = db_path
+    os.environ.setdefault('REMINDER_SINKS', '')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import app
+    import reminders
+    reminders.reminder_scheduler.stop()
+    return app
+
+def reset(app):
+    """Empty the habit tables between runs"""
+    from utils import get_db_connection
+    with get_db_connection() as conn:
+        for table in ('habit_tracking', 'habit_exceptions', 'reminders', 'habit_occurrences', 'change_journal', 'habits'):
+            conn.execute(f"DELETE FROM {table}")
+        conn.commit()
+
+def day(i):
+    # One habit per day, so creates and moves never trip the conflict check
+    return (date(2026, 1, 1) + timedelta(days=i)).isoformat()
+
+def run_per_request(client, n):
+    timings = {}
+
+    started = time.perf_counter()
+    ids = []
+    for i in range(n):
+        response = client.post('/addHabit', data={
+            'habit': f"Habit {i}", 'date': day(i), 'start_time': '07:00', 'end_time': '08:00'
+        })
+        ids.append(response.get_json()['id'])
+    timings['create'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i, habit_id in enumerate(ids):
+        client.post('/rescheduleHabit', data={
+            'id': habit_id, 'date': day(i + 1), 'start_time': '09:00', 'end_time': '10:00'
+        })
+    timings['reschedule'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for habit_id in ids:
+        client.post('/removeHabit', data={'id': habit_id})
+    timings['delete'] = time.perf_counter() - started
+    return timings
+
+def run_batch(client, n):
+    timings = {}
+
+    started = time.perf_counter()
+    response = client.post('/habits/batch', json=[
+        {'op': 'create', 'habit': f"Habit {i}", 'date': day(i), 'start_time': '07:00', 'end_time': '08:00'}
+        for i in range(n)
+    ])
+    ids = [result['id'] for result in response.get_json()['results']]
+    timings['create'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client.post('/habits/batch', json=[
+        {'op': 'reschedule', 'id': habit_id, 'date': day(i + 1), 'start_time': '09:00', 'end_time': '10:00'}
+        for i, habit_id in enumerate(ids)
+    ])
+    timings['reschedule'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client.post('/habits/batch', json=[{'op': 'delete', 'id': habit_id} for habit_id in ids])
+    timings['delete'] = time.perf_counter() - started
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ops', type=int, default=10000, help="operations of each kind")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'bench.db'))
+        client = app.test_client()
+
+        single = run_per_request(client, args.ops)
+        reset(app)
+        batched = run_batch(client, args.ops)
+
+    print(f"{args.ops} ops per kind")
+    print(f"{'op':<12}{'per-request':>14}{'batch':>12}{'speedup':>10}")
+    for kind in ('create', 'reschedule', 'delete'):
+        print(f"{kind:<12}{single[kind]:>13.2f}s{batched[kind]:>11.2f}s{single[kind] / batched[kind]:>9.1f}x")
+    total_single, total_batch = sum(single.values()), sum(batched.values())
+    print(f"{'total':<12}{total_single:>13.2f}s{total_batch:>11.2f}s{total_single / total_batch:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Measure iCalendar bulk import and streaming export.
+
+Writes a synthetic .ics file (mostly one-off events, every 50th a weekly
+series with a reminder and an EXDATE) to a temporary database, then times
+ics.import_calendar reading it line by line and ics.export_calendar
+streaming it back out.
+
+With --trace-memory the Python heap peak of each phase is measured with
+tracemalloc, to show it is bounded by the chunk size rather than the file
+size; tracing slows the parser several times over, so timings from that
+run are not representative.
+
+    python benchmarks/ics_benchmark.py --events 100000 [--trace-memory]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def write_calendar(path, total):
+    """A VCALENDAR with `total` VEVENTs spread over two years"""
+    start = date(2026, 1, 1)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Benchmark//EN\r\n')
+        for i in range(total):
+            day = (start + timedelta(days=i % 730)).strftime('%Y%m%d')
+            lines = [
+                'BEGIN:VEVENT',
+                f'UID:bench-{i}@example.com',
+                'DTSTAMP:20260101T000000Z',
+                f'DTSTART:{day}T{9 + i % 8:02d}0000',
+                f'DTEND:{day}T{9 + i % 8:02d}4500',
+                f'SUMMARY:Event {i}',
+                f'DESCRIPTION:Synthetic event number {i}\\, for the import benchmark',
+                f'CATEGORIES:{("work", "health", "study")[i % 3]}',
+            ]
+            if i % 50 == 0:
+                following = (start + timedelta(days=i % 730 + 7)).strftime('%Y%m%d')
+                lines += [
+                    'RRULE:FREQ=WEEKLY;COUNT=10',
+                    f'EXDATE:{following}T{9 + i % 8:02d}0000',
+                    'BEGIN:VALARM', 'ACTION:DISPLAY', 'TRIGGER:-PT15M', 'END:VALARM',
+                ]
+            lines.append('END:VEVENT')
+            f.write('\r\n'.join(lines) + '\r\n')
+        f.write('END:VCALENDAR\r\n')
+
+def measure(fn, trace):
+    """(seconds, result, peak traced MB or None) for one call"""
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return elapsed, result, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--trace-memory', action='store_true')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'bench.db')
+    source = os.path.join(workdir, 'bench.ics')
+
+    from migrate import run_migrations
+    import ics
+    run_migrations()
+
+    write_calendar(source, args.events)
+    print(f"{args.events} events, {os.path.getsize(source) / 1e6:.1f} MB file")
+
+    def run_import():
+        with open(source, 'rb') as f:
+            return ics.import_calendar(f)
+
+    elapsed, result, peak = measure(run_import, args.trace_memory)
+    print(f"{'import':<8}{elapsed:>8.2f} s  {args.events / elapsed:>8.0f} events/s  {result}"
+          + (f"  heap peak {peak:.1f} MB" if peak is not None else ''))
+
+    elapsed, size, peak = measure(lambda: sum(len(part) for part in ics.export_calendar()),
+                                  args.trace_memory)
+    print(f"{'export':<8}{elapsed:>8.2f} s  {size / 1e6:>8.1f} MB written"
+          + (f"  heap peak {peak:.1f} MB" if peak is not None else ''))
+
+if __name__ == '__main__':
+    main()
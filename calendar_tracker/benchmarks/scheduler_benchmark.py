@@ -0,0 +1,115 @@
+"""Measure the auto-scheduler's solve time and schedule quality.
+
+Seeds a temporary database with a busy calendar (a daily lunch series plus
+random meetings), then for 10, 100 and 1000 tasks plans them into the free
+time with the greedy pass alone and with local search, and times writing
+the result back in one transaction. Windows are sized so tasks fill about
+80% of the free time, deadlines are set on a third of the tasks and a
+preferred time of day on half.
+
+Quality columns: placed tasks, preference hits among tasks with a
+preference, and total cost (lower is better; see scheduler.placement_cost).
+
+    python benchmarks/scheduler_benchmark.py --sizes 10 100 1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DURATIONS = (15, 30, 45, 60, 90, 120)
+
+def seed_calendar(days):
+    """A lunch series plus a few meetings a day, as existing busy time"""
+    from batch import apply_operations, validate_operations
+    from utils import get_db_connection
+
+    rng = random.Random(7)
+    start = date.today() + timedelta(days=1)
+    operations = [{
+        'op': 'create', 'habit': 'Lunch', 'date': start.isoformat(),
+        'start_time': '12:00', 'end_time': '13:00', 'recurrence': 'daily',
+    }]
+    for offset in range(days):
+        for _ in range(3):
+            hour = rng.choice([9, 10, 14, 15, 16])
+            operations.append({
+                'op': 'create', 'habit': 'Meeting', 'date': (start + timedelta(days=offset)).isoformat(),
+                'start_time': f"{hour:02d}:00", 'end_time': f"{hour:02d}:30",
+            })
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        normalized, errors = validate_operations(conn, operations)
+        apply_operations(conn, normalized)
+        conn.commit()
+    return start
+
+def make_tasks(count, window_start, days, rng):
+    tasks = []
+    for i in range(count):
+        task = {
+            'title': f"Task {i}",
+            'duration': rng.choice(DURATIONS),
+            'priority': rng.choice([1, 1, 2, 3]),
+        }
+        if i % 3 == 0:
+            task['deadline'] = (window_start + timedelta(days=rng.randrange(1, days + 1))).isoformat()
+        if i % 2 == 0:
+            task['preferred'] = rng.choice(['morning', 'afternoon', 'evening'])
+        tasks.append(task)
+    return tasks
+
+def window_days(count, free_minutes_per_day=11 * 60, fill=0.8):
+    average = sum(DURATIONS) / len(DURATIONS)
+    return max(3, int(count * average / (free_minutes_per_day * fill)) + 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--time-limit', type=float, default=2.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'bench.db')
+
+    from migrate import run_migrations
+    import scheduler
+    from utils import get_db_connection
+    run_migrations()
+
+    longest = max(window_days(count) for count in args.sizes)
+    window_start = seed_calendar(longest)
+
+    print(f"{'tasks':>6} {'days':>5} {'mode':<8} {'solve ms':>9} {'placed':>9} {'pref hits':>10} "
+          f"{'cost':>10} {'write ms':>9}")
+    for count in args.sizes:
+        days = window_days(count)
+        window_end = window_start + timedelta(days=days)
+        tasks, errors = scheduler.parse_tasks(
+            make_tasks(count, window_start, days, random.Random(count)), window_start.isoformat()
+        )
+
+        for mode, limit in (('greedy', 0.0), ('search', args.time_limit)):
+            with get_db_connection() as conn:
+                placements, unscheduled, stats = scheduler.plan(
+                    conn, tasks, window_start.isoformat(), window_end.isoformat(), time_limit=limit
+                )
+                started = time.perf_counter()
+                conn.execute("BEGIN IMMEDIATE")
+                ids = scheduler.write_schedule(conn, tasks, placements)
+                write_ms = (time.perf_counter() - started) * 1000
+                # Leave the calendar as it was for the next run
+                conn.rollback()
+
+            assert ids is not None and len(ids) == len(placements)
+            print(f"{count:>6} {days:>5} {mode:<8} {stats['solve_ms']:>9.1f} "
+                  f"{stats['placed']:>4}/{count:<4} {stats['preference_hits']:>4}/{stats['preferred']:<5} "
+                  f"{stats['cost']:>10.1f} {write_ms:>9.1f}")
+
+if __name__ == '__main__':
+    main()
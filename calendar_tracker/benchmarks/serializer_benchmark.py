@@ -0,0 +1,122 @@
+"""Measure event serialization for a year view.
+
+Builds 50k (row, occurrence) pairs in memory (a mix of one-off habits and
+daily series) and times turning them into a JSON body: the previous
+per-row dict builder encoded the way Flask's jsonify does, against
+serializers.EventSerializer's dict path (json and orjson) and its
+fragment encoder.
+
+    python benchmarks/serializer_benchmark.py --events 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serializers
+from recurrence import Occurrence
+from serializers import EventSerializer
+
+def legacy_build_event(row, occurrence=None):
+    """The per-row builder routes.py used before serializers.py"""
+    (habit_id, habit_date, habit_text, start_time, end_time, description,
+     category, priority, color, recurrence, reminder, completed, _) = row
+
+    if occurrence:
+        habit_date, start_time, end_time = occurrence.date, occurrence.start_time, occurrence.end_time
+
+    event = {
+        'id': habit_id,
+        'title': habit_text,
+        'allDay': not (start_time and end_time),
+        'start': f"{habit_date}T{start_time}" if start_time else habit_date,
+        'end': f"{habit_date}T{end_time}" if end_time else None,
+        'backgroundColor': color or ('#1e40af' if start_time and end_time else '#3b82f6'),
+        'borderColor': color or ('#1e3a8a' if start_time and end_time else '#2563eb'),
+        'textColor': 'white',
+        'description': description,
+        'category': category,
+        'priority': priority,
+        'recurrence': recurrence,
+        'reminder': reminder,
+        'extendedProps': {
+            'category': category,
+            'priority': priority
+        }
+    }
+    if occurrence:
+        event['extendedProps']['recurring'] = True
+        event['extendedProps']['occurrenceDate'] = occurrence.occurrence_date
+    return event
+
+def year_view(total, series=30):
+    """(row, occurrence) pairs for one year: `series` daily habits plus one-offs"""
+    start = date(2026, 1, 1)
+    days = [(start + timedelta(days=i)).isoformat() for i in range(365)]
+    pairs = []
+    for habit_id in range(1, series + 1):
+        row = (habit_id, days[0], f"Series {habit_id}", '07:00', '07:30', 'Every day',
+               'health', 2, None, 'daily', '15min', 0, '2026-01-01 00:00:00')
+        pairs.extend((row, Occurrence(day, day, '07:00', '07:30')) for day in days)
+
+    habit_id = series
+    while len(pairs) < total:
+        habit_id += 1
+        timed = habit_id % 3 != 0
+        row = (habit_id, days[habit_id % 365], f"Habit {habit_id}",
+               '09:00' if timed else None, '10:00' if timed else None, 'One-off task',
+               'work', 1, '#10b981' if habit_id % 5 == 0 else None, None, None, 0,
+               '2026-01-01 00:00:00')
+        pairs.append((row, None))
+    return pairs[:total]
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pairs = year_view(args.events)
+
+    def legacy():
+        # Flask's default provider sorts keys and escapes non-ASCII
+        events = [legacy_build_event(row, occurrence) for row, occurrence in pairs]
+        return json.dumps(events, sort_keys=True).encode('utf-8')
+
+    def dicts_json():
+        events = EventSerializer().events(pairs)
+        return json.dumps(events, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def dicts_orjson():
+        return serializers.orjson.dumps(EventSerializer().events(pairs))
+
+    def encoded():
+        return EventSerializer().encode(pairs)
+
+    baseline, size = best_of(legacy, args.repeat)
+    print(f"{len(pairs)} events, best of {args.repeat}")
+    print(f"{'legacy builder + jsonify encoding':<40}{baseline * 1000:>9.1f} ms  {size / 1e6:.1f} MB")
+
+    runs = [('EventSerializer.events + json', dicts_json)]
+    if serializers.orjson is not None:
+        runs.append(('EventSerializer.events + orjson', dicts_orjson))
+    runs.append(('EventSerializer.encode', encoded))
+    for name, fn in runs:
+        elapsed, size = best_of(fn, args.repeat)
+        print(f"{name:<40}{elapsed * 1000:>9.1f} ms  {size / 1e6:.1f} MB  {baseline / elapsed:.1f}x")
+
+if __name__ == '__main__':
+    main()
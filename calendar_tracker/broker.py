@@ -0,0 +1,212 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from utils import get_db_connection
+from journal import current_cursor
+
+# Messages kept for Last-Event-ID replay after a reconnect
+REPLAY_BUFFER_SIZE = 1000
+
+# Undelivered messages a subscriber may have queued before it is reset
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Comment line sent to idle streams so proxies keep them open
+HEARTBEAT_SECONDS = 15
+
+# How often the change journal is tailed while anyone is subscribed
+POLL_SECONDS = 0.5
+
+# How long a client waits before reconnecting after the stream drops
+RETRY_MILLISECONDS = 3000
+
+class Subscription:
+    """One connected client: a bounded queue of pending messages"""
+
+    def __init__(self, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        self.lagging = False
+
+    def offer(self, message):
+        """Queue a message without blocking the publisher
+
+        A subscriber that cannot keep up loses its backlog and gets a single
+        reset message instead, telling the client to reload.
+        """
+        if self.lagging:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.lagging = True
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait((message[0], 'reset', {'reason': 'lagging'}))
+
+class Broker:
+    """In-process pub/sub for calendar change notifications.
+
+    Messages are (id, event, data) tuples with increasing ids. The most
+    recent ones are kept in a ring buffer so a reconnecting client can
+    replay what it missed from its Last-Event-ID.
+    """
+
+    def __init__(self, replay_size=REPLAY_BUFFER_SIZE):
+        self._subscribers = set()
+        self._replay = deque(maxlen=replay_size)
+        # Clients whose Last-Event-ID is below this may have missed messages
+        self._replay_floor = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {
+            'published': 0,
+            'delivered': 0,
+            'resets': 0,
+            'replayed': 0,
+        }
+
+    def publish(self, message_id, event, data):
+        """Send a message to every subscriber and remember it for replay"""
+        message = (message_id, event, data)
+        with self._lock:
+            if len(self._replay) == self._replay.maxlen:
+                self._replay_floor = self._replay[0][0]
+            self._replay.append(message)
+            subscribers = list(self._subscribers)
+            self._stats['published'] += 1
+        resets = 0
+        for subscriber in subscribers:
+            was_lagging = subscriber.lagging
+            subscriber.offer(message)
+            if subscriber.lagging and not was_lagging:
+                resets += 1
+        if resets:
+            with self._lock:
+                self._stats['resets'] += resets
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber, replaying messages after last_event_id"""
+        subscription = Subscription()
+        with self._lock:
+            if last_event_id is not None:
+                if last_event_id < self._replay_floor:
+                    # Part of the gap is no longer buffered; the client must
+                    # reload, then resume from the current position
+                    position = max(self._replay_floor, self._replay[-1][0] if self._replay else 0)
+                    subscription.offer((position, 'reset', {'reason': 'replay_gap'}))
+                    self._stats['resets'] += 1
+                else:
+                    for message in self._replay:
+                        if message[0] > last_event_id:
+                            subscription.offer(message)
+                            self._stats['replayed'] += 1
+            self._subscribers.add(subscription)
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Forget a subscriber"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_SECONDS):
+        """Yield Server-Sent Events text for a subscription until the client leaves"""
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n"
+            while True:
+                try:
+                    message_id, event, data = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                with self._lock:
+                    self._stats['delivered'] += 1
+                yield f"id: {message_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+                if event == 'reset':
+                    # The client reloads and reconnects from a fresh state
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        """Subscriber, delivery and replay counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscribers)
+            stats['lagging'] = sum(1 for s in self._subscribers if s.lagging)
+            stats['replay_buffered'] = len(self._replay)
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    def _poll(self, conn, last_seq):
+        """Publish journal entries committed after last_seq; returns the new position"""
+        c = conn.cursor()
+        c.execute("""
+            SELECT seq, habit_id, op FROM change_journal
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT 500
+        """, (last_seq,))
+        rows = c.fetchall()
+        if not rows:
+            return last_seq
+
+        latest = {}
+        for seq, habit_id, op in rows:
+            latest[habit_id] = op
+        cursor = rows[-1][0]
+        self.publish(cursor, 'habits', {
+            'cursor': cursor,
+            'changes': [{'id': habit_id, 'op': op} for habit_id, op in latest.items()],
+        })
+        return cursor
+
+    def start(self, interval=POLL_SECONDS):
+        """Tail the change journal on a daemon thread and publish what commits
+
+        Reading committed journal rows, rather than publishing from inside
+        the writing transaction, means clients never see a change that is
+        later rolled back, and writes from other worker processes show up
+        too.
+        """
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        def run():
+            last_seq = None
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                with self._lock:
+                    idle = not self._subscribers
+                try:
+                    with get_db_connection() as conn:
+                        if last_seq is None or idle:
+                            # Nobody to tell; skip ahead instead of buffering
+                            last_seq = current_cursor(conn)
+                            with self._lock:
+                                self._replay_floor = max(self._replay_floor, last_seq)
+                            continue
+                        while True:
+                            position = self._poll(conn, last_seq)
+                            if position == last_seq:
+                                break
+                            last_seq = position
+                except Exception as e:
+                    print(f"Error publishing calendar changes: {str(e)}")
+                    time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name='change-feed', daemon=True)
+        self._thread.start()
+        return self._thread
+
+broker = Broker()
+
+def start_change_feed():
+    """Start publishing committed calendar changes to /events/stream subscribers"""
+    return broker.start()
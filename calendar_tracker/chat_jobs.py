@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads making Gemini calls; each one is busy for a whole round trip
+CHAT_WORKERS = int(os.getenv('CHAT_WORKERS', 4))
+
+# Jobs waiting for a worker before new ones are turned away
+MAX_PENDING_JOBS = int(os.getenv('CHAT_MAX_PENDING', 32))
+
+# Unfinished jobs one client may have at a time
+MAX_JOBS_PER_CLIENT = int(os.getenv('CHAT_MAX_JOBS_PER_CLIENT', 2))
+
+# How long a finished job's result can still be fetched
+JOB_TTL_SECONDS = 5 * 60
+
+# Recent jobs whose timings feed the latency percentiles
+LATENCY_SAMPLES = 200
+
+# Comment line sent while a streamed job is still running
+HEARTBEAT_SECONDS = 15
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+class QueueFull(Exception):
+    """Every worker is busy and the pending queue is at its limit"""
+
+class ClientLimit(Exception):
+    """The client already has MAX_JOBS_PER_CLIENT unfinished jobs"""
+
+class ChatJob:
+    """One queued chat message, the text streamed so far and, once finished, its result"""
+
+    __slots__ = ('id', 'client', 'state', 'result', 'error', 'chunks',
+                 'created_at', 'started_at', 'first_token_at', 'finished_at', 'changed')
+
+    def __init__(self, client):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.monotonic()
+        self.chunks = []
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        # Notified on every new chunk and when the job finishes
+        self.changed = threading.Condition()
+
+    def emit(self, text):
+        """Append a piece of streamed response text"""
+        with self.changed:
+            if self.first_token_at is None:
+                self.first_token_at = time.monotonic()
+            self.chunks.append(text)
+            self.changed.notify_all()
+
+    def to_dict(self):
+        """JSON view of the job for polling and streaming"""
+        job = {'id': self.id, 'state': self.state}
+        if self.started_at:
+            job['queued_ms'] = round((self.started_at - self.created_at) * 1000)
+        if self.first_token_at:
+            job['first_token_ms'] = round((self.first_token_at - self.created_at) * 1000)
+        if self.finished_at:
+            job['run_ms'] = round((self.finished_at - self.started_at) * 1000)
+        if self.state == DONE:
+            job.update(self.result)
+        elif self.state == FAILED:
+            job['error'] = self.error
+        return job
+
+class ChatJobs:
+    """Bounded worker pool for chat requests.
+
+    /chat hands the Gemini round trip to this pool and answers at once
+    with a job id, so a slow API ties up pool threads rather than the web
+    workers serving the calendar. The pending queue and each client's
+    unfinished jobs are capped; finished jobs are kept for JOB_TTL_SECONDS
+    so their results can be polled or streamed.
+
+    Work that returns an iterator of text is streamed: each piece is made
+    available to stream() as it arrives and the joined text becomes the
+    response. Time to first token, measured from submission, is the
+    latency the user actually waits through, so stats() leads with it.
+    """
+
+    def __init__(self, workers=CHAT_WORKERS, max_pending=MAX_PENDING_JOBS,
+                 per_client=MAX_JOBS_PER_CLIENT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.per_client = per_client
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._first_tokens = deque(maxlen=LATENCY_SAMPLES)
+        self._queue_waits = deque(maxlen=LATENCY_SAMPLES)
+        self._run_times = deque(maxlen=LATENCY_SAMPLES)
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected_full': 0,
+            'rejected_client': 0,
+        }
+
+    def submit(self, client, work, *args, **kwargs):
+        """Queue work(*args, **kwargs) for a client
+
+        work returns the result dict, or an iterator of response text to stream.
+        """
+        with self._lock:
+            self._expire()
+            if self._queued >= self.max_pending:
+                self._stats['rejected_full'] += 1
+                raise QueueFull()
+            active = sum(
+                1 for job in self._jobs.values()
+                if job.client == client and job.state in (QUEUED, RUNNING)
+            )
+            if active >= self.per_client:
+                self._stats['rejected_client'] += 1
+                raise ClientLimit()
+
+            job = ChatJob(client)
+            self._jobs[job.id] = job
+            self._queued += 1
+            self._stats['submitted'] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='chat')
+        self._executor.submit(self._run, job, work, args, kwargs)
+        return job
+
+    def _run(self, job, work, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            job.state = RUNNING
+            job.started_at = time.monotonic()
+        try:
+            result, state, error = work(*args, **kwargs), DONE, None
+            if isinstance(result, Iterator):
+                for text in result:
+                    if text:
+                        job.emit(text)
+                result = {'response': ''.join(job.chunks)}
+        except Exception as e:
+            print(f"Error in chat job {job.id}: {str(e)}")
+            result, state, error = None, FAILED, str(e)
+        with self._lock, job.changed:
+            job.result, job.error = result, error
+            job.finished_at = time.monotonic()
+            # A job answered in one piece delivers its first token at the end
+            job.first_token_at = job.first_token_at or job.finished_at
+            job.state = state
+            self._running -= 1
+            self._stats['completed' if state == DONE else 'failed'] += 1
+            if state == DONE:
+                self._first_tokens.append(job.first_token_at - job.created_at)
+            self._queue_waits.append(job.started_at - job.created_at)
+            self._run_times.append(job.finished_at - job.started_at)
+            job.changed.notify_all()
+
+    def _expire(self):
+        """Forget finished jobs past their TTL (called with the lock held)"""
+        cutoff = time.monotonic() - JOB_TTL_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """The job with this id, or None if unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stream(self, job, heartbeat=HEARTBEAT_SECONDS):
+        """Yield Server-Sent Events for a job: its state now, a token event
+        per piece of streamed text, then its result"""
+        yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+        sent = 0
+        while True:
+            with job.changed:
+                if len(job.chunks) == sent and job.finished_at is None:
+                    job.changed.wait(heartbeat)
+                chunks = job.chunks[sent:]
+                finished = job.finished_at is not None
+            for text in chunks:
+                yield f"event: token\ndata: {json.dumps({'text': text})}\n\n"
+            sent += len(chunks)
+            if finished:
+                break
+            if not chunks:
+                yield ": heartbeat\n\n"
+        yield f"event: result\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    def stats(self):
+        """Queue depth, rejections and latency percentiles"""
+        with self._lock:
+            first_tokens = sorted(self._first_tokens)
+            queue_waits = sorted(self._queue_waits)
+            run_times = sorted(self._run_times)
+            stats = self.percentiles('first_token', first_tokens)
+            stats.update(self._stats)
+            stats['queued'] = self._queued
+            stats['running'] = self._running
+            stats['jobs_kept'] = len(self._jobs)
+        stats['workers'] = self.workers
+        stats['max_pending'] = self.max_pending
+        stats['max_per_client'] = self.per_client
+        stats.update(self.percentiles('queue_wait', queue_waits))
+        stats.update(self.percentiles('run', run_times))
+        return stats
+
+    @staticmethod
+    def percentiles(name, samples):
+        """p50 and p95 in milliseconds of sorted latency samples"""
+        result = {}
+        for percentile in (50, 95):
+            value = samples[min(len(samples) - 1, len(samples) * percentile // 100)] if samples else 0
+            result[f"{name}_p{percentile}_ms"] = round(value * 1000, 1)
+        return result
+
+chat_jobs = ChatJobs()
@@ -0,0 +1,125 @@
+from datetime import date, datetime, timedelta
+from heapq import merge
+from intervals import DAY_MINUTES, format_minutes, interval_index, to_minutes
+
+# Working hours, matching FullCalendar's slotMinTime/slotMaxTime in app.js
+WORKING_HOURS = ('06:00', '22:00')
+
+# Longest window /freebusy will answer in one request
+MAX_FREEBUSY_DAYS = 366
+
+# How far back to look for standalone events still running into the window
+EVENT_LOOKBACK_DAYS = 7
+
+# Timed calendar_events without a habit, by start date
+STANDALONE_EVENTS = """
+    SELECT ce.start_datetime, ce.end_datetime
+    FROM calendar_events ce
+    WHERE ce.start_date >= ? AND ce.start_date < ?
+    AND ce.all_day = 0 AND ce.end_datetime IS NOT NULL
+    AND NOT EXISTS (SELECT 1 FROM habits h WHERE h.id = ce.habit_id)
+"""
+
+def iter_days(window_start, window_end):
+    """ISO dates in [window_start, window_end)"""
+    day = date.fromisoformat(window_start)
+    last = date.fromisoformat(window_end)
+    while day < last:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+def standalone_events(conn, window_start, window_end):
+    """{date: [(start, end), ...]} for timed calendar_events without a habit
+
+    Events that belong to a habit are already covered by its occurrences.
+    Events running past midnight are split at each day boundary.
+    """
+    lookback = (date.fromisoformat(window_start) - timedelta(days=EVENT_LOOKBACK_DAYS)).isoformat()
+    c = conn.cursor()
+    c.execute(STANDALONE_EVENTS, (lookback, window_end))
+
+    days = {}
+    for start_value, end_value in c.fetchall():
+        start, end = str(start_value), str(end_value)
+        day, last = start[:10], end[:10]
+        begin = to_minutes(start[11:16])
+        while day <= last and day < window_end:
+            finish = to_minutes(end[11:16]) if day == last else DAY_MINUTES
+            if finish > begin and day >= window_start:
+                days.setdefault(day, []).append((begin, finish))
+            day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+            begin = 0
+    return days
+
+def busy_by_day(conn, window_start, window_end):
+    """{date: merged, sorted [(start, end), ...]} of busy minutes per day"""
+    events = standalone_events(conn, window_start, window_end)
+    busy = {}
+    for day in iter_days(window_start, window_end):
+        intervals = interval_index.day(conn, day)
+        extra = sorted(events.get(day, ()))
+        merged = sweep(merge(zip(intervals.starts, intervals.ends), extra))
+        if merged:
+            busy[day] = merged
+    return busy
+
+def sweep(intervals):
+    """Merge (start, end) intervals sorted by start into disjoint busy blocks"""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [tuple(block) for block in merged]
+
+def gaps(busy, day_start, day_end, duration=1):
+    """Free (start, end) stretches of at least `duration` minutes between busy blocks"""
+    free = []
+    cursor = day_start
+    for start, end in busy:
+        if start >= day_end:
+            break
+        if start - cursor >= duration:
+            free.append((cursor, start))
+        cursor = max(cursor, end)
+    if day_end - cursor >= duration:
+        free.append((cursor, day_end))
+    return free
+
+def find_free_slots(conn, window_start, window_end, duration=30,
+                    working_hours=WORKING_HOURS, not_before=None, limit=None, busy=None):
+    """Free (date, start, end) stretches of at least `duration` minutes
+
+    Only working hours are considered, and nothing before `not_before`
+    (a datetime, typically now). Times are minutes since midnight; `busy`
+    may pass in an already computed busy_by_day result.
+    """
+    day_start, day_end = (to_minutes(value) for value in working_hours)
+    if busy is None:
+        busy = busy_by_day(conn, window_start, window_end)
+    slots = []
+    for day in iter_days(window_start, window_end):
+        opens = day_start
+        if not_before is not None:
+            today = not_before.date().isoformat()
+            if day < today:
+                continue
+            if day == today:
+                opens = max(opens, not_before.hour * 60 + not_before.minute)
+        for start, end in gaps(busy.get(day, ()), opens, day_end, duration):
+            slots.append((day, start, end))
+            if limit and len(slots) >= limit:
+                return slots
+    return slots
+
+def first_free_slot(conn, day, duration, days=7, now=None):
+    """(date, 'HH:MM', 'HH:MM') for the earliest free slot from `day` on, or None"""
+    now = now or datetime.now()
+    window_end = (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+    slots = find_free_slots(conn, day, window_end, duration, not_before=now, limit=1)
+    if not slots:
+        return None
+    slot_day, start, _ = slots[0]
+    return slot_day, format_minutes(start), format_minutes(start + duration)
@@ -0,0 +1,446 @@
+import re
+from datetime import date, datetime, timedelta, timezone
+from recurrence import SIMPLE_PATTERNS, is_recurring, load_exceptions
+from reminders import parse_offset
+from mutations import habits_changed
+from utils import get_db_connection
+
+PRODID = '-//Calendar Tracker//Habits//EN'
+
+# Habit rows per fetchmany batch when exporting
+EXPORT_BATCH_SIZE = 1000
+
+# Events per transaction when importing
+IMPORT_CHUNK_SIZE = 5000
+
+EXPORT_COLUMNS = """
+    SELECT id, date, habit, start_time, end_time, description, category,
+           priority, color, recurrence_pattern, reminder_time, last_modified
+    FROM habits
+"""
+
+DATE_TIME_PATTERN = re.compile(r'^\d{8}(T\d{6}Z?)?$')
+
+DURATION_PATTERN = re.compile(
+    r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$'
+)
+
+# habits.priority (1 low .. 3 high) against iCalendar PRIORITY (1 high .. 9 low)
+PRIORITY_TO_ICS = {1: 9, 2: 5, 3: 1}
+
+# Export
+
+def escape_text(value):
+    """Escape a TEXT property value"""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def fold(line):
+    """Fold a content line to 75 octets, as RFC 5545 requires"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split inside a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+def _ics_date(value):
+    return value.replace('-', '')[:8]
+
+def _ics_datetime(day, time_value):
+    clock = (time_value + ':00')[:8] if len(time_value) == 5 else time_value[:8]
+    return f"{_ics_date(day)}T{clock.replace(':', '')}"
+
+def _dtstamp(last_modified):
+    try:
+        stamp = datetime.strptime(last_modified[:19], '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        stamp = datetime.now(timezone.utc).replace(tzinfo=None)
+    return stamp.strftime('%Y%m%dT%H%M%SZ')
+
+def _timing(day, start_time, end_time, prefix=''):
+    """DTSTART/DTEND lines for a timed or all-day instance"""
+    if start_time:
+        lines = [f"{prefix}DTSTART:{_ics_datetime(day, start_time)}"]
+        if end_time:
+            lines.append(f"DTEND:{_ics_datetime(day, end_time)}")
+        return lines
+    next_day = (date.fromisoformat(day[:10]) + timedelta(days=1)).isoformat()
+    return [f"{prefix}DTSTART;VALUE=DATE:{_ics_date(day)}", f"DTEND;VALUE=DATE:{_ics_date(next_day)}"]
+
+def rrule_for(pattern):
+    """RRULE value for a recurrence_pattern, or None for one-off habits"""
+    if not is_recurring(pattern):
+        return None
+    text = pattern.strip()
+    text = SIMPLE_PATTERNS.get(text.lower(), text)
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+    return text.upper()
+
+def trigger_for(reminder):
+    """VALARM TRIGGER value for a reminder_time like '15min'"""
+    offset = parse_offset(reminder)
+    if offset is None:
+        return None
+    minutes = int(offset.total_seconds() // 60)
+    if minutes % 1440 == 0:
+        return f"-P{minutes // 1440}D"
+    if minutes % 60 == 0:
+        return f"-PT{minutes // 60}H"
+    return f"-PT{minutes}M"
+
+def vevent_lines(row, exceptions=()):
+    """Content lines for one habit, plus overrides of single occurrences"""
+    (habit_id, day, title, start_time, end_time, description, category,
+     priority, color, pattern, reminder, last_modified) = row
+    uid = f"habit-{habit_id}@calendar-tracker"
+    stamp = _dtstamp(last_modified)
+
+    lines = ['BEGIN:VEVENT', f"UID:{uid}", f"DTSTAMP:{stamp}"]
+    lines.extend(_timing(day, start_time, end_time))
+    lines.append(f"SUMMARY:{escape_text(title)}")
+    if description:
+        lines.append(f"DESCRIPTION:{escape_text(description)}")
+    if category:
+        lines.append(f"CATEGORIES:{escape_text(category)}")
+    if priority in PRIORITY_TO_ICS:
+        lines.append(f"PRIORITY:{PRIORITY_TO_ICS[priority]}")
+    if color:
+        lines.append(f"X-CALENDAR-TRACKER-COLOR:{escape_text(color)}")
+
+    rrule = rrule_for(pattern)
+    overrides = []
+    if rrule:
+        lines.append(f"RRULE:{rrule}")
+        for occurrence_date, cancelled, new_date, new_start, new_end in exceptions:
+            if cancelled:
+                if start_time:
+                    lines.append(f"EXDATE:{_ics_datetime(occurrence_date, start_time)}")
+                else:
+                    lines.append(f"EXDATE;VALUE=DATE:{_ics_date(occurrence_date)}")
+            else:
+                overrides.append((occurrence_date, new_date, new_start, new_end))
+
+    trigger = trigger_for(reminder)
+    if trigger:
+        lines.extend(['BEGIN:VALARM', 'ACTION:DISPLAY', f"DESCRIPTION:{escape_text(title)}",
+                      f"TRIGGER:{trigger}", 'END:VALARM'])
+    lines.append('END:VEVENT')
+
+    for occurrence_date, new_date, new_start, new_end in overrides:
+        if start_time:
+            recurrence_id = f"RECURRENCE-ID:{_ics_datetime(occurrence_date, start_time)}"
+        else:
+            recurrence_id = f"RECURRENCE-ID;VALUE=DATE:{_ics_date(occurrence_date)}"
+        lines.extend(['BEGIN:VEVENT', f"UID:{uid}", f"DTSTAMP:{stamp}", recurrence_id])
+        lines.extend(_timing(new_date or occurrence_date, new_start or start_time, new_end or end_time))
+        lines.extend([f"SUMMARY:{escape_text(title)}", 'END:VEVENT'])
+    return lines
+
+def export_calendar(batch_size=EXPORT_BATCH_SIZE):
+    """Yield an iCalendar document for every habit, one batch of rows at a time"""
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f"PRODID:{PRODID}", 'CALSCALE:GREGORIAN'
+    ))
+    with get_db_connection() as conn:
+        conn.execute("BEGIN")
+        c = conn.cursor()
+        c.execute(EXPORT_COLUMNS + " ORDER BY id")
+        while True:
+            rows = c.fetchmany(batch_size)
+            if not rows:
+                break
+            exceptions = load_exceptions(conn, [row[0] for row in rows if is_recurring(row[9])])
+            yield ''.join(
+                fold(line)
+                for row in rows
+                for line in vevent_lines(row, exceptions.get(row[0], ()))
+            )
+    yield fold('END:VCALENDAR')
+
+# Import
+
+def unfold(stream):
+    """Logical content lines from an iterable of raw (bytes or str) lines"""
+    pending = None
+    for raw in stream:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8', errors='replace')
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and pending is not None:
+            pending += line[1:]
+            continue
+        if pending:
+            yield pending
+        pending = line
+    if pending:
+        yield pending
+
+def parse_line(line):
+    """Split a content line into (NAME, {PARAM: value}, value)"""
+    colon = line.find(':')
+    semicolon = line.find(';', 0, colon)
+    if colon < 0:
+        return None, {}, ''
+    if semicolon < 0:
+        # No parameters, the common case
+        return line[:colon].upper(), {}, line[colon + 1:]
+
+    in_quotes = False
+    for index in range(semicolon, len(line)):
+        char = line[index]
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return None, {}, ''
+
+    name, *raw_params = head.split(';')
+    params = {}
+    for param in raw_params:
+        if '=' in param:
+            key, param_value = param.split('=', 1)
+            params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+def unescape_text(value):
+    """Undo TEXT escaping"""
+    if '\\' not in value:
+        return value
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+def parse_events(stream):
+    """Incrementally yield VEVENT property dicts from an iCalendar stream"""
+    event = None
+    in_alarm = False
+    for line in unfold(stream):
+        name, params, value = parse_line(line)
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT':
+                event = {'EXDATE': []}
+            elif value.upper() == 'VALARM' and event is not None:
+                in_alarm = True
+            continue
+        if name == 'END':
+            if value.upper() == 'VALARM':
+                in_alarm = False
+            elif value.upper() == 'VEVENT' and event is not None:
+                yield event
+                event = None
+            continue
+        if event is None or name is None:
+            continue
+        if in_alarm:
+            if name == 'TRIGGER' and 'TRIGGER' not in event:
+                event['TRIGGER'] = value
+            continue
+        if name == 'EXDATE':
+            event['EXDATE'].extend((v, params) for v in value.split(','))
+        elif name not in event:
+            event[name] = (value, params)
+
+def parse_when(value, params):
+    """(YYYY-MM-DD, HH:MM or None) for a DATE or DATE-TIME value"""
+    value = value.strip()
+    if not DATE_TIME_PATTERN.match(value):
+        raise ValueError(f"Invalid date: {value}")
+    day = date.fromisoformat(f"{value[:4]}-{value[4:6]}-{value[6:8]}").isoformat()
+    if len(value) == 8 or params.get('VALUE', '').upper() == 'DATE':
+        return day, None
+    if value.endswith('Z'):
+        # UTC times become local wall-clock times, like the rest of the app
+        moment = datetime(
+            int(value[:4]), int(value[4:6]), int(value[6:8]),
+            int(value[9:11]), int(value[11:13]), tzinfo=timezone.utc
+        ).astimezone()
+        return moment.strftime('%Y-%m-%d'), moment.strftime('%H:%M')
+    return day, f"{value[9:11]}:{value[11:13]}"
+
+def parse_duration(value):
+    """timedelta for an iCalendar DURATION, or None"""
+    match = DURATION_PATTERN.match(value.strip().upper())
+    if not match:
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    delta = timedelta(
+        weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+        minutes=int(minutes or 0), seconds=int(seconds or 0)
+    )
+    return -delta if sign == '-' else delta
+
+def reminder_for(trigger):
+    """reminder_time value for a relative VALARM TRIGGER"""
+    delta = parse_duration(trigger) if trigger else None
+    if delta is None or delta > timedelta(0):
+        return None
+    minutes = int(-delta.total_seconds() // 60)
+    if minutes % 1440 == 0 and minutes:
+        return f"{minutes // 1440}day"
+    if minutes % 60 == 0 and minutes:
+        return f"{minutes // 60}hour"
+    return f"{minutes}min"
+
+def habit_from_event(event):
+    """Map parsed VEVENT properties to a habits row, or None if unusable"""
+    if 'DTSTART' not in event:
+        return None
+    day, start_time = parse_when(*event['DTSTART'])
+    end_time = None
+    if start_time:
+        if 'DTEND' in event:
+            end_day, end_time = parse_when(*event['DTEND'])
+            if end_day != day:
+                end_time = None
+        elif 'DURATION' in event:
+            delta = parse_duration(event['DURATION'][0])
+            if delta:
+                ends = datetime.strptime(f"{day} {start_time}", '%Y-%m-%d %H:%M') + delta
+                if ends.strftime('%Y-%m-%d') == day:
+                    end_time = ends.strftime('%H:%M')
+
+    title = unescape_text(event.get('SUMMARY', ('Untitled', {}))[0]) or 'Untitled'
+    description = unescape_text(event['DESCRIPTION'][0]) if 'DESCRIPTION' in event else None
+    category = unescape_text(event['CATEGORIES'][0]).split(',')[0] if 'CATEGORIES' in event else 'default'
+    priority = 1
+    if 'PRIORITY' in event:
+        try:
+            ics_priority = int(event['PRIORITY'][0])
+            priority = 3 if 1 <= ics_priority <= 4 else 2 if ics_priority == 5 else 1
+        except ValueError:
+            pass
+    color = unescape_text(event['X-CALENDAR-TRACKER-COLOR'][0]) if 'X-CALENDAR-TRACKER-COLOR' in event else None
+    rrule = event['RRULE'][0] if 'RRULE' in event and is_recurring(event['RRULE'][0]) else None
+
+    return (day, title, start_time, end_time, description, category, priority, color,
+            rrule, reminder_for(event.get('TRIGGER')))
+
+def _flush(conn, rows, exdates, uids, masters):
+    """Insert one chunk of habits and their calendar_events in a single transaction"""
+    c = conn.cursor()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM habits")
+        last_id = c.fetchone()[0]
+        c.executemany("""
+            INSERT INTO habits (
+                date, habit, start_time, end_time, description,
+                category, priority, color, recurrence_pattern, reminder_time
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        c.execute("SELECT id FROM habits WHERE id > ? ORDER BY id LIMIT ?", (last_id, len(rows)))
+        ids = [row[0] for row in c.fetchall()]
+
+        c.executemany("""
+            INSERT INTO calendar_events
+            (habit_id, title, description, start_datetime, end_datetime, all_day, recurrence)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (habit_id, row[1], row[4],
+             f"{row[0]} {row[2]}" if row[2] else f"{row[0]} 00:00:00",
+             f"{row[0]} {row[3]}" if row[3] else f"{row[0]} 23:59:59",
+             0 if row[2] and row[3] else 1, row[8])
+            for habit_id, row in zip(ids, rows)
+        ])
+
+        cancelled = []
+        for habit_id, row, dates, uid in zip(ids, rows, exdates, uids):
+            if row[8]:
+                masters[uid] = habit_id
+                cancelled.extend((habit_id, occurrence_date) for occurrence_date in dates)
+        c.executemany("""
+            INSERT OR IGNORE INTO habit_exceptions (habit_id, occurrence_date, cancelled)
+            VALUES (?, ?, 1)
+        """, cancelled)
+
+        habits_changed(conn, ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(ids)
+
+def parse_chunks(stream, chunk_size, result, overrides):
+    """Yield (rows, exdates, uids) lists of at most chunk_size events
+
+    Unusable events are counted in result['skipped']; RECURRENCE-ID
+    overrides are collected into overrides for the caller to apply last.
+    """
+    rows, exdates, uids = [], [], []
+    for event in parse_events(stream):
+        try:
+            if 'RECURRENCE-ID' in event:
+                overrides.append((
+                    event.get('UID', ('', {}))[0],
+                    parse_when(*event['RECURRENCE-ID'])[0],
+                    *habit_from_event(event)[:4]
+                ))
+                continue
+            row = habit_from_event(event)
+            dates = [parse_when(value, params)[0] for value, params in event['EXDATE']]
+        except (ValueError, TypeError, KeyError):
+            row = None
+        if row is None:
+            result['skipped'] += 1
+            continue
+
+        rows.append(row)
+        exdates.append(dates)
+        uids.append(event.get('UID', ('', {}))[0])
+        if len(rows) >= chunk_size:
+            yield rows, exdates, uids
+            rows, exdates, uids = [], [], []
+    if rows:
+        yield rows, exdates, uids
+
+def import_calendar(stream, chunk_size=IMPORT_CHUNK_SIZE):
+    """Bulk-load VEVENTs from an iCalendar stream in chunked transactions"""
+    result = {'imported': 0, 'skipped': 0, 'overrides': 0}
+    # Only recurring masters are remembered, so overrides can find their series
+    masters = {}
+    overrides = []
+
+    with get_db_connection() as conn:
+        for rows, exdates, uids in parse_chunks(stream, chunk_size, result, overrides):
+            result['imported'] += _flush(conn, rows, exdates, uids, masters)
+
+        # Overrides of single occurrences, applied once their series exist
+        applied = [
+            (masters[uid], occurrence_date, new_date, new_start, new_end)
+            for uid, occurrence_date, new_date, _, new_start, new_end in overrides
+            if uid in masters
+        ]
+        result['skipped'] += len(overrides) - len(applied)
+        if applied:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("""
+                INSERT INTO habit_exceptions
+                (habit_id, occurrence_date, cancelled, new_date, new_start_time, new_end_time)
+                VALUES (?, ?, 0, ?, ?, ?)
+                ON CONFLICT (habit_id, occurrence_date) DO UPDATE SET
+                    cancelled = 0,
+                    new_date = excluded.new_date,
+                    new_start_time = excluded.new_start_time,
+                    new_end_time = excluded.new_end_time
+            """, applied)
+            # Like set_exception, move the series to a fresh expansion cache key
+            conn.executemany(
+                "UPDATE habits SET last_modified = CURRENT_TIMESTAMP WHERE id = ?",
+                {(row[0],) for row in applied}
+            )
+            habits_changed(conn, [row[0] for row in applied])
+            conn.commit()
+            result['overrides'] = len(applied)
+
+    return result
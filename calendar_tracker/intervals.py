@@ -0,0 +1,264 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, timedelta
+from itertools import accumulate
+from recurrence import expand_habit, is_recurring, load_exceptions
+from occurrences import covers, get_horizon
+from serializers import HABIT_COLUMNS, SERIES_HABITS_WINDOW
+from versions import range_version
+
+# Days kept in the in-process overlap index
+INTERVAL_CACHE_DAYS = int(os.getenv('INTERVAL_CACHE_DAYS', 2048))
+
+# How far ahead a new or moved recurring series is checked for conflicts
+CONFLICT_CHECK_DAYS = 90
+
+# Length given to events scheduled with a start time only (e.g. from chat)
+DEFAULT_DURATION_MINUTES = 60
+
+DAY_MINUTES = 24 * 60
+
+# Timed occurrences of one date, from the materialized table
+DAY_OCCURRENCES = """
+    SELECT habit_id, start_time, end_time FROM habit_occurrences
+    WHERE date = ? AND start_time IS NOT NULL AND end_time IS NOT NULL
+"""
+
+# Outside the materialized horizon: timed one-off habits of one date, and
+# the series starting before its end, which are expanded
+DAY_SINGLE_HABITS = """
+    SELECT id, start_time, end_time FROM habits
+    WHERE (recurrence_pattern IS NULL OR recurrence_pattern = '')
+    AND date >= ? AND date < ?
+    AND start_time IS NOT NULL AND end_time IS NOT NULL
+"""
+
+DAY_SERIES = SERIES_HABITS_WINDOW.format(conditions=" AND h.date < ?")
+
+def to_minutes(value):
+    """Minutes since midnight for an 'HH:MM' or 'HH:MM:SS' time"""
+    return int(value[:2]) * 60 + int(value[3:5])
+
+def format_minutes(minutes):
+    """'HH:MM' for minutes since midnight (24:00 for the end of the day)"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def end_time_after(start_time, minutes=DEFAULT_DURATION_MINUTES):
+    """'HH:MM' end for an event starting at start_time, kept within the same day"""
+    return format_minutes(min(to_minutes(start_time) + minutes, DAY_MINUTES - 1))
+
+def as_interval(start_time, end_time):
+    """(start, end) minutes for a timed event, or None for all-day ones
+
+    Events ending at or before their start run until midnight; the calendar
+    has no events that cross into the next day.
+    """
+    if not (start_time and end_time):
+        return None
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    return start, end if end > start else DAY_MINUTES
+
+class DayIntervals:
+    """The timed occurrences of one day, sorted by start time.
+
+    Alongside the sorted starts it keeps a running maximum of end times.
+    Everything starting before `end` lies in a prefix of the list, and that
+    prefix overlaps [start, end) exactly when its largest end is past
+    `start`, so "is this slot taken" is one bisect and one lookup.
+    """
+
+    __slots__ = ('starts', 'ends', 'max_ends', 'habit_ids')
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals)
+        self.starts = [interval[0] for interval in intervals]
+        self.ends = [interval[1] for interval in intervals]
+        self.habit_ids = [interval[2] for interval in intervals]
+        self.max_ends = list(accumulate(self.ends, max))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        """True if anything overlaps [start, end)"""
+        k = bisect_left(self.starts, end)
+        return k > 0 and self.max_ends[k - 1] > start
+
+    def overlapping(self, start, end, exclude=()):
+        """(start, end, habit_id) of every interval overlapping [start, end)"""
+        found = []
+        # Walk back from the last interval starting before `end` while the
+        # running maximum shows an overlap may still be further left
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] > start:
+            if self.ends[i] > start and self.habit_ids[i] not in exclude:
+                found.append((self.starts[i], self.ends[i], self.habit_ids[i]))
+            i -= 1
+        found.reverse()
+        return found
+
+def load_day(conn, day):
+    """(start, end, habit_id) for the timed occurrences on one date"""
+    c = conn.cursor()
+    next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    if covers(get_horizon(conn), day, next_day):
+        c.execute(DAY_OCCURRENCES, (day,))
+        rows = c.fetchall()
+    else:
+        # Outside the materialized horizon: one-off habits plus expanded series
+        c.execute(DAY_SINGLE_HABITS, (day, next_day))
+        rows = c.fetchall()
+        c.execute(DAY_SERIES, (next_day,))
+        series = c.fetchall()
+        exceptions = load_exceptions(conn, [row[0] for row in series])
+        for row in series:
+            habit = dict(zip(HABIT_COLUMNS, row))
+            for occurrence in expand_habit(habit, exceptions.get(habit['id'], ()), day, next_day):
+                rows.append((habit['id'], occurrence.start_time, occurrence.end_time))
+
+    intervals = []
+    for habit_id, start_time, end_time in rows:
+        interval = as_interval(start_time, end_time)
+        if interval:
+            intervals.append((*interval, habit_id))
+    return intervals
+
+def proposed_intervals(day, start_time, end_time, pattern=None, days=CONFLICT_CHECK_DAYS):
+    """(date, start, end) slots a habit would occupy: one, or the first `days` of a series"""
+    interval = as_interval(start_time, end_time)
+    if not interval:
+        return []
+    if not is_recurring(pattern):
+        return [(day, *interval)]
+
+    habit = {
+        'id': 0, 'date': day, 'recurrence_pattern': pattern,
+        'start_time': start_time, 'end_time': end_time, 'last_modified': None,
+    }
+    window_end = (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+    return [(occurrence.date, *interval) for occurrence in expand_habit(habit, (), day, window_end)]
+
+class IntervalIndex:
+    """Per-day overlap index over timed habit occurrences.
+
+    Days are loaded on first use and kept in an LRU. Each entry remembers
+    the calendar version token of its month and is only used while that
+    token is current, so writes from other workers are picked up too;
+    habits_changed additionally drops the days a write touched.
+
+    Writers check for conflicts inside their BEGIN IMMEDIATE, before they
+    write. The token read there is the committed one (or already counts
+    this connection's own writes), so entries are used and stored inside
+    transactions as well.
+    """
+
+    def __init__(self, max_days=INTERVAL_CACHE_DAYS):
+        self.max_days = max_days
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'checks': 0,
+            'conflicts': 0,
+            'invalidations': 0,
+        }
+
+    def day(self, conn, day, token=None):
+        """DayIntervals for a date, loading it if missing or stale"""
+        if token is None:
+            token = range_version(conn, day, day)[0]
+        with self._lock:
+            entry = self._days.get(day)
+            if entry is not None and entry[0] == token:
+                self._days.move_to_end(day)
+                self._stats['hits'] += 1
+                return entry[1]
+            self._stats['misses'] += 1
+
+        intervals = DayIntervals(load_day(conn, day))
+        with self._lock:
+            self._days[day] = (token, intervals)
+            self._days.move_to_end(day)
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return intervals
+
+    def conflicts(self, conn, slots, exclude=(), exclude_on=()):
+        """Existing occurrences overlapping any (date, start, end) slot
+
+        Returns a list of {id, title, date, start, end} dicts; habits in
+        `exclude` (e.g. the one being moved) are ignored, and each
+        (date, habit_id) in `exclude_on` only on that date (a single
+        occurrence being moved).
+        """
+        exclude = {int(habit_id) for habit_id in exclude}
+        excluded_on = {}
+        for day, habit_id in exclude_on:
+            excluded_on.setdefault(day, set(exclude)).add(int(habit_id))
+        tokens = {}
+        found = []
+        for day, start, end in slots:
+            month = day[:7]
+            if month not in tokens:
+                tokens[month] = range_version(conn, day, day)[0]
+            intervals = self.day(conn, day, tokens[month])
+            if not intervals.overlaps(start, end):
+                continue
+            found.extend(
+                (day, *interval)
+                for interval in intervals.overlapping(start, end, excluded_on.get(day, exclude))
+            )
+
+        with self._lock:
+            self._stats['checks'] += 1
+            if found:
+                self._stats['conflicts'] += 1
+        if not found:
+            return []
+
+        c = conn.cursor()
+        ids = list({habit_id for *_, habit_id in found})
+        c.execute(f"SELECT id, habit FROM habits WHERE id IN ({','.join('?' * len(ids))})", ids)
+        titles = dict(c.fetchall())
+        return [
+            {
+                'id': habit_id,
+                'title': titles.get(habit_id),
+                'date': day,
+                'start': format_minutes(start),
+                'end': format_minutes(end),
+            }
+            for day, start, end, habit_id in found
+        ]
+
+    def invalidate(self, date_ranges):
+        """Drop the cached days inside any inclusive (first, last) date range"""
+        with self._lock:
+            doomed = [
+                day for day in self._days
+                if any(first <= day <= last for first, last in date_ranges)
+            ]
+            for day in doomed:
+                del self._days[day]
+            self._stats['invalidations'] += len(doomed)
+
+    def clear(self):
+        """Drop every cached day"""
+        with self._lock:
+            self._days.clear()
+
+    def stats(self):
+        """Hit ratio and size of the index"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['days'] = len(self._days)
+            stats['intervals'] = sum(len(entry[1]) for entry in self._days.values())
+        stats['max_days'] = self.max_days
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+interval_index = IntervalIndex()
@@ -0,0 +1,140 @@
+import threading
+from utils import get_db_connection
+
+# Tombstones older than this are dropped; clients whose cursor predates the
+# oldest dropped tombstone are told to reload instead of applying deltas
+TOMBSTONE_RETENTION_DAYS = 30
+
+COMPACTION_INTERVAL_SECONDS = 60 * 60
+
+# Maximum changed habits returned per /habits/changes page
+CHANGES_PAGE_SIZE = 500
+
+# Latest entry of each habit changed after a cursor
+CHANGES_SINCE = """
+    SELECT habit_id, op, seq FROM change_journal j
+    WHERE seq > ?
+    AND seq = (SELECT MAX(seq) FROM change_journal WHERE habit_id = j.habit_id)
+    ORDER BY seq
+    LIMIT ?
+"""
+
+def create_journal_tables(c):
+    """Create the append-only change journal and its compaction watermark"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS change_journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_change_journal_habit
+        ON change_journal (habit_id, seq)
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS journal_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            floor_seq INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute("INSERT OR IGNORE INTO journal_state (id, floor_seq) VALUES (1, 0)")
+
+def record_changes(conn, habit_ids):
+    """Append an upsert or tombstone entry for each habit, by whether it still exists"""
+    c = conn.cursor()
+    existing = set()
+    for offset in range(0, len(habit_ids), 900):
+        chunk = habit_ids[offset:offset + 900]
+        c.execute(
+            f"SELECT id FROM habits WHERE id IN ({','.join('?' * len(chunk))})", chunk
+        )
+        existing.update(row[0] for row in c.fetchall())
+
+    c.executemany(
+        "INSERT INTO change_journal (habit_id, op) VALUES (?, ?)",
+        [(habit_id, 'upsert' if habit_id in existing else 'delete') for habit_id in habit_ids]
+    )
+
+def current_cursor(conn):
+    """Sequence number of the latest journal entry (0 if none was ever written)"""
+    # AUTOINCREMENT's high-water mark survives compaction, unlike MAX(seq)
+    c = conn.cursor()
+    c.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_journal'")
+    row = c.fetchone()
+    return row[0] if row else 0
+
+def journal_floor(conn):
+    """Oldest cursor that can still be served deltas"""
+    c = conn.cursor()
+    c.execute("SELECT floor_seq FROM journal_state WHERE id = 1")
+    row = c.fetchone()
+    return row[0] if row else 0
+
+def changes_since(conn, cursor, limit=CHANGES_PAGE_SIZE):
+    """Latest operation per habit changed after cursor, oldest first
+
+    Returns (changes, next_cursor, more) where changes is a list of
+    (habit_id, op) pairs.
+    """
+    c = conn.cursor()
+    c.execute(CHANGES_SINCE, (cursor, limit + 1))
+    rows = c.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = rows[-1][2] if more else max(cursor, current_cursor(conn))
+    return [(habit_id, op) for habit_id, op, _ in rows], next_cursor, more
+
+def compact_journal(conn, retention_days=TOMBSTONE_RETENTION_DAYS):
+    """Drop superseded entries and old tombstones; returns rows removed"""
+    c = conn.cursor()
+
+    # Only the newest entry per habit matters to any client
+    c.execute("""
+        DELETE FROM change_journal
+        WHERE seq < (SELECT MAX(seq) FROM change_journal j WHERE j.habit_id = change_journal.habit_id)
+    """)
+    removed = c.rowcount
+
+    c.execute("""
+        SELECT MAX(seq) FROM change_journal
+        WHERE op = 'delete' AND changed_at < datetime('now', ?)
+    """, (f'-{retention_days} days',))
+    dropped_through = c.fetchone()[0]
+    if dropped_through:
+        c.execute("""
+            DELETE FROM change_journal
+            WHERE op = 'delete' AND seq <= ?
+        """, (dropped_through,))
+        removed += c.rowcount
+        c.execute("""
+            UPDATE journal_state SET floor_seq = MAX(floor_seq, ?) WHERE id = 1
+        """, (dropped_through,))
+
+    return removed
+
+_compaction_thread = None
+_compaction_stop = threading.Event()
+
+def start_compaction_job(interval=COMPACTION_INTERVAL_SECONDS):
+    """Start the background thread that compacts the change journal"""
+    global _compaction_thread
+    if _compaction_thread and _compaction_thread.is_alive():
+        return _compaction_thread
+
+    def run():
+        while not _compaction_stop.wait(interval):
+            try:
+                with get_db_connection() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    removed = compact_journal(conn)
+                    conn.commit()
+                if removed:
+                    print(f"Change journal compacted ({removed} entries removed)")
+            except Exception as e:
+                print(f"Error compacting change journal: {str(e)}")
+
+    _compaction_thread = threading.Thread(target=run, name='journal-compaction', daemon=True)
+    _compaction_thread.start()
+    return _compaction_thread
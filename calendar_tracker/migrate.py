@@ -1,48 +1,244 @@
 import sqlite3
-from models import init_db, migrate_existing_data
+from models import create_tables, add_legacy_columns, add_generated_columns, create_indexes
+from search import create_search_index
+from recurrence import create_exceptions_table
+from occurrences import create_occurrences_tables, rebuild_occurrences
+from reminders import create_reminders_table, refresh_reminders
+from versions import create_version_tracking, create_tracking_version, create_event_version
+from journal import create_journal_tables
+from rollups import create_rollup_tables, create_rollup_triggers, rebuild_rollups
 from utils import get_db_connection
+from query_plans import find_full_scans
+
+# Rows per executemany batch in data backfills (all in the step's transaction)
+BACKFILL_CHUNK_SIZE = 5000
+
+def backfill_calendar_events(conn, progress):
+    """Create a calendar event for every habit that does not have one yet"""
+    c = conn.cursor()
+    c.execute("""
+        SELECT COUNT(*) FROM habits h
+        WHERE h.date IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM calendar_events ce WHERE ce.habit_id = h.id)
+    """)
+    total = c.fetchone()[0]
+    done = 0
+    last_id = 0
+
+    while True:
+        # NOT EXISTS keeps re-runs and interrupted runs from duplicating events
+        c.execute("""
+            SELECT id, date, habit, start_time, end_time
+            FROM habits h
+            WHERE h.id > ? AND h.date IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM calendar_events ce WHERE ce.habit_id = h.id)
+            ORDER BY h.id
+            LIMIT ?
+        """, (last_id, BACKFILL_CHUNK_SIZE))
+        habits = c.fetchall()
+        if not habits:
+            break
+
+        rows = []
+        for habit_id, date, title, start_time, end_time in habits:
+            # Convert date and times to proper datetime
+            start_datetime = f"{date} {start_time}" if start_time else f"{date} 00:00:00"
+            end_datetime = f"{date} {end_time}" if end_time else f"{date} 23:59:59"
+            rows.append((
+                habit_id,
+                title,
+                start_datetime,
+                end_datetime,
+                1 if not (start_time and end_time) else 0
+            ))
+
+        c.executemany("""
+            INSERT INTO calendar_events
+            (habit_id, title, start_datetime, end_datetime, all_day)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+
+        done += len(rows)
+        last_id = habits[-1][0]
+        progress(f"  … {done}/{total} calendar events backfilled")
+
+def create_core_tables(conn, progress):
+    """Create the core tables"""
+    create_tables(conn.cursor())
+
+def upgrade_legacy_columns(conn, progress):
+    """Add columns that early databases are missing"""
+    add_legacy_columns(conn.cursor())
+
+def add_range_indexes(conn, progress):
+    """Add the start_date generated column and secondary indexes"""
+    c = conn.cursor()
+    add_generated_columns(c)
+    create_indexes(c)
+
+def add_search_index(conn, progress):
+    """Create and populate the full-text search index"""
+    create_search_index(conn.cursor())
+
+def add_recurrence_exceptions(conn, progress):
+    """Create the recurrence exceptions table and series index"""
+    create_exceptions_table(conn.cursor())
+
+def materialize_occurrences(conn, progress):
+    """Create the occurrence table and materialize every habit into it"""
+    create_occurrences_tables(conn.cursor())
+    rebuild_occurrences(conn, progress)
+
+def schedule_reminders(conn, progress):
+    """Create the reminders table and queue reminders for existing habits"""
+    c = conn.cursor()
+    create_reminders_table(c)
+    c.execute("""
+        SELECT id FROM habits
+        WHERE reminder_time IS NOT NULL AND reminder_time != ''
+    """)
+    habit_ids = [row[0] for row in c.fetchall()]
+    for offset in range(0, len(habit_ids), BACKFILL_CHUNK_SIZE):
+        refresh_reminders(conn, habit_ids[offset:offset + BACKFILL_CHUNK_SIZE])
+        progress(f"  … {min(offset + BACKFILL_CHUNK_SIZE, len(habit_ids))}/{len(habit_ids)} habits scheduled")
+
+def add_version_tracking(conn, progress):
+    """Create the per-month change counters behind the /habits validators"""
+    create_version_tracking(conn.cursor())
+
+def add_change_journal(conn, progress):
+    """Create the change journal behind /habits/changes"""
+    create_journal_tables(conn.cursor())
+
+def add_rollups(conn, progress):
+    """Create the completion and streak rollups and build them from existing data"""
+    c = conn.cursor()
+    create_rollup_tables(c)
+    rebuild_rollups(conn, progress)
+    create_rollup_triggers(c)
+
+def add_analytics_support(conn, progress):
+    """Add the completion date index and tracking change counter behind /analytics"""
+    c = conn.cursor()
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_habit_tracking_status_date
+        ON habit_tracking (status, tracked_date, habit_id)
+    """)
+    create_tracking_version(c)
+
+def add_event_version(conn, progress):
+    """Add the calendar_events change counter behind the cached chat context"""
+    create_event_version(conn.cursor())
+
+# Ordered schema history. Versions are never renumbered or edited once
+# released; new changes are appended as new steps.
+MIGRATIONS = [
+    (1, 'Create core tables', create_core_tables),
+    (2, 'Add columns missing from early databases', upgrade_legacy_columns),
+    (3, 'Add start_date column and secondary indexes', add_range_indexes),
+    (4, 'Create full-text search index', add_search_index),
+    (5, 'Backfill calendar events from habits', backfill_calendar_events),
+    (6, 'Add recurrence exceptions', add_recurrence_exceptions),
+    (7, 'Materialize habit occurrences', materialize_occurrences),
+    (8, 'Add reminder queue', schedule_reminders),
+    (9, 'Add calendar change counters', add_version_tracking),
+    (10, 'Add change journal for delta sync', add_change_journal),
+    (11, 'Add completion and streak rollups', add_rollups),
+    (12, 'Add completion date index and tracking counter', add_analytics_support),
+    (13, 'Add calendar event change counter', add_event_version),
+]
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    c = conn.cursor()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return c.fetchone()[0]
+
+def run_migrations(progress=print):
+    """Apply pending migrations in order; safe to call from every worker at startup"""
+    with get_db_connection() as conn:
+        current = get_schema_version(conn)
+        pending = [m for m in MIGRATIONS if m[0] > current]
+        if not pending:
+            return current
+
+        for version, name, step in pending:
+            # BEGIN IMMEDIATE serializes workers starting at the same time;
+            # re-check under the lock in case another one got here first.
+            # Steps must not commit: the lock is held until the version row
+            # is written, so chunked backfills only bound memory per batch.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                c = conn.cursor()
+                c.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,))
+                if c.fetchone():
+                    conn.commit()
+                    continue
+
+                progress(f"Applying migration {version}: {name}")
+                step(conn, progress)
+                c.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                    (version, name)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        return MIGRATIONS[-1][0]
 
 def migrate_database():
     """Perform database migration"""
     print("Starting database migration...")
-    
+
     try:
-        # Initialize new tables and columns
-        init_db()
-        print("✓ Database schema updated")
-        
-        # Migrate existing habits to calendar events
-        migrate_existing_data()
-        print("✓ Existing habits migrated to calendar events")
-        
+        version = run_migrations()
+        print(f"✓ Database schema at version {version}")
+
         # Verify migration
         with get_db_connection() as conn:
             c = conn.cursor()
-            
+
             # Check tables exist
             c.execute("SELECT name FROM sqlite_master WHERE type='table'")
             tables = [row[0] for row in c.fetchall()]
             required_tables = ['habits', 'habit_tracking', 'chat_history', 'calendar_events']
-            
+
             missing_tables = [table for table in required_tables if table not in tables]
             if missing_tables:
                 print(f"⚠️ Warning: Missing tables: {', '.join(missing_tables)}")
             else:
                 print("✓ All required tables present")
-            
+
+            # Check the hot queries still seek an index
+            scans = find_full_scans(conn)
+            if scans:
+                print(f"⚠️ Warning: Full table scans in: {', '.join(scans)}")
+            else:
+                print("✓ Hot queries use indexes")
+
             # Check for successful data migration
             c.execute("SELECT COUNT(*) FROM habits")
             habits_count = c.fetchone()[0]
-            
+
             c.execute("SELECT COUNT(*) FROM calendar_events")
             events_count = c.fetchone()[0]
-            
+
             print(f"\nMigration Summary:")
             print(f"- Total habits: {habits_count}")
             print(f"- Calendar events: {events_count}")
-        
+
         print("\n✨ Migration completed successfully!")
-        
+
     except Exception as e:
         print(f"\n❌ Error during migration: {str(e)}")
         print("Rolling back changes...")
@@ -1,105 +1,130 @@
 import sqlite3
-from utils import get_db_connection
 from datetime import datetime
 
-def init_db():
-    """Initialize the database with enhanced tracking and chat capabilities"""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        
-        # Core habits table with advanced event features
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS habits (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                habit TEXT NOT NULL,
-                start_time TEXT,
-                end_time TEXT,
-                completed BOOLEAN DEFAULT 0,
-                description TEXT,
-                category TEXT DEFAULT 'default',
-                priority INTEGER DEFAULT 1,
-                color TEXT,
-                recurrence_pattern TEXT,
-                reminder_time TEXT,
-                last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tracking table with enhanced analytics
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS habit_tracking (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                habit_id INTEGER,
-                tracked_date TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                notes TEXT,
-                FOREIGN KEY (habit_id) REFERENCES habits (id)
-            )
-        ''')
+# Schema definitions applied by the versioned migrations in migrate.py
 
-        # Chat history for context-aware conversations
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_message TEXT NOT NULL,
-                bot_response TEXT NOT NULL,
-                context TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+def create_tables(c):
+    """Create the core tables with enhanced tracking and chat capabilities"""
+    # Core habits table with advanced event features
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS habits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            habit TEXT NOT NULL,
+            start_time TEXT,
+            end_time TEXT,
+            completed BOOLEAN DEFAULT 0,
+            description TEXT,
+            category TEXT DEFAULT 'default',
+            priority INTEGER DEFAULT 1,
+            color TEXT,
+            recurrence_pattern TEXT,
+            reminder_time TEXT,
+            last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
 
-        # Calendar events for better scheduling
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS calendar_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                habit_id INTEGER,
-                title TEXT NOT NULL,
-                description TEXT,
-                start_datetime TIMESTAMP NOT NULL,
-                end_datetime TIMESTAMP,
-                all_day BOOLEAN DEFAULT 0,
-                recurrence TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (habit_id) REFERENCES habits (id)
-            )
-        ''')
-        
-        conn.commit()
+    # Tracking table with enhanced analytics
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS habit_tracking (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER,
+            tracked_date TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            notes TEXT,
+            FOREIGN KEY (habit_id) REFERENCES habits (id)
+        )
+    ''')
 
-def migrate_existing_data():
-    """Migrate existing habits to new calendar events table"""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        
-        # Get all habits with dates and times
+    # Chat history for context-aware conversations
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_message TEXT NOT NULL,
+            bot_response TEXT NOT NULL,
+            context TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Calendar events for better scheduling
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS calendar_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER,
+            title TEXT NOT NULL,
+            description TEXT,
+            start_datetime TIMESTAMP NOT NULL,
+            end_datetime TIMESTAMP,
+            all_day BOOLEAN DEFAULT 0,
+            recurrence TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            start_date TEXT GENERATED ALWAYS AS (date(start_datetime)) VIRTUAL,
+            FOREIGN KEY (habit_id) REFERENCES habits (id)
+        )
+    ''')
+
+# Columns added after the first release, with the definition used to add
+# them to databases created before they existed
+LEGACY_COLUMNS = {
+    'habits': {
+        'completed': 'BOOLEAN DEFAULT 0',
+        'description': 'TEXT',
+        'category': "TEXT DEFAULT 'default'",
+        'priority': 'INTEGER DEFAULT 1',
+        'color': 'TEXT',
+        'recurrence_pattern': 'TEXT',
+        'reminder_time': 'TEXT',
+        'last_modified': 'TIMESTAMP',
+        'created_at': 'TIMESTAMP',
+    },
+    'habit_tracking': {
+        'status': "TEXT DEFAULT 'pending'",
+        'notes': 'TEXT',
+    },
+}
+
+def add_legacy_columns(c):
+    """Add columns missing from databases created by older versions"""
+    for table, columns in LEGACY_COLUMNS.items():
+        c.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in c.fetchall()}
+        for column, definition in columns.items():
+            if column not in existing:
+                c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    # ALTER TABLE cannot add a CURRENT_TIMESTAMP default, so stamp old rows
+    c.execute("""
+        UPDATE habits
+        SET last_modified = COALESCE(last_modified, CURRENT_TIMESTAMP),
+            created_at = COALESCE(created_at, CURRENT_TIMESTAMP)
+        WHERE last_modified IS NULL OR created_at IS NULL
+    """)
+
+def add_generated_columns(c):
+    """Add indexable generated columns to tables created by older versions"""
+    c.execute("PRAGMA table_xinfo(calendar_events)")
+    columns = {row[1] for row in c.fetchall()}
+    if 'start_date' not in columns:
         c.execute('''
-            SELECT id, date, habit, start_time, end_time
-            FROM habits
-            WHERE date IS NOT NULL
+            ALTER TABLE calendar_events
+            ADD COLUMN start_date TEXT GENERATED ALWAYS AS (date(start_datetime)) VIRTUAL
         ''')
-        
-        habits = c.fetchall()
-        
-        for habit in habits:
-            habit_id, date, title, start_time, end_time = habit
-            
-            # Convert date and times to proper datetime
-            start_datetime = f"{date} {start_time}" if start_time else f"{date} 00:00:00"
-            end_datetime = f"{date} {end_time}" if end_time else f"{date} 23:59:59"
-            
-            # Insert into calendar_events
-            c.execute('''
-                INSERT INTO calendar_events 
-                (habit_id, title, start_datetime, end_datetime, all_day)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                habit_id,
-                title,
-                start_datetime,
-                end_datetime,
-                1 if not (start_time and end_time) else 0
-            ))
-        
-        conn.commit()
+
+# Secondary indexes backing the calendar range queries and chat lookups
+INDEXES = {
+    'idx_habits_date_start': 'habits (date, start_time)',
+    'idx_habits_category_date': 'habits (category, date, start_time)',
+    'idx_habits_priority_date': 'habits (priority, date, start_time)',
+    'idx_habit_tracking_habit': 'habit_tracking (habit_id, tracked_date)',
+    'idx_calendar_events_start_date': 'calendar_events (start_date, start_datetime)',
+    'idx_calendar_events_start': 'calendar_events (start_datetime)',
+    'idx_calendar_events_habit': 'calendar_events (habit_id)',
+    'idx_chat_history_timestamp': 'chat_history (timestamp)',
+}
+
+def create_indexes(c):
+    """Create the secondary indexes used by the hot calendar queries"""
+    for name, definition in INDEXES.items():
+        c.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
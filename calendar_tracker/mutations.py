@@ -0,0 +1,58 @@
+from occurrences import occurrence_ranges, refresh_habits
+from reminders import refresh_reminders
+from journal import record_changes
+from query_cache import habits_cache
+from intervals import interval_index
+from rollups import refresh_rollups
+from prompt_context import prompt_context
+
+# Single entry point for keeping derived calendar data in step with writes to
+# habits. Call it inside the writing transaction, before commit, with the ids
+# of every habit that was inserted, updated or deleted.
+
+def habits_changed(conn, habit_ids):
+    """Bring occurrences, reminders, the change journal, rollups and the read caches in line with the given habits"""
+    habit_ids = list(dict.fromkeys(int(habit_id) for habit_id in habit_ids))
+    if not habit_ids:
+        return
+
+    # Dates the habits covered before and after the write bound the cached
+    # /habits windows that can have changed
+    before = occurrence_ranges(conn, habit_ids)
+    refresh_habits(conn, habit_ids)
+    after = occurrence_ranges(conn, habit_ids)
+
+    refresh_reminders(conn, habit_ids)
+    record_changes(conn, habit_ids)
+    refresh_rollups(
+        conn, habit_ids,
+        moved={habit_id for habit_id in habit_ids if before.get(habit_id) != after.get(habit_id)}
+    )
+
+    spans = list(before.values()) + list(after.values())
+    date_ranges = [(first, last) for first, last, _ in spans]
+    habits_cache.invalidate(
+        date_ranges,
+        series_changed=any(count > 1 for _, _, count in spans) or has_series(conn, habit_ids)
+    )
+    interval_index.invalidate(date_ranges)
+    prompt_context.invalidate()
+
+def has_series(conn, habit_ids):
+    """True if any of the habits is a recurring series"""
+    c = conn.cursor()
+    for offset in range(0, len(habit_ids), 900):
+        chunk = habit_ids[offset:offset + 900]
+        c.execute(f"""
+            SELECT 1 FROM habits
+            WHERE id IN ({','.join('?' * len(chunk))})
+            AND recurrence_pattern IS NOT NULL AND recurrence_pattern != ''
+            LIMIT 1
+        """, chunk)
+        if c.fetchone():
+            return True
+    return False
+
+def habit_changed(conn, habit_id):
+    """Bring derived data in line with a single habit"""
+    habits_changed(conn, [habit_id])
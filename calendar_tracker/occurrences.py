@@ -0,0 +1,257 @@
+import threading
+from datetime import date, timedelta
+from recurrence import expand_habit, load_exceptions, is_recurring
+from utils import get_db_connection
+from reminders import refresh_reminders
+
+# Rolling window over which recurring series are materialized. One-off
+# habits are always materialized, wherever they fall.
+HORIZON_PAST_DAYS = 365
+HORIZON_FUTURE_DAYS = 400
+
+# How often the background job checks whether the horizon needs extending
+HORIZON_CHECK_SECONDS = 6 * 60 * 60
+
+# Keep horizon ahead of this many days before the job extends it
+HORIZON_MIN_LEAD_DAYS = 365
+
+SERIES_COLUMNS = "id, date, recurrence_pattern, start_time, end_time, last_modified"
+
+def create_occurrences_tables(c):
+    """Create the materialized occurrence table and its horizon marker"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS habit_occurrences (
+            habit_id INTEGER NOT NULL,
+            occurrence_date TEXT NOT NULL,
+            date TEXT NOT NULL,
+            start_time TEXT,
+            end_time TEXT,
+            PRIMARY KEY (habit_id, occurrence_date)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_habit_occurrences_date
+        ON habit_occurrences (date, start_time, habit_id)
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS occurrence_horizon (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            horizon_start TEXT NOT NULL,
+            horizon_end TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def get_horizon(conn):
+    """Return the materialized (start, end) date strings, end exclusive"""
+    c = conn.cursor()
+    c.execute("SELECT horizon_start, horizon_end FROM occurrence_horizon WHERE id = 1")
+    row = c.fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+def covers(horizon, window_start, window_end):
+    """True if [window_start, window_end) can be answered from the table"""
+    horizon_start, horizon_end = horizon
+    return bool(
+        horizon_start and window_start and window_end
+        and horizon_start <= window_start and window_end <= horizon_end
+    )
+
+def _series_rows(habit, exceptions, horizon):
+    """Occurrence rows for one habit within the horizon"""
+    habit_id = habit['id']
+    if not is_recurring(habit['recurrence_pattern']):
+        return [(habit_id, habit['date'], habit['date'], habit['start_time'], habit['end_time'])]
+    return [
+        (habit_id, o.occurrence_date, o.date, o.start_time, o.end_time)
+        for o in expand_habit(habit, exceptions, horizon[0], horizon[1])
+    ]
+
+def _fetch_habits(conn, habit_ids):
+    """Load the series fields for a list of habit ids"""
+    c = conn.cursor()
+    habits = []
+    for offset in range(0, len(habit_ids), 900):
+        chunk = habit_ids[offset:offset + 900]
+        c.execute(f"""
+            SELECT {SERIES_COLUMNS} FROM habits
+            WHERE id IN ({','.join('?' * len(chunk))})
+        """, chunk)
+        habits.extend(_as_habit(row) for row in c.fetchall())
+    return habits
+
+def _as_habit(row):
+    """Map a SERIES_COLUMNS row to the dict expand_habit expects"""
+    habit_id, habit_date, pattern, start_time, end_time, last_modified = row
+    return {
+        'id': habit_id,
+        'date': habit_date,
+        'recurrence_pattern': pattern,
+        'start_time': start_time,
+        'end_time': end_time,
+        'last_modified': last_modified,
+    }
+
+def refresh_habits(conn, habit_ids):
+    """Re-materialize the occurrences of the given habits (deleted ones are dropped)"""
+    habit_ids = [int(habit_id) for habit_id in habit_ids]
+    if not habit_ids:
+        return
+
+    c = conn.cursor()
+    c.executemany(
+        "DELETE FROM habit_occurrences WHERE habit_id = ?",
+        [(habit_id,) for habit_id in habit_ids]
+    )
+
+    horizon = get_horizon(conn)
+    if not horizon[0]:
+        return
+
+    habits = _fetch_habits(conn, habit_ids)
+    exceptions = load_exceptions(
+        conn, [h['id'] for h in habits if is_recurring(h['recurrence_pattern'])]
+    )
+    rows = []
+    for habit in habits:
+        rows.extend(_series_rows(habit, exceptions.get(habit['id'], ()), horizon))
+    c.executemany("""
+        INSERT OR REPLACE INTO habit_occurrences
+        (habit_id, occurrence_date, date, start_time, end_time)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+def occurrence_ranges(conn, habit_ids):
+    """{habit_id: (first date, last date, count)} of the materialized occurrences"""
+    c = conn.cursor()
+    ranges = {}
+    for offset in range(0, len(habit_ids), 900):
+        chunk = habit_ids[offset:offset + 900]
+        c.execute(f"""
+            SELECT habit_id, MIN(date), MAX(date), COUNT(*) FROM habit_occurrences
+            WHERE habit_id IN ({','.join('?' * len(chunk))})
+            GROUP BY habit_id
+        """, chunk)
+        ranges.update((row[0], row[1:]) for row in c.fetchall())
+    return ranges
+
+def refresh_habit(conn, habit_id):
+    """Re-materialize the occurrences of a single habit"""
+    refresh_habits(conn, [habit_id])
+
+def rebuild_occurrences(conn, progress=print, chunk_size=2000, today=None):
+    """Materialize every habit over a fresh horizon, in chunks, inside the caller's transaction"""
+    today = today or date.today()
+    horizon = (
+        (today - timedelta(days=HORIZON_PAST_DAYS)).isoformat(),
+        (today + timedelta(days=HORIZON_FUTURE_DAYS)).isoformat(),
+    )
+
+    c = conn.cursor()
+    c.execute("DELETE FROM habit_occurrences")
+    c.execute("""
+        INSERT OR REPLACE INTO occurrence_horizon (id, horizon_start, horizon_end)
+        VALUES (1, ?, ?)
+    """, horizon)
+
+    c.execute("SELECT COUNT(*) FROM habits")
+    total = c.fetchone()[0]
+    done = 0
+    last_id = 0
+    while True:
+        c.execute(f"""
+            SELECT {SERIES_COLUMNS} FROM habits
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (last_id, chunk_size))
+        habits = [_as_habit(row) for row in c.fetchall()]
+        if not habits:
+            break
+
+        exceptions = load_exceptions(
+            conn, [h['id'] for h in habits if is_recurring(h['recurrence_pattern'])]
+        )
+        rows = []
+        for habit in habits:
+            rows.extend(_series_rows(habit, exceptions.get(habit['id'], ()), horizon))
+        c.executemany("""
+            INSERT OR REPLACE INTO habit_occurrences
+            (habit_id, occurrence_date, date, start_time, end_time)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+
+        done += len(habits)
+        last_id = habits[-1]['id']
+        progress(f"  … {done}/{total} habits materialized")
+
+def extend_horizon(conn, today=None):
+    """Push the horizon end forward, materializing only the newly covered days"""
+    today = today or date.today()
+    horizon_start, horizon_end = get_horizon(conn)
+    if not horizon_start:
+        return False
+
+    target_end = (today + timedelta(days=HORIZON_FUTURE_DAYS)).isoformat()
+    lead_end = (today + timedelta(days=HORIZON_MIN_LEAD_DAYS)).isoformat()
+    if horizon_end >= lead_end:
+        return False
+
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT {SERIES_COLUMNS} FROM habits
+        WHERE recurrence_pattern IS NOT NULL AND recurrence_pattern != ''
+        AND date < ?
+    """, (target_end,))
+    habits = [_as_habit(row) for row in c.fetchall()]
+    exceptions = load_exceptions(conn, [h['id'] for h in habits])
+
+    rows = []
+    for habit in habits:
+        rows.extend(
+            (habit['id'], o.occurrence_date, o.date, o.start_time, o.end_time)
+            for o in expand_habit(habit, exceptions.get(habit['id'], ()), horizon_end, target_end)
+        )
+    c.executemany("""
+        INSERT OR REPLACE INTO habit_occurrences
+        (habit_id, occurrence_date, date, start_time, end_time)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    # Series nobody edited still need reminders for their new occurrences
+    c.execute("""
+        SELECT id FROM habits
+        WHERE recurrence_pattern IS NOT NULL AND recurrence_pattern != ''
+        AND date < ? AND reminder_time IS NOT NULL AND reminder_time != ''
+    """, (target_end,))
+    refresh_reminders(conn, [row[0] for row in c.fetchall()])
+    c.execute("""
+        UPDATE occurrence_horizon
+        SET horizon_end = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1
+    """, (target_end,))
+    conn.commit()
+    print(f"Occurrence horizon extended to {target_end} ({len(rows)} new occurrences)")
+    return True
+
+_horizon_thread = None
+_horizon_stop = threading.Event()
+
+def start_horizon_job(interval=HORIZON_CHECK_SECONDS):
+    """Start the background thread that keeps the horizon ahead of today"""
+    global _horizon_thread
+    if _horizon_thread and _horizon_thread.is_alive():
+        return _horizon_thread
+
+    def run():
+        while True:
+            try:
+                with get_db_connection() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    if not extend_horizon(conn):
+                        conn.rollback()
+            except Exception as e:
+                print(f"Error extending occurrence horizon: {str(e)}")
+            if _horizon_stop.wait(interval):
+                return
+
+    _horizon_thread = threading.Thread(target=run, name='occurrence-horizon', daemon=True)
+    _horizon_thread.start()
+    return _horizon_thread
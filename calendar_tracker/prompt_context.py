@@ -0,0 +1,130 @@
+import hashlib
+import threading
+from datetime import date
+from utils import get_db_connection
+from rollups import progress_summary
+
+# The database slices of the chat prompt: today's schedule, the habits of the
+# past week and the progress line. They change only when the calendar does,
+# so they are built once into text fragments and reused on every turn until
+# the version token moves or a write path invalidates them.
+
+TODAY_SCHEDULE = """
+    SELECT title, start_datetime, end_datetime
+    FROM calendar_events
+    WHERE start_date = date('now')
+    ORDER BY start_datetime
+"""
+
+RECENT_HABITS = """
+    SELECT habit FROM habits
+    WHERE date >= date('now', '-7 days')
+    GROUP BY habit
+"""
+
+def context_version(conn):
+    """Token that moves whenever any slice of the chat context can have changed
+
+    Covers the day (UTC for the SQL date filters, local for the progress
+    window), habit writes through the change journal, completions and
+    calendar events.
+    """
+    c = conn.cursor()
+    c.execute("""
+        SELECT date('now'), date('now', 'localtime'),
+            (SELECT seq FROM sqlite_sequence WHERE name = 'change_journal'),
+            (SELECT version FROM tracking_version WHERE id = 1),
+            (SELECT version FROM event_version WHERE id = 1)
+    """)
+    return c.fetchone()
+
+def today_schedule(conn):
+    """Today's calendar events as context lines"""
+    c = conn.cursor()
+    c.execute(TODAY_SCHEDULE)
+    return [f"- {title}: {start} - {end}" for title, start, end in c.fetchall()]
+
+def recent_habits(conn):
+    """Names of the habits scheduled from a week ago on"""
+    c = conn.cursor()
+    c.execute(RECENT_HABITS)
+    return [row[0] for row in c.fetchall()]
+
+class ContextSnapshot:
+    """One build of the chat context slices and the prompt text made from them"""
+
+    __slots__ = ('token', 'day', 'schedule', 'habits', 'progress', 'text', 'digest')
+
+    def __init__(self, token, day, schedule, habits, progress):
+        self.token = token
+        self.day = day
+        self.schedule = schedule
+        self.habits = habits
+        self.progress = progress
+
+        text = ''
+        if schedule:
+            text += "\n\nToday's schedule:" + ''.join(f"\n{line}" for line in schedule)
+        if habits:
+            text += f"\n\nUser's tracked habits: {', '.join(habits)}"
+        if progress:
+            text += f"\nRecent progress: {progress}"
+        self.text = text
+        self.digest = hashlib.sha1(f"{day}|{text}".encode('utf-8')).hexdigest()
+
+class PromptContext:
+    """Versioned snapshot of the chat context slices.
+
+    Each turn costs one small query for the version token; the schedule,
+    habit and progress queries only run again after it moves. Writers also
+    call invalidate(), which drops the snapshot at once rather than on the
+    next token check. The token alone keeps workers that did not see the
+    write correct, and a snapshot built while a write was in flight is
+    stored under the token read before it, so it is replaced next turn.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'builds': 0,
+            'invalidations': 0,
+        }
+
+    def snapshot(self):
+        """The current ContextSnapshot, rebuilt if the calendar changed since the last one"""
+        with get_db_connection() as conn:
+            token = context_version(conn)
+            with self._lock:
+                current = self._snapshot
+                if current is not None and current.token == token:
+                    self._stats['hits'] += 1
+                    return current
+
+            today = date.fromisoformat(token[1])
+            snapshot = ContextSnapshot(
+                token, token[0], today_schedule(conn), recent_habits(conn), progress_summary(conn, today)
+            )
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._stats['builds'] += 1
+        return snapshot
+
+    def invalidate(self):
+        """Drop the snapshot after a write to the calendar"""
+        with self._lock:
+            self._snapshot = None
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Hit and rebuild counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached'] = self._snapshot is not None
+        lookups = stats['hits'] + stats['builds']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+prompt_context = PromptContext()
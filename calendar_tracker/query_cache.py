@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Size bounds for the /habits result cache
+HABITS_CACHE_ENTRIES = int(os.getenv('HABITS_CACHE_ENTRIES', 256))
+HABITS_CACHE_BYTES = int(os.getenv('HABITS_CACHE_BYTES', 64 * 1024 * 1024))
+
+class QueryCache:
+    """Size-bounded LRU of encoded /habits bodies keyed by normalized filters.
+
+    Keys are (start, end, category, priority, search). Each entry remembers
+    the calendar version token it was built from and is only served while
+    that token is current, so a reader racing a writer can never serve
+    stale rows; writes additionally evict the entries whose window overlaps
+    the dates they touched, which keeps memory for dead entries bounded.
+    """
+
+    def __init__(self, max_entries=HABITS_CACHE_ENTRIES, max_bytes=HABITS_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'stores': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    @staticmethod
+    def make_key(window_start, window_end, category=None, priority=None, search=None):
+        """Normalize filter values so equivalent requests share an entry"""
+        # Full-text matching ignores case and spacing, so search terms may be folded
+        return (
+            window_start or None,
+            window_end or None,
+            category or None,
+            priority or None,
+            ' '.join((search or '').lower().split()) or None,
+        )
+
+    def get(self, key, token):
+        """Cached body for key if it was built from the current version token"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] != token:
+                self._stats['stale'] += 1
+                self._stats['misses'] += 1
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def put(self, key, token, body, in_horizon):
+        """Store a body; in_horizon marks windows answered from materialized occurrences"""
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (token, body, in_horizon)
+            self._bytes += size
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats['evictions'] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry[1])
+
+    def invalidate(self, date_ranges, series_changed=False):
+        """Evict entries whose window overlaps any (first, last) date range
+
+        Windows outside the materialized horizon may hold recurring
+        occurrences the ranges cannot describe, so they are also evicted
+        whenever a recurring series changed.
+        """
+        with self._lock:
+            doomed = []
+            for key, (_, _, in_horizon) in self._entries.items():
+                window_start, window_end = key[0], key[1]
+                if series_changed and not in_horizon:
+                    doomed.append(key)
+                    continue
+                for first, last in date_ranges:
+                    if (window_end is None or first < window_end) and (window_start is None or last >= window_start):
+                        doomed.append(key)
+                        break
+            for key in doomed:
+                self._drop(key)
+            self._stats['invalidations'] += len(doomed)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit ratio and memory use"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+habits_cache = QueryCache()
@@ -0,0 +1,121 @@
+import sys
+import analytics
+import freebusy
+import intervals
+import journal
+import prompt_context
+import recurrence
+import reminders
+import rollups
+import search
+import serializers
+from services import gemini_service
+from utils import get_db_connection
+
+# Conditions habit_filter_conditions() adds to the /habits window queries
+WINDOW_BOUNDS = " AND h.date >= ? AND h.date < ?"
+CATEGORY = " AND h.category = ?"
+PRIORITY = " AND h.priority = ?"
+
+# Hot queries issued by the calendar routes and GeminiService, with sample
+# parameters. They are the SQL constants the code runs, so a changed query is
+# checked as it is; every one of them must be answered by an index seek.
+HOT_QUERIES = {
+    'habits_range': (
+        serializers.SINGLE_HABITS_WINDOW.format(conditions=WINDOW_BOUNDS),
+        ('2025-01-01', '2025-02-01')
+    ),
+    'habits_range_category': (
+        serializers.SINGLE_HABITS_WINDOW.format(conditions=CATEGORY + WINDOW_BOUNDS),
+        ('work', '2025-01-01', '2025-02-01')
+    ),
+    'habits_range_priority': (
+        serializers.SINGLE_HABITS_WINDOW.format(conditions=PRIORITY + WINDOW_BOUNDS),
+        (2, '2025-01-01', '2025-02-01')
+    ),
+    'habits_recurring_series': (
+        serializers.SERIES_HABITS_WINDOW.format(conditions=" AND h.date < ?"),
+        ('2025-02-01',)
+    ),
+    'occurrences_range': (
+        serializers.OCCURRENCES_WINDOW.format(keyset='', conditions=CATEGORY),
+        ('2025-01-01', '2025-02-01', 'work')
+    ),
+    'occurrences_keyset': (
+        serializers.OCCURRENCES_WINDOW.format(keyset=serializers.OCCURRENCES_KEYSET, conditions=''),
+        ('2025-01-01', '2026-01-01', '2025-06-01', '09:00', 42)
+    ),
+    'recurrence_exceptions': (
+        recurrence.EXCEPTIONS_FOR_HABITS.format(placeholders='?,?'),
+        (1, 2)
+    ),
+    'interval_day': (intervals.DAY_OCCURRENCES, ('2025-01-01',)),
+    'interval_day_unmaterialized': (intervals.DAY_SINGLE_HABITS, ('2025-01-01', '2025-01-02')),
+    'interval_day_series': (intervals.DAY_SERIES, ('2025-01-02',)),
+    'freebusy_events': (freebusy.STANDALONE_EVENTS, ('2025-01-01', '2025-02-01')),
+    'search_habits': (search.SEARCH_HABITS, ('"run"*', 20)),
+    'reminders_due': (
+        reminders.DUE_REMINDERS,
+        ('2025-01-01 09:00:00', 0, '2025-01-01 09:05:00', 1000)
+    ),
+    'journal_changes': (journal.CHANGES_SINCE, (0, 501)),
+    'streak_completions': (rollups.STREAK_COMPLETIONS, (1,)),
+    'streak_occurrences': (rollups.STREAK_OCCURRENCES, (1, '2025-01-01')),
+    'streak_next_occurrence': (rollups.NEXT_OCCURRENCE, (1, '2025-01-01')),
+    'streak_completions_between': (rollups.COMPLETIONS_BETWEEN, (1, '2025-01-01', '2025-01-07')),
+    'rollup_window': (rollups.WINDOW_TOTALS, ('2025-01-01', '2025-01-07')),
+    'analytics_completions': (analytics.COMPLETIONS_BY_DAY, ('2025-01-01', '2026-01-01')),
+    'analytics_habit_completions': (analytics.HABIT_COMPLETIONS_BY_DAY, (1, '2025-01-01', '2026-01-01')),
+    'analytics_occurrences': (analytics.OCCURRENCES_BY_DAY, ('2025-01-01', '2026-01-01')),
+    'analytics_habit_occurrences': (analytics.HABIT_OCCURRENCES_BY_DAY, (1, '2025-01-01', '2026-01-01')),
+    'context_today': (prompt_context.TODAY_SCHEDULE, ()),
+    'chat_recent_habits': (prompt_context.RECENT_HABITS, ()),
+    'chat_history_recent': (gemini_service.CHAT_HISTORY, (10,)),
+    'chat_match_event': (gemini_service.MATCH_EVENT, ('{habit} : ("run"*)',)),
+    'chat_match_habit': (gemini_service.MATCH_HABIT, ('{habit} : ("run"*)',)),
+    'chat_match_occurrence': (gemini_service.MATCH_OCCURRENCE, ('2025-01-01', '{habit} : ("run"*)')),
+    'list_schedule': (gemini_service.DAY_SCHEDULE, ('2025-01-01',)),
+    'next_event': (gemini_service.NEXT_EVENT, ()),
+}
+
+# LIMIT queries that walk an index in order and stop early; a scan of the
+# named index is expected here, a scan of the bare table is not
+ORDERED_INDEX_WALKS = {'chat_history_recent'}
+
+def explain(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+    c = conn.cursor()
+    c.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    return [row[3] for row in c.fetchall()]
+
+def find_full_scans(conn, queries=None):
+    """Map query name to the plan lines that fall back to a table scan"""
+    failures = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        scans = [
+            detail for detail in explain(conn, sql, params)
+            if detail.startswith('SCAN')
+            and 'VIRTUAL TABLE INDEX' not in detail
+            and not (name in ORDERED_INDEX_WALKS and 'USING' in detail)
+        ]
+        if scans:
+            failures[name] = scans
+    return failures
+
+def check_query_plans():
+    """Print the plan check result and return True if every hot query seeks"""
+    with get_db_connection() as conn:
+        failures = find_full_scans(conn)
+
+    if not failures:
+        print(f"✓ All {len(HOT_QUERIES)} hot queries use an index")
+        return True
+
+    for name, scans in failures.items():
+        print(f"❌ {name}: {'; '.join(scans)}")
+    return False
+
+if __name__ == '__main__':
+    from migrate import run_migrations
+    run_migrations()
+    sys.exit(0 if check_query_plans() else 1)
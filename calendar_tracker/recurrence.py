@@ -0,0 +1,285 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import calendar
+
+# Windows requested without an explicit end are expanded this far
+DEFAULT_WINDOW_DAYS = 366
+
+# Expanded windows kept in memory, keyed by series identity and window
+EXPANSION_CACHE_SIZE = 4096
+
+WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+# Shorthand values accepted by the /addHabit "Repeat" field
+SIMPLE_PATTERNS = {
+    'daily': 'FREQ=DAILY',
+    'weekly': 'FREQ=WEEKLY',
+    'weekdays': 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+    'monthly': 'FREQ=MONTHLY',
+    'yearly': 'FREQ=YEARLY',
+}
+
+RecurrenceRule = namedtuple('RecurrenceRule', 'freq interval byday bymonthday count until')
+
+# One expanded instance: the series date it was generated for, and where it
+# actually lands after any override
+Occurrence = namedtuple('Occurrence', 'occurrence_date date start_time end_time')
+
+# Exceptions of a chunk of series; {placeholders} holds one ? per habit id
+EXCEPTIONS_FOR_HABITS = """
+    SELECT habit_id, occurrence_date, cancelled, new_date, new_start_time, new_end_time
+    FROM habit_exceptions
+    WHERE habit_id IN ({placeholders})
+    ORDER BY habit_id, occurrence_date
+"""
+
+def is_recurring(pattern):
+    """True if a recurrence_pattern value describes a repeating series"""
+    return parse_rule(pattern) is not None
+
+@lru_cache(maxsize=256)
+def parse_rule(pattern):
+    """Parse a shorthand or RRULE-style pattern; None means not recurring"""
+    if not pattern or not pattern.strip():
+        return None
+
+    text = pattern.strip()
+    text = SIMPLE_PATTERNS.get(text.lower(), text)
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+
+    parts = {}
+    for part in text.split(';'):
+        if '=' in part:
+            key, value = part.split('=', 1)
+            parts[key.strip().upper()] = value.strip().upper()
+
+    freq = parts.get('FREQ')
+    if freq not in ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'):
+        return None
+
+    try:
+        interval = max(1, int(parts.get('INTERVAL', 1)))
+        count = int(parts['COUNT']) if 'COUNT' in parts else None
+        byday = tuple(sorted(
+            WEEKDAYS[code[-2:]] for code in parts['BYDAY'].split(',') if code[-2:] in WEEKDAYS
+        )) if 'BYDAY' in parts else ()
+        bymonthday = tuple(sorted(
+            int(day) for day in parts['BYMONTHDAY'].split(',')
+        )) if 'BYMONTHDAY' in parts else ()
+        until = _parse_date(parts['UNTIL']) if 'UNTIL' in parts else None
+    except (ValueError, KeyError):
+        return None
+
+    return RecurrenceRule(freq, interval, byday, bymonthday, count, until)
+
+def _parse_date(value):
+    """Parse YYYY-MM-DD, YYYYMMDD or an RRULE UNTIL timestamp into a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = value.strip()
+    if len(value) >= 10 and value[4] == '-':
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return datetime.strptime(value[:8], '%Y%m%d').date()
+
+def _add_months(year, month, months):
+    """Return (year, month) shifted by a number of months"""
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+def _generate(dtstart, rule, window_start):
+    """Yield series dates in order, starting at or just before window_start"""
+    interval = rule.interval
+
+    if rule.freq == 'DAILY':
+        offset = max(0, (window_start - dtstart).days)
+        step = -(-offset // interval)
+        current = dtstart + timedelta(days=step * interval)
+        while True:
+            yield current
+            current += timedelta(days=interval)
+
+    elif rule.freq == 'WEEKLY':
+        days = rule.byday or (dtstart.weekday(),)
+        anchor = dtstart - timedelta(days=dtstart.weekday())
+        week = max(0, (window_start - anchor).days // 7)
+        week -= week % interval
+        while True:
+            monday = anchor + timedelta(weeks=week)
+            for weekday in days:
+                current = monday + timedelta(days=weekday)
+                if current >= dtstart:
+                    yield current
+            week += interval
+
+    elif rule.freq == 'MONTHLY':
+        days = rule.bymonthday or (dtstart.day,)
+        months = max(0, (window_start.year - dtstart.year) * 12 + window_start.month - dtstart.month)
+        months -= months % interval
+        while True:
+            year, month = _add_months(dtstart.year, dtstart.month, months)
+            last_day = calendar.monthrange(year, month)[1]
+            # Negative BYMONTHDAY counts back from the end of the month, so
+            # the days are only in order once resolved against this month
+            actual_days = sorted({
+                day if day > 0 else last_day + day + 1 for day in days
+            })
+            for actual in actual_days:
+                if 1 <= actual <= last_day:
+                    current = date(year, month, actual)
+                    if current >= dtstart:
+                        yield current
+            months += interval
+
+    else:  # YEARLY
+        years = max(0, window_start.year - dtstart.year)
+        years -= years % interval
+        while True:
+            year = dtstart.year + years
+            # 29 February only recurs in leap years
+            if dtstart.month != 2 or dtstart.day != 29 or calendar.isleap(year):
+                yield date(year, dtstart.month, dtstart.day)
+            years += interval
+
+def iter_occurrence_dates(dtstart, rule, window_start, window_end):
+    """Lazily yield series dates inside [window_start, window_end)"""
+    if rule.count is not None:
+        # COUNT is anchored at the series start, so walk from there
+        generator = _generate(dtstart, rule, dtstart)
+        limit = rule.count
+    else:
+        generator = _generate(dtstart, rule, window_start)
+        limit = None
+
+    emitted = 0
+    for current in generator:
+        if current >= window_end or (rule.until and current > rule.until):
+            return
+        if limit is not None:
+            emitted += 1
+            if emitted > limit:
+                return
+        if current >= window_start:
+            yield current
+
+@lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def _expand_window(habit_id, last_modified, base_date, pattern, start_time, end_time,
+                   exceptions, window_start, window_end):
+    """Expand one series over one window (cached on every input that affects it)"""
+    dtstart = _parse_date(base_date)
+    rule = parse_rule(pattern)
+    overrides = {exception[0]: exception for exception in exceptions}
+    occurrences = []
+
+    if rule is None:
+        dates = [dtstart] if window_start <= dtstart < window_end else []
+    else:
+        dates = iter_occurrence_dates(dtstart, rule, window_start, window_end)
+
+    for current in dates:
+        key = current.isoformat()
+        override = overrides.pop(key, None)
+        if override is None:
+            occurrences.append(Occurrence(key, key, start_time, end_time))
+            continue
+        _, cancelled, new_date, new_start, new_end = override
+        if cancelled:
+            continue
+        moved_to = new_date or key
+        if window_start.isoformat() <= moved_to < window_end.isoformat():
+            occurrences.append(Occurrence(
+                key, moved_to, new_start or start_time, new_end or end_time
+            ))
+
+    # Instances moved into this window from a date outside it
+    for original, cancelled, new_date, new_start, new_end in overrides.values():
+        if cancelled or not new_date:
+            continue
+        if window_start.isoformat() <= new_date < window_end.isoformat():
+            original_date = _parse_date(original)
+            if rule is None or original_date in set(iter_occurrence_dates(
+                    dtstart, rule, original_date, original_date + timedelta(days=1))):
+                occurrences.append(Occurrence(
+                    original, new_date, new_start or start_time, new_end or end_time
+                ))
+
+    occurrences.sort(key=lambda o: (o.date, o.start_time or ''))
+    return tuple(occurrences)
+
+def expand_habit(habit, exceptions, window_start=None, window_end=None):
+    """Occurrences of a habit row inside [window_start, window_end)
+
+    habit is a mapping with id, date, recurrence_pattern, start_time, end_time
+    and last_modified; exceptions is the tuple returned by load_exceptions.
+    """
+    start = _parse_date(window_start) if window_start else _parse_date(habit['date'])
+    end = _parse_date(window_end) if window_end else start + timedelta(days=DEFAULT_WINDOW_DAYS)
+    return _expand_window(
+        habit['id'], habit['last_modified'], habit['date'], habit['recurrence_pattern'],
+        habit['start_time'], habit['end_time'], exceptions, start, end
+    )
+
+def expansion_cache_info():
+    """Hit/miss counters for the expanded-window cache"""
+    info = _expand_window.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+
+def load_exceptions(conn, habit_ids):
+    """Map habit id to a hashable tuple of its exceptions and overrides"""
+    exceptions = {habit_id: [] for habit_id in habit_ids}
+    if not habit_ids:
+        return {}
+
+    c = conn.cursor()
+    ids = list(exceptions)
+    # Stay under SQLite's bound-parameter limit for large views
+    for offset in range(0, len(ids), 900):
+        chunk = ids[offset:offset + 900]
+        c.execute(EXCEPTIONS_FOR_HABITS.format(placeholders=','.join('?' * len(chunk))), chunk)
+        for habit_id, *exception in c.fetchall():
+            exceptions[habit_id].append((exception[0], bool(exception[1]), *exception[2:]))
+
+    return {habit_id: tuple(rows) for habit_id, rows in exceptions.items()}
+
+def set_exception(conn, habit_id, occurrence_date, cancelled=False,
+                  new_date=None, new_start_time=None, new_end_time=None):
+    """Cancel or override a single occurrence of a recurring habit"""
+    c = conn.cursor()
+    c.execute("""
+        INSERT INTO habit_exceptions
+        (habit_id, occurrence_date, cancelled, new_date, new_start_time, new_end_time)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (habit_id, occurrence_date) DO UPDATE SET
+            cancelled = excluded.cancelled,
+            new_date = excluded.new_date,
+            new_start_time = excluded.new_start_time,
+            new_end_time = excluded.new_end_time
+    """, (habit_id, occurrence_date, 1 if cancelled else 0, new_date, new_start_time, new_end_time))
+
+    # Bumping last_modified moves the series to a fresh expansion cache key
+    c.execute("UPDATE habits SET last_modified = CURRENT_TIMESTAMP WHERE id = ?", (habit_id,))
+
+def create_exceptions_table(c):
+    """Per-occurrence cancellations and overrides for recurring habits"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS habit_exceptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER NOT NULL,
+            occurrence_date TEXT NOT NULL,
+            cancelled BOOLEAN DEFAULT 0,
+            new_date TEXT,
+            new_start_time TEXT,
+            new_end_time TEXT,
+            UNIQUE (habit_id, occurrence_date),
+            FOREIGN KEY (habit_id) REFERENCES habits (id)
+        )
+    ''')
+    # Recurring series are fetched by "starts before the window ends"
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_habits_recurring
+        ON habits (date)
+        WHERE recurrence_pattern IS NOT NULL AND recurrence_pattern != ''
+    ''')
@@ -0,0 +1,348 @@
+import heapq
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from utils import get_db_connection
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# All-day habits remind relative to this time of day
+ALL_DAY_REMINDER_TIME = '09:00'
+
+# Reminders missed while the app was down still fire if they are this recent
+CATCH_UP_SECONDS = 15 * 60
+
+# The scheduler keeps reminders due within this window in memory
+LOOKAHEAD_SECONDS = 5 * 60
+
+# Maximum rows pulled from the index per tick
+LOAD_BATCH_SIZE = 1000
+
+TICK_SECONDS = 1.0
+
+# Re-read the lookahead window from the start at least this often
+REWIND_SECONDS = 60
+
+# Undelivered reminders after a (fire_at, id) position, up to a horizon
+DUE_REMINDERS = """
+    SELECT r.id, r.habit_id, r.occurrence_date, r.fire_at, h.habit, h.start_time
+    FROM reminders r
+    JOIN habits h ON h.id = r.habit_id
+    WHERE r.delivered_at IS NULL
+    AND (r.fire_at, r.id) > (?, ?)
+    AND r.fire_at <= ?
+    ORDER BY r.fire_at, r.id
+    LIMIT ?
+"""
+
+OFFSET_PATTERN = re.compile(r'(\d+)\s*(m|min|mins|minute|minutes|h|hr|hour|hours|d|day|days)$')
+
+def create_reminders_table(c):
+    """Create the pending reminder table and its due-time index"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER NOT NULL,
+            occurrence_date TEXT NOT NULL,
+            fire_at TIMESTAMP NOT NULL,
+            delivered_at TIMESTAMP,
+            UNIQUE (habit_id, occurrence_date, fire_at)
+        )
+    ''')
+    # Only undelivered reminders are ever scanned by the scheduler
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reminders_pending
+        ON reminders (fire_at, id)
+        WHERE delivered_at IS NULL
+    ''')
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reminders_habit
+        ON reminders (habit_id)
+    ''')
+
+def parse_offset(reminder):
+    """Turn a reminder_time value like '15min' or '1hour' into a timedelta"""
+    if not reminder:
+        return None
+    match = OFFSET_PATTERN.match(reminder.strip().lower())
+    if not match:
+        return None
+    amount, unit = int(match.group(1)), match.group(2)
+    if unit.startswith('m'):
+        return timedelta(minutes=amount)
+    if unit.startswith('h'):
+        return timedelta(hours=amount)
+    return timedelta(days=amount)
+
+def refresh_reminders(conn, habit_ids):
+    """Recompute undelivered reminders for the given habits from their occurrences"""
+    c = conn.cursor()
+    c.executemany(
+        "DELETE FROM reminders WHERE habit_id = ? AND delivered_at IS NULL",
+        [(habit_id,) for habit_id in habit_ids]
+    )
+
+    cutoff = (datetime.now() - timedelta(seconds=CATCH_UP_SECONDS)).strftime(TIMESTAMP_FORMAT)
+    rows = []
+    for offset in range(0, len(habit_ids), 900):
+        chunk = habit_ids[offset:offset + 900]
+        c.execute(f"""
+            SELECT o.habit_id, o.occurrence_date, o.date, o.start_time, h.reminder_time
+            FROM habit_occurrences o
+            JOIN habits h ON h.id = o.habit_id
+            WHERE o.habit_id IN ({','.join('?' * len(chunk))})
+            AND h.reminder_time IS NOT NULL AND h.reminder_time != ''
+        """, chunk)
+        for habit_id, occurrence_date, day, start_time, reminder in c.fetchall():
+            delta = parse_offset(reminder)
+            if delta is None:
+                continue
+            try:
+                starts = datetime.strptime(f"{day} {(start_time or ALL_DAY_REMINDER_TIME)[:5]}", '%Y-%m-%d %H:%M')
+            except ValueError:
+                continue
+            fire_at = (starts - delta).strftime(TIMESTAMP_FORMAT)
+            if fire_at >= cutoff:
+                rows.append((habit_id, occurrence_date, fire_at))
+
+    c.executemany("""
+        INSERT OR IGNORE INTO reminders (habit_id, occurrence_date, fire_at)
+        VALUES (?, ?, ?)
+    """, rows)
+
+    if rows and reminder_scheduler:
+        reminder_scheduler.request_rewind()
+
+class LogSink:
+    """Deliver reminders to stdout and the application log"""
+
+    name = 'log'
+
+    def deliver(self, reminder):
+        message = f"[{datetime.now()}] Reminder: {reminder['title']} at {reminder['starts']}"
+        print(message)
+        try:
+            with open('reminders.log', 'a') as f:
+                f.write(message + '\n')
+        except OSError:
+            pass
+
+class WebhookSink:
+    """POST reminders as JSON to a webhook (a local stub by default)"""
+
+    name = 'webhook'
+
+    def __init__(self, url, timeout=2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, reminder):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(reminder).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+def sinks_from_env():
+    """Build the sinks listed in REMINDER_SINKS (comma separated)"""
+    sinks = []
+    for name in os.getenv('REMINDER_SINKS', 'log').split(','):
+        name = name.strip().lower()
+        if name == 'log':
+            sinks.append(LogSink())
+        elif name == 'webhook':
+            sinks.append(WebhookSink(os.getenv(
+                'REMINDER_WEBHOOK_URL', 'http://localhost:5000/reminders/webhook'
+            )))
+    return sinks
+
+class ReminderScheduler:
+    """Heap-based dispatcher fed incrementally from idx_reminders_pending.
+
+    Each tick loads at most one batch of upcoming reminders (keyset on
+    fire_at, id) and pops only what is due, so per-tick cost does not grow
+    with the number of pending reminders.
+    """
+
+    def __init__(self, sinks=None, tick=TICK_SECONDS, lookahead=LOOKAHEAD_SECONDS,
+                 batch_size=LOAD_BATCH_SIZE):
+        self.sinks = sinks if sinks is not None else sinks_from_env()
+        self.tick_seconds = tick
+        self.lookahead = lookahead
+        self.batch_size = batch_size
+        self._heap = []
+        self._queued = set()
+        self._cursor = None
+        self._rewind = False
+        self._last_rewind = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._metrics = {
+            'delivered': 0,
+            'failed': 0,
+            'skipped': 0,
+            'loaded': 0,
+            'ticks': 0,
+            'lag_last': 0.0,
+            'lag_max': 0.0,
+            'lag_total': 0.0,
+            'tick_time_last': 0.0,
+            'tick_time_max': 0.0,
+        }
+
+    def add_sink(self, sink):
+        """Register another delivery sink"""
+        self.sinks.append(sink)
+
+    def request_rewind(self):
+        """Rewind the cursor on the next tick so newly written reminders are seen"""
+        # Called before the writer commits, so the rewind waits for the next
+        # regular tick instead of waking the thread immediately
+        with self._lock:
+            self._rewind = True
+
+    def _load(self, conn, now):
+        """Pull the next batch of reminders due before now + lookahead"""
+        horizon = (now + timedelta(seconds=self.lookahead)).strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            # Periodic rewinds also catch reminders written by other workers
+            if self._rewind or time.monotonic() - self._last_rewind > REWIND_SECONDS:
+                self._cursor = None
+                self._rewind = False
+                self._last_rewind = time.monotonic()
+            cursor = self._cursor
+        if cursor is None:
+            # Start just behind now: missed reminders within the catch-up
+            # window fire, older ones stay untouched in the table
+            start = (now - timedelta(seconds=CATCH_UP_SECONDS)).strftime(TIMESTAMP_FORMAT)
+            cursor = (start, 0)
+
+        c = conn.cursor()
+        c.execute(DUE_REMINDERS, (cursor[0], cursor[1], horizon, self.batch_size))
+        rows = c.fetchall()
+
+        with self._lock:
+            for reminder_id, habit_id, occurrence_date, fire_at, title, start_time in rows:
+                if reminder_id in self._queued:
+                    continue
+                self._queued.add(reminder_id)
+                heapq.heappush(self._heap, (fire_at, reminder_id, {
+                    'id': reminder_id,
+                    'habit_id': habit_id,
+                    'title': title,
+                    'occurrence_date': occurrence_date,
+                    'starts': f"{occurrence_date} {start_time}" if start_time else occurrence_date,
+                    'fire_at': fire_at,
+                }))
+            if rows:
+                self._cursor = (rows[-1][3], rows[-1][0])
+            elif self._cursor is None:
+                self._cursor = cursor
+            self._metrics['loaded'] += len(rows)
+
+    def _pop_due(self, now):
+        """Remove and return every queued reminder whose time has come"""
+        due = []
+        stamp = now.strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            while self._heap and self._heap[0][0] <= stamp:
+                _, reminder_id, reminder = heapq.heappop(self._heap)
+                self._queued.discard(reminder_id)
+                due.append(reminder)
+        return due
+
+    def _deliver(self, conn, due, now):
+        """Claim each reminder in the table, then hand it to the sinks"""
+        c = conn.cursor()
+        for reminder in due:
+            # The conditional update is the claim: a reminder edited or
+            # delivered elsewhere since it was queued is skipped
+            c.execute("""
+                UPDATE reminders SET delivered_at = ?
+                WHERE id = ? AND fire_at = ? AND delivered_at IS NULL
+            """, (now.strftime(TIMESTAMP_FORMAT), reminder['id'], reminder['fire_at']))
+            conn.commit()
+            if c.rowcount != 1:
+                self._metrics['skipped'] += 1
+                continue
+
+            lag = (now - datetime.strptime(reminder['fire_at'], TIMESTAMP_FORMAT)).total_seconds()
+            self._metrics['lag_last'] = lag
+            self._metrics['lag_max'] = max(self._metrics['lag_max'], lag)
+            self._metrics['lag_total'] += lag
+
+            for sink in self.sinks:
+                try:
+                    sink.deliver(reminder)
+                except Exception as e:
+                    self._metrics['failed'] += 1
+                    print(f"Error delivering reminder via {sink.name}: {str(e)}")
+            self._metrics['delivered'] += 1
+
+    def tick(self, now=None):
+        """Load the next batch if needed and dispatch everything due"""
+        started = time.perf_counter()
+        now = now or datetime.now()
+        with get_db_connection() as conn:
+            self._load(conn, now)
+            due = self._pop_due(now)
+            if due:
+                self._deliver(conn, due, now)
+
+        elapsed = time.perf_counter() - started
+        self._metrics['ticks'] += 1
+        self._metrics['tick_time_last'] = elapsed
+        self._metrics['tick_time_max'] = max(self._metrics['tick_time_max'], elapsed)
+
+    def start(self):
+        """Run the scheduler on a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.tick()
+                except Exception as e:
+                    print(f"Error in reminder scheduler: {str(e)}")
+                self._stop.wait(self.tick_seconds)
+
+        self._thread = threading.Thread(target=run, name='reminder-scheduler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Stop the background thread"""
+        self._stop.set()
+
+    def stats(self):
+        """Scheduler lag and throughput metrics"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['queued'] = len(self._heap)
+            metrics['next_fire_at'] = self._heap[0][0] if self._heap else None
+            metrics['cursor'] = self._cursor[0] if self._cursor else None
+        metrics['lag_avg'] = (
+            metrics['lag_total'] / metrics['delivered'] if metrics['delivered'] else 0.0
+        )
+        metrics['sinks'] = [sink.name for sink in self.sinks]
+        metrics['running'] = bool(self._thread and self._thread.is_alive())
+        return metrics
+
+reminder_scheduler = None
+
+def start_reminder_scheduler():
+    """Create and start the process-wide reminder scheduler"""
+    global reminder_scheduler
+    if reminder_scheduler is None:
+        reminder_scheduler = ReminderScheduler()
+    reminder_scheduler.start()
+    return reminder_scheduler
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Bounds for cached Gemini responses
+RESPONSE_CACHE_ENTRIES = int(os.getenv('RESPONSE_CACHE_ENTRIES', 512))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 15 * 60))
+
+# Optional SQLite file shared by every worker; unset keeps the cache in memory
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH')
+
+# Expired rows are purged from the shared tier every this many stores
+PURGE_EVERY = 100
+
+def normalize_message(message):
+    """Fold case, punctuation and spacing so near-identical messages share an entry"""
+    return ' '.join(re.sub(r'[^\w\s]', '', message.lower()).split())
+
+class ResponseCache:
+    """TTL-bounded LRU of Gemini responses, with an optional shared SQLite tier.
+
+    Keys are digests of the kind of prompt, the normalized message and the
+    context slices that shape the answer, so a change to any of them simply
+    misses. Entries expire after RESPONSE_CACHE_TTL seconds either way.
+    Lookups that miss in memory fall through to the SQLite file when one
+    is configured, and hits there are promoted into memory.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, ttl=RESPONSE_CACHE_TTL, path=RESPONSE_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self._stats = {
+            'hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'stores': 0,
+            'evictions': 0,
+            'shared_errors': 0,
+        }
+
+    @staticmethod
+    def make_key(kind, message, *context):
+        """Digest of the prompt kind, the normalized message and its context slices"""
+        payload = json.dumps([kind, normalize_message(message), *context], default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Cached response for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._stats['expired'] += 1
+
+        entry = self._shared_get(key, now)
+        with self._lock:
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['shared_hits'] += 1
+            self._remember(key, *entry)
+        return entry[1]
+
+    def put(self, key, response):
+        """Store a response for RESPONSE_CACHE_TTL seconds"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, response)
+            self._stats['stores'] += 1
+            purge = self._stats['stores'] % PURGE_EVERY == 0
+        self._shared_put(key, expires_at, response, purge)
+
+    def _remember(self, key, expires_at, response):
+        """Insert into the memory tier (called with the lock held)"""
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=1)
+        if not self._table_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._table_ready = True
+        return conn
+
+    def _shared_get(self, key, now):
+        """(expires_at, response) from the SQLite tier, or None"""
+        if not self.path:
+            return None
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT expires_at, response FROM response_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error reading response cache: {str(e)}")
+            with self._lock:
+                self._stats['shared_errors'] += 1
+            return None
+        return row
+
+    def _shared_put(self, key, expires_at, response, purge):
+        """Write through to the SQLite tier; failures only cost future hits"""
+        if not self.path:
+            return
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO response_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                        (key, response, expires_at)
+                    )
+                    if purge:
+                        conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error writing response cache: {str(e)}")
+            with self._lock:
+                self._stats['shared_errors'] += 1
+
+    def clear(self):
+        """Drop every entry from memory and the shared tier"""
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            try:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.execute("DELETE FROM response_cache")
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Error clearing response cache: {str(e)}")
+
+    def stats(self):
+        """Hit ratio, size and tier configuration"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl
+        stats['shared'] = bool(self.path)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+        return stats
+
+response_cache = ResponseCache()
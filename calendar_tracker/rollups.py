@@ -0,0 +1,544 @@
+from datetime import date, timedelta
+from recurrence import is_recurring
+
+# Completion rollups. A completion is a habit_tracking row with status
+# 'completed' on the day the habit was done. Triggers keep the counters in
+# step with habit_occurrences and habit_tracking, whoever writes them; the
+# streaks depend on which occurrences were missed, so they are kept in
+# Python by set_completion, from the changed day on, and by refresh_rollups
+# for habits whose occurrences moved.
+
+COMPLETED = 'completed'
+PENDING = 'pending'
+
+# Days summarized in the chat progress line
+PROGRESS_DAYS = 7
+
+# The streak queries, run for every changed habit
+STREAK_COMPLETIONS = f"""
+    SELECT tracked_date FROM habit_tracking
+    WHERE habit_id = ? AND status = '{COMPLETED}'
+"""
+
+STREAK_OCCURRENCES = """
+    SELECT date FROM habit_occurrences WHERE habit_id = ? AND date <= ?
+    ORDER BY date
+"""
+
+NEXT_OCCURRENCE = """
+    SELECT MIN(date) FROM habit_occurrences WHERE habit_id = ? AND date > ?
+"""
+
+COMPLETIONS_BETWEEN = f"""
+    SELECT COUNT(*) FROM habit_tracking
+    WHERE habit_id = ? AND status = '{COMPLETED}' AND tracked_date > ? AND tracked_date <= ?
+"""
+
+WINDOW_TOTALS = """
+    SELECT COALESCE(SUM(scheduled), 0), COALESCE(SUM(completed), 0)
+    FROM rollup_daily WHERE date >= ? AND date <= ?
+"""
+
+def create_rollup_tables(c):
+    """Create the rollup tables"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_daily (
+            date TEXT PRIMARY KEY,
+            scheduled INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_habits (
+            habit_id INTEGER PRIMARY KEY,
+            category TEXT NOT NULL DEFAULT 'default',
+            completed INTEGER NOT NULL DEFAULT 0,
+            last_completed TEXT,
+            current_streak INTEGER NOT NULL DEFAULT 0,
+            longest_streak INTEGER NOT NULL DEFAULT 0,
+            streak_through TEXT,
+            next_due TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_categories (
+            category TEXT PRIMARY KEY,
+            completed INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    # Streak over days with at least one completion, across all habits
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_streak (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            current_streak INTEGER NOT NULL DEFAULT 0,
+            longest_streak INTEGER NOT NULL DEFAULT 0,
+            streak_through TEXT
+        )
+    ''')
+    c.execute("INSERT OR IGNORE INTO rollup_streak (id) VALUES (1)")
+
+def create_rollup_triggers(c):
+    """Create the triggers that keep the rollup counters current"""
+    scheduled = '''
+        INSERT INTO rollup_daily (date, scheduled) VALUES ({day}, {delta})
+        ON CONFLICT (date) DO UPDATE SET scheduled = scheduled + excluded.scheduled;
+    '''
+    # REPLACE does not fire delete triggers, so take back a replaced row first
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS rollup_occurrence_replace BEFORE INSERT ON habit_occurrences BEGIN
+            UPDATE rollup_daily SET scheduled = scheduled - 1
+            WHERE date = (
+                SELECT date FROM habit_occurrences
+                WHERE habit_id = new.habit_id AND occurrence_date = new.occurrence_date
+            );
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rollup_occurrence_insert AFTER INSERT ON habit_occurrences BEGIN
+            {scheduled.format(day='new.date', delta=1)}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rollup_occurrence_delete AFTER DELETE ON habit_occurrences BEGIN
+            {scheduled.format(day='old.date', delta=-1)}
+        END
+    ''')
+
+    add = '''
+        INSERT INTO rollup_daily (date, completed) VALUES (new.tracked_date, 1)
+        ON CONFLICT (date) DO UPDATE SET completed = completed + 1;
+        INSERT INTO rollup_habits (habit_id, category, completed, last_completed)
+        VALUES (
+            new.habit_id,
+            COALESCE((SELECT category FROM habits WHERE id = new.habit_id), 'default'),
+            1, new.tracked_date
+        )
+        ON CONFLICT (habit_id) DO UPDATE SET
+            completed = completed + 1,
+            last_completed = max(COALESCE(last_completed, ''), excluded.last_completed);
+        INSERT INTO rollup_categories (category, completed)
+        VALUES ((SELECT category FROM rollup_habits WHERE habit_id = new.habit_id), 1)
+        ON CONFLICT (category) DO UPDATE SET completed = completed + 1;
+    '''
+    remove = '''
+        UPDATE rollup_daily SET completed = completed - 1 WHERE date = old.tracked_date;
+        UPDATE rollup_categories SET completed = completed - 1
+        WHERE category = (SELECT category FROM rollup_habits WHERE habit_id = old.habit_id);
+        UPDATE rollup_habits SET completed = completed - 1 WHERE habit_id = old.habit_id;
+    '''
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rollup_tracking_insert AFTER INSERT ON habit_tracking
+        WHEN new.status = '{COMPLETED}' BEGIN
+            {add}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rollup_tracking_delete AFTER DELETE ON habit_tracking
+        WHEN old.status = '{COMPLETED}' BEGIN
+            {remove}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rollup_tracking_uncomplete
+        AFTER UPDATE OF status, tracked_date, habit_id ON habit_tracking
+        WHEN old.status = '{COMPLETED}' BEGIN
+            {remove}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS rollup_tracking_complete
+        AFTER UPDATE OF status, tracked_date, habit_id ON habit_tracking
+        WHEN new.status = '{COMPLETED}' BEGIN
+            {add}
+        END
+    ''')
+
+def rebuild_rollups(conn, progress=print):
+    """Recompute every counter and streak from the tracking and occurrence tables"""
+    c = conn.cursor()
+
+    # Completion used to be a flag on the habit; carry it over as a
+    # completion on the habit's own date
+    c.execute(f"""
+        INSERT INTO habit_tracking (habit_id, tracked_date, status)
+        SELECT h.id, h.date, '{COMPLETED}' FROM habits h
+        WHERE h.completed = 1
+        AND NOT EXISTS (
+            SELECT 1 FROM habit_tracking t
+            WHERE t.habit_id = h.id AND t.tracked_date = h.date AND t.status = '{COMPLETED}'
+        )
+    """)
+
+    for table in ('rollup_daily', 'rollup_habits', 'rollup_categories'):
+        c.execute(f"DELETE FROM {table}")
+    c.execute("""
+        INSERT INTO rollup_daily (date, scheduled)
+        SELECT date, COUNT(*) FROM habit_occurrences GROUP BY date
+    """)
+    c.execute(f"""
+        INSERT INTO rollup_daily (date, completed)
+        SELECT tracked_date, COUNT(*) FROM habit_tracking
+        WHERE status = '{COMPLETED}' GROUP BY tracked_date
+        ON CONFLICT (date) DO UPDATE SET completed = excluded.completed
+    """)
+    c.execute(f"""
+        INSERT INTO rollup_habits (habit_id, category, completed, last_completed)
+        SELECT t.habit_id, COALESCE(h.category, 'default'), COUNT(*), MAX(t.tracked_date)
+        FROM habit_tracking t LEFT JOIN habits h ON h.id = t.habit_id
+        WHERE t.status = '{COMPLETED}'
+        GROUP BY t.habit_id
+    """)
+    c.execute("""
+        INSERT INTO rollup_categories (category, completed)
+        SELECT category, SUM(completed) FROM rollup_habits GROUP BY category
+    """)
+
+    c.execute("SELECT habit_id FROM rollup_habits")
+    habit_ids = [row[0] for row in c.fetchall()]
+    for offset in range(0, len(habit_ids), 500):
+        refresh_streaks(conn, habit_ids[offset:offset + 500])
+    refresh_overall_streak(conn)
+    progress(f"  … rollups built for {len(habit_ids)} habits with completions")
+
+def set_completion(conn, habit_id, day, completed=True):
+    """Mark a habit done (or not done) on a day; the counters follow via triggers"""
+    status = COMPLETED if completed else PENDING
+    c = conn.cursor()
+    c.execute("""
+        SELECT id, status FROM habit_tracking WHERE habit_id = ? AND tracked_date = ?
+        ORDER BY id LIMIT 1
+    """, (habit_id, day))
+    row = c.fetchone()
+    if row:
+        c.execute("UPDATE habit_tracking SET status = ? WHERE id = ?", (status, row[0]))
+    elif completed:
+        c.execute("""
+            INSERT INTO habit_tracking (habit_id, tracked_date, status) VALUES (?, ?, ?)
+        """, (habit_id, day, status))
+    if completed == bool(row and row[1] == COMPLETED):
+        return
+
+    if not completed or not extend_streak(conn, habit_id, day):
+        refresh_streaks(conn, [habit_id])
+    update_overall_streak(conn, day, completed)
+
+def walk_streaks(due_dates, done, today):
+    """(current, longest, streak_through) over sorted occurrence dates
+
+    `due_dates` are a habit's occurrence dates up to today and `done` its
+    completion dates. Today's occurrence only counts once completed, so an
+    open occurrence never breaks the streak before the day is over.
+    """
+    current = longest = 0
+    through = None
+    for day in due_dates:
+        if day in done:
+            current += 1
+            through = day
+            longest = max(longest, current)
+        elif day < today:
+            current = 0
+    return current, longest, through
+
+def refresh_streaks(conn, habit_ids):
+    """Recompute the streaks and last completion of habits that have a rollup row"""
+    c = conn.cursor()
+    today = date.today().isoformat()
+    for habit_id in habit_ids:
+        c.execute(STREAK_COMPLETIONS, (habit_id,))
+        done = {row[0] for row in c.fetchall()}
+        c.execute(STREAK_OCCURRENCES, (habit_id, today))
+        current, longest, through = walk_streaks([row[0] for row in c.fetchall()], done, today)
+
+        # The streak stays alive until the next occurrence after it is missed
+        next_due = None
+        if through:
+            c.execute(NEXT_OCCURRENCE, (habit_id, through))
+            next_due = c.fetchone()[0]
+        c.execute("""
+            UPDATE rollup_habits
+            SET current_streak = ?, longest_streak = ?, streak_through = ?,
+                next_due = ?, last_completed = ?
+            WHERE habit_id = ?
+        """, (current, longest, through, next_due, max(done) if done else None, habit_id))
+
+def refresh_overall_streak(conn):
+    """Recompute the streak of consecutive days with at least one completion
+
+    Like the per-habit streaks, days after today do not count yet.
+    """
+    c = conn.cursor()
+    c.execute("""
+        SELECT date FROM rollup_daily WHERE completed > 0 AND date <= ? ORDER BY date
+    """, (date.today().isoformat(),))
+    current = longest = 0
+    through = previous = None
+    for (day,) in c.fetchall():
+        day = date.fromisoformat(day)
+        current = current + 1 if previous and day - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = through = day
+    c.execute("""
+        UPDATE rollup_streak SET current_streak = ?, longest_streak = ?, streak_through = ?
+        WHERE id = 1
+    """, (current, longest, through.isoformat() if through else None))
+
+def extend_streak(conn, habit_id, day):
+    """Carry a habit's stored streak over a completion added after it
+
+    Only the occurrences after streak_through are read. Returns False when
+    the stored streak cannot be extended from there (a completion on or
+    before streak_through, or other completions since it) and the caller
+    has to recompute it.
+    """
+    c = conn.cursor()
+    today = date.today().isoformat()
+    c.execute("""
+        SELECT current_streak, longest_streak, streak_through, next_due
+        FROM rollup_habits WHERE habit_id = ?
+    """, (habit_id,))
+    row = c.fetchone()
+    if not row:
+        return False
+    current, longest, through, next_due = row
+    if day > today:
+        # Not due yet; walk_streaks leaves it out until the day comes
+        return True
+    if through and (day <= through or not next_due or (day == next_due and not current)):
+        return False
+
+    # Anything else completed since streak_through was not counted yet
+    c.execute(COMPLETIONS_BETWEEN, (habit_id, through or '', today))
+    if c.fetchone()[0] != 1:
+        return False
+
+    c.execute("SELECT COUNT(*) FROM habit_occurrences WHERE habit_id = ? AND date = ?", (habit_id, day))
+    due = c.fetchone()[0]
+    if not due:
+        return True
+
+    # Every occurrence between streak_through and this one is past and missed
+    current = current + due if through and day == next_due else due
+    longest = max(longest, current)
+    c.execute(NEXT_OCCURRENCE, (habit_id, day))
+    next_due = c.fetchone()[0]
+    if next_due and next_due < today:
+        # A backfilled day whose next occurrence was already missed
+        current = 0
+    c.execute("""
+        UPDATE rollup_habits
+        SET current_streak = ?, longest_streak = ?, streak_through = ?, next_due = ?
+        WHERE habit_id = ?
+    """, (current, longest, day, next_due, habit_id))
+    return True
+
+def _run_length(c, day, step):
+    """Consecutive days with a completion next to day, walking back (-1) or forward (1)"""
+    if step < 0:
+        c.execute("SELECT date FROM rollup_daily WHERE date < ? AND completed > 0 ORDER BY date DESC", (day,))
+    else:
+        c.execute("""
+            SELECT date FROM rollup_daily WHERE date > ? AND date <= ? AND completed > 0 ORDER BY date
+        """, (day, date.today().isoformat()))
+    expected = date.fromisoformat(day) + timedelta(days=step)
+    length = 0
+    for (active,) in c:
+        if active != expected.isoformat():
+            break
+        length += 1
+        expected += timedelta(days=step)
+    return length
+
+def update_overall_streak(conn, day, completed):
+    """Update the overall streak after a completion was added to or taken from one day
+
+    Only the run of days around the changed day is read, and days after
+    today are ignored. Emptying a day of the longest run falls back to
+    refresh_overall_streak, since the next longest run can be anywhere.
+    """
+    if day > date.today().isoformat():
+        return
+    c = conn.cursor()
+    c.execute("SELECT completed FROM rollup_daily WHERE date = ?", (day,))
+    row = c.fetchone()
+    count = row[0] if row else 0
+    if count != (1 if completed else 0):
+        # The day already had (or still has) another completion
+        return
+
+    c.execute("SELECT current_streak, longest_streak, streak_through FROM rollup_streak WHERE id = 1")
+    current, longest, through = c.fetchone()
+    if completed and (not through or day > through):
+        # The usual case: a completion today extends or starts the current run
+        previous = (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+        current = current + 1 if previous == through else 1
+        through = day
+        longest = max(longest, current)
+    elif not through or day > through:
+        refresh_overall_streak(conn)
+        return
+    else:
+        # Days of the current run are known from the stored streak; only a
+        # run elsewhere has to be walked
+        gap = (date.fromisoformat(through) - date.fromisoformat(day)).days
+        in_current = gap <= current if completed else gap < current
+        if completed:
+            after = current if in_current else _run_length(c, day, 1)
+            before = _run_length(c, day, -1)
+        elif in_current:
+            before, after = current - 1 - gap, gap
+        else:
+            before, after = _run_length(c, day, -1), _run_length(c, day, 1)
+        run = before + 1 + after
+
+        if completed:
+            # Joins the runs on either side, the current one included
+            if in_current:
+                current = run
+            longest = max(longest, run)
+        elif run == longest:
+            refresh_overall_streak(conn)
+            return
+        elif in_current and after:
+            current = after
+        elif in_current and before:
+            current, through = before, (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+        elif in_current:
+            # The run was this day alone; the streak falls back to the last run before it
+            c.execute("SELECT MAX(date) FROM rollup_daily WHERE date < ? AND completed > 0", (day,))
+            through = c.fetchone()[0]
+            current = _run_length(c, through, -1) + 1 if through else 0
+
+    c.execute("""
+        UPDATE rollup_streak SET current_streak = ?, longest_streak = ?, streak_through = ?
+        WHERE id = 1
+    """, (current, longest, through))
+
+def refresh_rollups(conn, habit_ids, moved=None):
+    """Move category counters for recategorized habits and refresh their streaks
+
+    `moved` are the habits whose occurrence dates changed (None for all).
+    Only those, and recurring series, whose exceptions can move single
+    occurrences, have their streaks recomputed. The overall streak only
+    moves when a habit with completions was deleted along with them.
+    """
+    c = conn.cursor()
+    tracked = []
+    for offset in range(0, len(habit_ids), 900):
+        chunk = habit_ids[offset:offset + 900]
+        c.execute(f"""
+            SELECT r.habit_id, r.category, r.completed, h.id, COALESCE(h.category, 'default'),
+                h.recurrence_pattern
+            FROM rollup_habits r LEFT JOIN habits h ON h.id = r.habit_id
+            WHERE r.habit_id IN ({','.join('?' * len(chunk))})
+        """, chunk)
+        tracked.extend(c.fetchall())
+    if not tracked:
+        return
+
+    rescheduled = []
+    deleted = False
+    for habit_id, old_category, completed, exists, category, pattern in tracked:
+        if exists is None:
+            if not completed:
+                c.execute("DELETE FROM rollup_habits WHERE habit_id = ?", (habit_id,))
+            deleted = True
+            continue
+        if moved is None or habit_id in moved or is_recurring(pattern):
+            rescheduled.append(habit_id)
+        if category != old_category:
+            c.execute("""
+                UPDATE rollup_categories SET completed = completed - ? WHERE category = ?
+            """, (completed, old_category))
+            c.execute("""
+                INSERT INTO rollup_categories (category, completed) VALUES (?, ?)
+                ON CONFLICT (category) DO UPDATE SET completed = completed + excluded.completed
+            """, (category, completed))
+            c.execute("UPDATE rollup_habits SET category = ? WHERE habit_id = ?", (category, habit_id))
+
+    refresh_streaks(conn, rescheduled)
+    if deleted:
+        refresh_overall_streak(conn)
+
+def live_streak(current, next_due, today):
+    """A stored streak as of today: zero once the next occurrence was missed"""
+    if not current or (next_due and next_due < today):
+        return 0
+    return current
+
+def overall_streak(conn, today=None):
+    """(current, longest) streak of days with at least one completion"""
+    today = today or date.today()
+    c = conn.cursor()
+    c.execute("SELECT current_streak, longest_streak, streak_through FROM rollup_streak WHERE id = 1")
+    row = c.fetchone()
+    if not row or not row[2]:
+        return 0, 0
+    current, longest, through = row
+    # Today is still open, so a streak through yesterday is alive
+    if through < (today - timedelta(days=1)).isoformat():
+        current = 0
+    return current, longest
+
+def window_totals(conn, window_start, window_end):
+    """(scheduled, completed) over [window_start, window_end]"""
+    c = conn.cursor()
+    c.execute(WINDOW_TOTALS, (window_start, window_end))
+    return c.fetchone()
+
+def progress_summary(conn, today=None):
+    """One line on the past week's completions and the current streak, or None"""
+    today = today or date.today()
+    first = (today - timedelta(days=PROGRESS_DAYS - 1)).isoformat()
+    scheduled, completed = window_totals(conn, first, today.isoformat())
+    current, longest = overall_streak(conn, today)
+    if not scheduled and not completed:
+        return None
+
+    rate = completed / scheduled * 100 if scheduled else 0
+    summary = f"Completed {completed}/{scheduled} habits ({rate:.1f}% success rate) in the past week"
+    if current:
+        summary += f"; on a {current}-day streak (longest {longest})"
+    return summary
+
+def daily_rollups(conn, window_start, window_end):
+    """[(date, scheduled, completed)] for the days in [window_start, window_end) with any"""
+    c = conn.cursor()
+    c.execute("""
+        SELECT date, scheduled, completed FROM rollup_daily
+        WHERE date >= ? AND date < ? AND (scheduled > 0 OR completed > 0)
+        ORDER BY date
+    """, (window_start, window_end))
+    return c.fetchall()
+
+def category_rollups(conn):
+    """{category: completions}"""
+    c = conn.cursor()
+    c.execute("SELECT category, completed FROM rollup_categories WHERE completed > 0 ORDER BY category")
+    return dict(c.fetchall())
+
+def habit_rollups(conn, today=None, limit=None):
+    """Completion counts and live streaks of habits with completions, best streak first"""
+    today = (today or date.today()).isoformat()
+    c = conn.cursor()
+    c.execute("""
+        SELECT r.habit_id, h.habit, r.category, r.completed, r.last_completed,
+               r.current_streak, r.longest_streak, r.next_due
+        FROM rollup_habits r JOIN habits h ON h.id = r.habit_id
+        WHERE r.completed > 0
+    """)
+    habits = [
+        {
+            'id': habit_id,
+            'title': title,
+            'category': category,
+            'completed': completed,
+            'lastCompleted': last_completed,
+            'currentStreak': live_streak(current, next_due, today),
+            'longestStreak': longest,
+        }
+        for habit_id, title, category, completed, last_completed, current, longest, next_due
+        in c.fetchall()
+    ]
+    habits.sort(key=lambda habit: (-habit['currentStreak'], -habit['completed'], habit['id']))
+    return habits[:limit] if limit else habits
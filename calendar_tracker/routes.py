@@ -1,15 +1,37 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-from datetime import datetime
+from flask import Blueprint, current_app, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+from datetime import date, datetime, timedelta
 from services.gemini_service import GeminiService
 from services.spotify_service import SpotifyService
-from utils import get_db_connection, analyze_sentiment
+from utils import get_db_connection, get_pool_stats, analyze_sentiment
+from search import build_match_query, search_habits
+from recurrence import Occurrence, expand_habit, is_recurring, load_exceptions, set_exception
+from occurrences import covers, get_horizon
+from mutations import habit_changed
+import reminders
+import ics
+from versions import make_etag, range_version
+from journal import changes_since, current_cursor, journal_floor
+from batch import apply_operations, validate_operations
+from query_cache import habits_cache
+from broker import broker
+from chat_jobs import ClientLimit, QueueFull, chat_jobs
+from response_cache import response_cache
+from prompt_context import prompt_context
+from intervals import format_minutes, interval_index, proposed_intervals
+import freebusy
+import scheduler
+import rollups
+import analytics
+from serializers import HABIT_COLUMNS, HABITS_SELECT, EventSerializer, build_event, dumps, json_response
+from serializers import OCCURRENCES_KEYSET, OCCURRENCES_WINDOW, SERIES_HABITS_WINDOW, SINGLE_HABITS_WINDOW
 
 main_bp = Blueprint('main', __name__)
 
 # Initialize services
 try:
+    # Returns at once; the model is probed and loaded in the background
     gemini_service = GeminiService()
-    print("Gemini service initialized successfully")
+    print("Gemini service warming up in the background")
 except Exception as e:
     print(f"Warning: Gemini service initialization failed - {str(e)}")
     gemini_service = None
@@ -80,6 +102,68 @@ def spotify_playback(action):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/stats/db')
+def db_stats():
+    """Expose connection pool hit/miss and wait-time statistics"""
+    return jsonify(get_pool_stats())
+
+@main_bp.route('/stats/cache')
+def cache_stats():
+    """Expose /habits result cache hit ratio and memory use"""
+    return jsonify(habits_cache.stats())
+
+@main_bp.route('/stats/intervals')
+def interval_stats():
+    """Expose conflict-index hit ratio and size"""
+    return jsonify(interval_index.stats())
+
+@main_bp.route('/stats/analytics')
+def analytics_stats():
+    """Expose the heatmap/trends cache hit ratio and memory use"""
+    return jsonify(analytics.analytics_cache.stats())
+
+@main_bp.route('/stats/gemini')
+def gemini_stats():
+    """Expose whether the Gemini service is warming up, ready or failed"""
+    if gemini_service is None:
+        return jsonify({'state': 'disabled'})
+    return jsonify(gemini_service.status())
+
+@main_bp.route('/stats/responses')
+def response_cache_stats():
+    """Expose Gemini response cache hit ratio and size"""
+    return jsonify(response_cache.stats())
+
+@main_bp.route('/stats/context')
+def prompt_context_stats():
+    """Expose how often the chat context snapshot is reused versus rebuilt"""
+    return jsonify(prompt_context.stats())
+
+@main_bp.route('/stats/chat')
+def chat_stats():
+    """Expose chat job queue depth, rejections and latency"""
+    return jsonify(chat_jobs.stats())
+
+@main_bp.route('/stats/events')
+def event_stream_stats():
+    """Expose live update subscriber and delivery counters"""
+    return jsonify(broker.stats())
+
+@main_bp.route('/reminders/stats')
+def reminder_stats():
+    """Expose reminder scheduler lag and throughput metrics"""
+    scheduler = reminders.reminder_scheduler
+    if not scheduler:
+        return jsonify({'error': 'Reminder scheduler not running'}), 503
+    return jsonify(scheduler.stats())
+
+@main_bp.route('/reminders/webhook', methods=['POST'])
+def reminder_webhook():
+    """Local stub target for the webhook reminder sink"""
+    reminder = request.get_json(silent=True) or {}
+    print(f"Reminder webhook received: {reminder.get('title')} at {reminder.get('starts')}")
+    return jsonify({'received': True})
+
 @main_bp.route('/')
 def index():
     """Render the main page with today's date"""
@@ -113,6 +197,14 @@ def add_habit():
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
+            # Check and insert under the write lock so no other write can
+            # claim the slot in between
+            conn.execute("BEGIN IMMEDIATE")
+            conflict = conflict_response(conn, proposed_intervals(date, start_time, end_time, recurrence))
+            if conflict:
+                conn.rollback()
+                return conflict
+
             c.execute("""
                 INSERT INTO habits (
                     date, habit, start_time, end_time, description,
@@ -129,29 +221,13 @@ def add_habit():
                 INSERT INTO habit_tracking (habit_id, tracked_date)
                 VALUES (?, date('now'))
             """, (habit_id,))
+            habit_changed(conn, habit_id)
             conn.commit()
-            
-            event = {
-                'id': habit_id,
-                'title': habit,
-                'allDay': not (start_time and end_time),
-                'start': f"{date}T{start_time}" if start_time else date,
-                'end': f"{date}T{end_time}" if end_time else None,
-                'backgroundColor': color or ('#1e40af' if start_time and end_time else '#3b82f6'),
-                'borderColor': color or ('#1e3a8a' if start_time and end_time else '#2563eb'),
-                'textColor': 'white',
-                'description': description,
-                'category': category,
-                'priority': priority,
-                'recurrence': recurrence,
-                'reminder': reminder,
-                'extendedProps': {
-                    'category': category,
-                    'priority': priority
-                }
-            }
-            return jsonify(event), 200
+
+            c.execute(HABITS_SELECT + " WHERE h.id = ?", (habit_id,))
+            return json_response(build_event(c.fetchone()))
         except Exception as e:
+            conn.rollback()
             return str(e), 500
 
 @main_bp.route('/updateHabit', methods=['POST'])
@@ -176,37 +252,16 @@ def update_habit():
                     priority = ?, color = ?, last_modified = CURRENT_TIMESTAMP
                 WHERE id = ?
             """, (habit, description, category, priority, color, habit_id))
+            habit_changed(conn, habit_id)
             conn.commit()
             
             # Return updated event data
-            c.execute("""
-                SELECT date, start_time, end_time, description, category, priority, color
-                FROM habits WHERE id = ?
-            """, (habit_id,))
+            c.execute(HABITS_SELECT + " WHERE h.id = ?", (habit_id,))
             row = c.fetchone()
             
             if not row:
                 return "Habit not found.", 404
-                
-            date, start_time, end_time, desc, cat, prio, col = row
-            event = {
-                'id': habit_id,
-                'title': habit,
-                'allDay': not (start_time and end_time),
-                'start': f"{date}T{start_time}" if start_time else date,
-                'end': f"{date}T{end_time}" if end_time else None,
-                'backgroundColor': col or ('#1e40af' if start_time and end_time else '#3b82f6'),
-                'borderColor': col or ('#1e3a8a' if start_time and end_time else '#2563eb'),
-                'textColor': 'white',
-                'description': desc,
-                'category': cat,
-                'priority': prio,
-                'extendedProps': {
-                    'category': cat,
-                    'priority': prio
-                }
-            }
-            return jsonify(event), 200
+            return json_response(build_event(row))
         except Exception as e:
             return str(e), 500
 
@@ -217,6 +272,7 @@ def reschedule_habit():
     new_date = request.form.get('date')
     new_start = request.form.get('start_time', '').strip() or None
     new_end = request.form.get('end_time', '').strip() or None
+    occurrence_date = request.form.get('occurrence_date', '').strip() or None
     
     if not habit_id or not new_date:
         return "Missing required fields.", 400
@@ -224,33 +280,55 @@ def reschedule_habit():
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
-            c.execute("""
-                UPDATE habits 
-                SET date = ?, start_time = ?, end_time = ?, 
-                    last_modified = CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (new_date, new_start, new_end, habit_id))
+            conn.execute("BEGIN IMMEDIATE")
+            c.execute("SELECT recurrence_pattern FROM habits WHERE id = ?", (habit_id,))
+            row = c.fetchone()
+            if not row:
+                conn.rollback()
+                return "Habit not found.", 404
+            # A single moved occurrence only occupies its new slot
+            pattern = None if occurrence_date else row[0]
+            conflict = conflict_response(
+                conn, proposed_intervals(new_date, new_start, new_end, pattern), exclude=[habit_id]
+            )
+            if conflict:
+                conn.rollback()
+                return conflict
+
+            if occurrence_date:
+                # Move a single occurrence of a recurring habit
+                set_exception(
+                    conn, habit_id, occurrence_date,
+                    new_date=new_date, new_start_time=new_start, new_end_time=new_end
+                )
+            else:
+                c.execute("""
+                    UPDATE habits 
+                    SET date = ?, start_time = ?, end_time = ?, 
+                        last_modified = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (new_date, new_start, new_end, habit_id))
+            habit_changed(conn, habit_id)
             conn.commit()
             
             # Return updated event data
-            c.execute("SELECT habit FROM habits WHERE id = ?", (habit_id,))
-            habit = c.fetchone()[0]
-            
-            event = {
-                'id': habit_id,
-                'title': habit,
-                'allDay': not (new_start and new_end),
-                'start': f"{new_date}T{new_start}" if new_start else new_date,
-                'end': f"{new_date}T{new_end}" if new_end else None,
-            }
-            return jsonify(event), 200
+            c.execute(HABITS_SELECT + " WHERE h.id = ?", (habit_id,))
+            row = c.fetchone()
+            if not row:
+                return "Habit not found.", 404
+            occurrence = None
+            if occurrence_date:
+                occurrence = Occurrence(occurrence_date, new_date, new_start, new_end)
+            return json_response(build_event(row, occurrence))
         except Exception as e:
+            conn.rollback()
             return str(e), 500
 
 @main_bp.route('/removeHabit', methods=['POST'])
 def remove_habit():
     """Delete a habit and its associated data"""
     habit_id = request.form.get('id')
+    occurrence_date = request.form.get('occurrence_date', '').strip() or None
     
     if not habit_id:
         return "Missing habit ID.", 400
@@ -258,15 +336,311 @@ def remove_habit():
     with get_db_connection() as conn:
         c = conn.cursor()
         try:
-            # Delete associated tracking records first
+            if occurrence_date:
+                # Skip a single occurrence of a recurring habit
+                set_exception(conn, habit_id, occurrence_date, cancelled=True)
+                habit_changed(conn, habit_id)
+                conn.commit()
+                return jsonify({'message': 'Occurrence removed successfully'}), 200
+
+            # Delete associated tracking records and exceptions first
             c.execute("DELETE FROM habit_tracking WHERE habit_id = ?", (habit_id,))
+            c.execute("DELETE FROM habit_exceptions WHERE habit_id = ?", (habit_id,))
             # Then delete the habit
             c.execute("DELETE FROM habits WHERE id = ?", (habit_id,))
+            habit_changed(conn, habit_id)
             conn.commit()
             return jsonify({'message': 'Habit deleted successfully'}), 200
         except Exception as e:
             return str(e), 500
 
+@main_bp.route('/completeHabit', methods=['POST'])
+def complete_habit():
+    """Mark a habit (or one occurrence of a recurring habit) done or not done"""
+    habit_id = request.form.get('id')
+    day = request.form.get('date', '').strip()[:10] or None
+    completed = request.form.get('completed', '1') not in ('0', 'false')
+
+    if not habit_id:
+        return "Missing habit ID.", 400
+
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            c.execute("SELECT date, recurrence_pattern FROM habits WHERE id = ?", (habit_id,))
+            row = c.fetchone()
+            if not row:
+                conn.rollback()
+                return "Habit not found.", 404
+            day = date.fromisoformat(day or row[0]).isoformat()
+            if day > date.today().isoformat():
+                conn.rollback()
+                return "Cannot complete a habit on a future date.", 400
+
+            rollups.set_completion(conn, habit_id, day, completed)
+            if not is_recurring(row[1]):
+                # One-off habits also carry the flag the calendar shows
+                c.execute("""
+                    UPDATE habits SET completed = ?, last_modified = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (int(completed), habit_id))
+                habit_changed(conn, habit_id)
+            conn.commit()
+            # The chat context's progress line counts completions
+            prompt_context.invalidate()
+
+            c.execute("""
+                SELECT current_streak, longest_streak, next_due FROM rollup_habits WHERE habit_id = ?
+            """, (habit_id,))
+            current, longest, next_due = c.fetchone() or (0, 0, None)
+            return jsonify({
+                'id': int(habit_id),
+                'date': day,
+                'completed': completed,
+                'currentStreak': rollups.live_streak(current, next_due, date.today().isoformat()),
+                'longestStreak': longest,
+            })
+        except ValueError:
+            conn.rollback()
+            return "Invalid date.", 400
+        except Exception as e:
+            conn.rollback()
+            return str(e), 500
+
+@main_bp.route('/habits/batch', methods=['POST'])
+def batch_habits():
+    """Apply a list of create/update/reschedule/delete operations atomically"""
+    payload = request.get_json(silent=True)
+    operations = payload.get('operations') if isinstance(payload, dict) else payload
+
+    with get_db_connection() as conn:
+        try:
+            # Validate under the write lock so the existence checks still hold
+            conn.execute("BEGIN IMMEDIATE")
+            allow_conflict = isinstance(payload, dict) and bool(payload.get('allow_conflict'))
+            normalized, errors = validate_operations(conn, operations, allow_conflict)
+            if errors:
+                conn.rollback()
+                return jsonify({'error': 'Invalid operations', 'errors': errors}), 400
+
+            results = apply_operations(conn, normalized)
+            conn.commit()
+            return jsonify({'results': results}), 200
+        except Exception as e:
+            conn.rollback()
+            return str(e), 500
+
+@main_bp.route('/export.ics')
+def export_ics():
+    """Stream every habit as an iCalendar file"""
+    response = current_app.response_class(
+        stream_with_context(ics.export_calendar()),
+        mimetype='text/calendar'
+    )
+    response.headers['Content-Disposition'] = 'attachment; filename=habits.ics'
+    return response
+
+@main_bp.route('/import.ics', methods=['POST'])
+def import_ics():
+    """Bulk-load VEVENTs from an uploaded (or raw request body) iCalendar file"""
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    try:
+        return jsonify(ics.import_calendar(stream)), 200
+    except Exception as e:
+        return str(e), 500
+
+def conflict_response(conn, slots, exclude=()):
+    """409 listing overlapping events, unless the client set allow_conflict=1"""
+    if request.form.get('allow_conflict') == '1':
+        return None
+    conflicts = interval_index.conflicts(conn, slots, exclude)
+    if not conflicts:
+        return None
+    return jsonify({'error': 'Time conflict', 'conflicts': conflicts}), 409
+
+def habit_filter_conditions(filters):
+    """SQL conditions (on alias h) and parameters for the category/priority/search filters"""
+    conditions = ""
+    params = []
+
+    if filters.get('category'):
+        conditions += " AND h.category = ?"
+        params.append(filters['category'])
+
+    if filters.get('priority'):
+        conditions += " AND h.priority = ?"
+        params.append(filters['priority'])
+
+    if filters.get('search'):
+        match = build_match_query(filters['search'])
+        if match:
+            conditions += " AND h.id IN (SELECT rowid FROM habits_fts WHERE habits_fts MATCH ?)"
+            params.append(match)
+
+    return conditions, params
+
+# Rows per fetchmany batch, and events per streamed chunk
+STREAM_BATCH_SIZE = 1000
+
+# Windows outside the materialized horizon are expanded this many days at a time
+STREAM_SLICE_DAYS = 31
+
+def load_materialized_window(conn, conditions, params, window_start, window_end, after=None):
+    """(row, occurrence) pairs for a window inside the materialized horizon
+
+    Rows come back in (date, start_time, id) order, fetched in batches;
+    `after` is a keyset position from the same ordering to resume from.
+    """
+    keyset = ""
+    keyset_params = []
+    if after:
+        keyset = OCCURRENCES_KEYSET
+        keyset_params = list(after)
+
+    c = conn.cursor()
+    c.execute(
+        OCCURRENCES_WINDOW.format(keyset=keyset, conditions=conditions),
+        [window_start, window_end] + keyset_params + params
+    )
+
+    while True:
+        rows = c.fetchmany(STREAM_BATCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            occurrence = None
+            if is_recurring(row[9]):
+                occurrence = Occurrence(row[13], row[1], row[3], row[4])
+            yield row[:13], occurrence
+
+def expand_window(conn, conditions, params, window_start, window_end):
+    """(row, occurrence) pairs expanded on the fly, for windows outside the horizon"""
+    # One-off habits: FullCalendar sends ISO datetimes with an exclusive end;
+    # compare on the date prefix so the range seeks idx_habits_date_start
+    single_conditions = conditions
+    single_params = list(params)
+    if window_start:
+        single_conditions += " AND h.date >= ?"
+        single_params.append(window_start)
+    if window_end:
+        single_conditions += " AND h.date < ?"
+        single_params.append(window_end)
+
+    # Recurring series: any series starting before the window ends may have
+    # occurrences inside it (idx_habits_recurring)
+    series_conditions = conditions
+    series_params = list(params)
+    if window_end:
+        series_conditions += " AND h.date < ?"
+        series_params.append(window_end)
+
+    c = conn.cursor()
+    c.execute(SINGLE_HABITS_WINDOW.format(conditions=single_conditions), single_params)
+    pairs = [(row, None) for row in c.fetchall()]
+    c.execute(SERIES_HABITS_WINDOW.format(conditions=series_conditions), series_params)
+    series = c.fetchall()
+    exceptions = load_exceptions(conn, [row[0] for row in series])
+
+    for row in series:
+        habit = dict(zip(HABIT_COLUMNS, row))
+        for occurrence in expand_habit(habit, exceptions.get(habit['id'], ()), window_start, window_end):
+            pairs.append((row, occurrence))
+
+    if series:
+        pairs.sort(key=lambda pair: (
+            pair[1].date if pair[1] else pair[0][1],
+            (pair[1].start_time if pair[1] else pair[0][3]) or ''
+        ))
+    return pairs
+
+def event_key(pair):
+    """Keyset position (date, start_time, id) of a (row, occurrence) pair"""
+    row, occurrence = pair
+    if occurrence:
+        return (occurrence.date, occurrence.start_time or '', row[0])
+    return (row[1], row[3] or '', row[0])
+
+def iter_window(conn, conditions, params, window_start, window_end, after=None):
+    """(row, occurrence) pairs for any window in keyset order, in bounded memory"""
+    if covers(get_horizon(conn), window_start, window_end):
+        yield from load_materialized_window(conn, conditions, params, window_start, window_end, after)
+        return
+
+    # Outside the horizon, expand one slice of the window at a time
+    slice_start = date.fromisoformat(window_start)
+    final_end = date.fromisoformat(window_end)
+    if after:
+        slice_start = max(slice_start, date.fromisoformat(after[0]))
+    while slice_start < final_end:
+        slice_end = min(slice_start + timedelta(days=STREAM_SLICE_DAYS), final_end)
+        pairs = sorted(
+            expand_window(conn, conditions, params, slice_start.isoformat(), slice_end.isoformat()),
+            key=event_key
+        )
+        for pair in pairs:
+            if not after or event_key(pair) > after:
+                yield pair
+        slice_start = slice_end
+
+def parse_after(value):
+    """Decode an `after` keyset cursor ("date,start_time,id")"""
+    parts = value.split(',')
+    if len(parts) != 3:
+        raise ValueError("Invalid cursor")
+    date.fromisoformat(parts[0])
+    return (parts[0], parts[1], int(parts[2]))
+
+def stream_events(conditions, params, window_start, window_end, mode, after, limit):
+    """Generate a /habits body chunk by chunk, as a JSON object or NDJSON"""
+    serializer = EventSerializer()
+    next_cursor = None
+    sent = 0
+    if mode == 'json':
+        yield '{"events":['
+
+    with get_db_connection() as conn:
+        conn.execute("BEGIN")
+        chunk = []
+        last = None
+        for pair in iter_window(conn, conditions, params, window_start, window_end, after):
+            if limit and sent + len(chunk) >= limit:
+                next_cursor = ','.join(str(part) for part in event_key(last))
+                break
+            chunk.append(pair)
+            last = pair
+            if len(chunk) >= STREAM_BATCH_SIZE:
+                yield render_chunk(serializer.fragments(chunk), mode, sent)
+                sent += len(chunk)
+                chunk = []
+        if chunk:
+            yield render_chunk(serializer.fragments(chunk), mode, sent)
+
+    if mode == 'json':
+        yield '],"next":' + (f'"{next_cursor}"' if next_cursor else 'null') + '}'
+    elif next_cursor:
+        yield f'{{"next":"{next_cursor}"}}\n'
+
+def render_chunk(fragments, mode, offset):
+    """Join event fragments for one streamed chunk"""
+    if mode == 'json':
+        return (',' if offset else '') + ','.join(fragments)
+    return '\n'.join(fragments) + '\n'
+
+def set_validators(response, etag, last_modified):
+    """Attach ETag/Last-Modified and ask clients to revalidate every time"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def not_modified(etag, last_modified):
+    """Empty 304 response carrying the current validators"""
+    response = current_app.response_class(status=304)
+    return set_validators(response, etag, last_modified)
+
 @main_bp.route('/habits', methods=['GET'])
 def get_habits():
     """Get all habits for calendar display with extended properties and filtering"""
@@ -278,135 +652,457 @@ def get_habits():
         'search': request.args.get('search')
     }
     
-    query = """
-        SELECT id, date, habit, start_time, end_time, description,
-               category, priority, color, recurrence_pattern, reminder_time,
-               completed
-        FROM habits
-        WHERE 1=1
-    """
-    params = []
-    
-    # Apply filters
-    if filters['category']:
-        query += " AND category = ?"
-        params.append(filters['category'])
-    
-    if filters['priority']:
-        query += " AND priority = ?"
-        params.append(filters['priority'])
-    
-    if filters['start']:
-        query += " AND date >= ?"
-        params.append(filters['start'])
-    
-    if filters['end']:
-        query += " AND date <= ?"
-        params.append(filters['end'])
-    
-    if filters['search']:
-        query += " AND (habit LIKE ? OR description LIKE ?)"
-        search_term = f"%{filters['search']}%"
-        params.extend([search_term, search_term])
+    window_start = filters['start'][:10] if filters['start'] else None
+    window_end = filters['end'][:10] if filters['end'] else None
 
-    # Add sorting
-    query += " ORDER BY date ASC, start_time ASC"
+    conditions, params = habit_filter_conditions(filters)
+
+    # ?stream=json|ndjson: chunked body with keyset pagination (?after=, ?limit=)
+    mode = request.args.get('stream')
+    if mode:
+        if mode not in ('json', 'ndjson'):
+            return jsonify({'error': 'stream must be json or ndjson'}), 400
+        if not window_start or not window_end:
+            return jsonify({'error': 'Missing start or end'}), 400
+        try:
+            after = parse_after(request.args['after']) if request.args.get('after') else None
+            limit = max(int(request.args.get('limit', 0)), 0)
+        except ValueError:
+            return jsonify({'error': 'Invalid after or limit'}), 400
+
+        return current_app.response_class(
+            stream_with_context(stream_events(conditions, params, window_start, window_end, mode, after, limit)),
+            mimetype='application/x-ndjson' if mode == 'ndjson' else 'application/json'
+        )
 
     with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute(query, params)
-        data = c.fetchall()
+        # One read transaction so the validator and the rows share a snapshot
+        conn.execute("BEGIN")
 
-    habits = []
-    for row in data:
-        (habit_id, habit_date, habit_text, start_time, end_time, description,
-         category, priority, color, recurrence, reminder) = row
-        
-        event = {
-            'id': habit_id,
-            'title': habit_text,
-            'allDay': not (start_time and end_time),
-            'start': f"{habit_date}T{start_time}" if start_time else habit_date,
-            'end': f"{habit_date}T{end_time}" if end_time else None,
-            'backgroundColor': color or ('#1e40af' if start_time and end_time else '#3b82f6'),
-            'borderColor': color or ('#1e3a8a' if start_time and end_time else '#2563eb'),
-            'textColor': 'white',
-            'description': description,
-            'category': category,
-            'priority': priority,
-            'recurrence': recurrence,
-            'reminder': reminder,
-            'extendedProps': {
-                'category': category,
-                'priority': priority
-            }
-        }
-        habits.append(event)
-
-    return jsonify(habits)
+        # Validators come from the per-month change counters alone; an
+        # unchanged range is answered without reading any habit rows
+        token, last_modified = range_version(conn, window_start, window_end)
+        cursor = current_cursor(conn)
+        etag = make_etag(
+            token, window_start, window_end,
+            filters['category'], filters['priority'], filters['search']
+        )
+        if request.if_none_match.contains(etag) or (
+            not request.if_none_match and last_modified and request.if_modified_since
+            and last_modified.replace(microsecond=0) <= request.if_modified_since
+        ):
+            response = not_modified(etag, last_modified)
+            response.headers['X-Change-Cursor'] = str(cursor)
+            return response
+
+        cache_key = habits_cache.make_key(
+            window_start, window_end,
+            filters['category'], filters['priority'], filters['search']
+        )
+        body = habits_cache.get(cache_key, token)
+        if body is None:
+            in_horizon = covers(get_horizon(conn), window_start, window_end)
+            if in_horizon:
+                pairs = load_materialized_window(conn, conditions, params, window_start, window_end)
+            else:
+                pairs = expand_window(conn, conditions, params, window_start, window_end)
+            body = EventSerializer().encode(pairs)
+            habits_cache.put(cache_key, token, body, in_horizon)
+
+    response = json_response(body)
+    set_validators(response, etag, last_modified)
+    # Starting point for /habits/changes; taken from the same snapshot as the rows
+    response.headers['X-Change-Cursor'] = str(cursor)
+    return response
+
+@main_bp.route('/habits/changes', methods=['GET'])
+def get_habit_changes():
+    """Events changed since a journal cursor, for the window the client shows"""
+    try:
+        since = int(request.args.get('since', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    filters = {
+        'category': request.args.get('category'),
+        'priority': request.args.get('priority'),
+        'search': request.args.get('search')
+    }
+    window_start = (request.args.get('start') or '')[:10] or None
+    window_end = (request.args.get('end') or '')[:10] or None
+    if not window_start or not window_end:
+        return jsonify({'error': 'Missing start or end'}), 400
 
-@main_bp.route('/chat', methods=['POST'])
-def chat():
-    """Enhanced chatbot with Gemini AI and context awareness"""
-    data = request.get_json()
-    message = data.get('message', '').lower()
-    
     with get_db_connection() as conn:
-        c = conn.cursor()
-        today = datetime.now().date()
+        conn.execute("BEGIN")
+
+        # Tombstones below the floor were compacted away; the client has to
+        # reload the window instead of applying deltas
+        if since < journal_floor(conn):
+            return jsonify({'reset': True, 'cursor': current_cursor(conn), 'changes': [], 'more': False})
+
+        changed, cursor, more = changes_since(conn, since)
+        upserted = [habit_id for habit_id, op in changed if op == 'upsert']
+
+        events = {habit_id: [] for habit_id in upserted}
+        if upserted:
+            conditions, params = habit_filter_conditions(filters)
+            conditions += f" AND h.id IN ({','.join('?' * len(upserted))})"
+            params += upserted
+
+            if covers(get_horizon(conn), window_start, window_end):
+                pairs = load_materialized_window(conn, conditions, params, window_start, window_end)
+            else:
+                pairs = expand_window(conn, conditions, params, window_start, window_end)
+            serializer = EventSerializer()
+            for row, occurrence in pairs:
+                events[row[0]].append(serializer.event(row, occurrence))
+
+    # Upserts carry the habit's full set of events in the window (possibly
+    # none, if it moved out of it or no longer matches the filters)
+    changes = [
+        {'id': habit_id, 'op': op, 'events': events.get(habit_id, [])}
+        for habit_id, op in changed
+    ]
+    return json_response({'reset': False, 'cursor': cursor, 'changes': changes, 'more': more})
+
+def sse_response(events):
+    """Server-Sent Events response that proxies pass through unbuffered"""
+    response = current_app.response_class(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@main_bp.route('/events/stream')
+def event_stream():
+    """Server-Sent Events feed of committed calendar changes"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = broker.subscribe(last_event_id)
+    return sse_response(broker.stream(subscription))
+
+@main_bp.route('/freebusy', methods=['GET'])
+def get_freebusy():
+    """Busy blocks and free slots of at least `duration` minutes within working hours"""
+    try:
+        window_start = (request.args.get('start') or '')[:10] or date.today().isoformat()
+        window_end = (request.args.get('end') or '')[:10] or (
+            date.fromisoformat(window_start) + timedelta(days=7)
+        ).isoformat()
+        days = (date.fromisoformat(window_end) - date.fromisoformat(window_start)).days
+        duration = int(request.args.get('duration', 30))
+        working_hours = (
+            request.args.get('day_start', freebusy.WORKING_HOURS[0]),
+            request.args.get('day_end', freebusy.WORKING_HOURS[1]),
+        )
+        for value in working_hours:
+            datetime.strptime(value, '%H:%M')
+    except ValueError:
+        return jsonify({'error': 'Invalid start, end, duration or working hours'}), 400
+    if not 0 < days <= freebusy.MAX_FREEBUSY_DAYS or duration <= 0:
+        return jsonify({'error': f"Window must be 1-{freebusy.MAX_FREEBUSY_DAYS} days and duration positive"}), 400
+
+    # Slots in the past are useless for scheduling unless asked for
+    not_before = None if request.args.get('include_past') == '1' else datetime.now()
+
+    with get_db_connection() as conn:
+        busy = freebusy.busy_by_day(conn, window_start, window_end)
+        free = freebusy.find_free_slots(
+            conn, window_start, window_end, duration, working_hours, not_before, busy=busy
+        )
+
+    def span(day, start, end):
+        ends = datetime.fromisoformat(day) + timedelta(minutes=end)
+        return {'start': f"{day}T{format_minutes(start)}", 'end': ends.strftime('%Y-%m-%dT%H:%M')}
+
+    return json_response({
+        'start': window_start,
+        'end': window_end,
+        'duration': duration,
+        'workingHours': {'start': working_hours[0], 'end': working_hours[1]},
+        'busy': [span(day, start, end) for day in sorted(busy) for start, end in busy[day]],
+        'free': [span(day, start, end) for day, start, end in free],
+    })
+
+@main_bp.route('/analytics', methods=['GET'])
+def get_analytics():
+    """Completion counters per day, habit and category, and the current streaks"""
+    today = date.today()
+    try:
+        window_end = (request.args.get('end') or '')[:10] or (today + timedelta(days=1)).isoformat()
+        window_start = (request.args.get('start') or '')[:10] or (
+            date.fromisoformat(window_end) - timedelta(days=30)
+        ).isoformat()
+        days = (date.fromisoformat(window_end) - date.fromisoformat(window_start)).days
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({'error': 'Invalid start, end or limit'}), 400
+    if not 0 < days <= analytics.MAX_ANALYTICS_DAYS:
+        return jsonify({'error': f"Window must be 1-{analytics.MAX_ANALYTICS_DAYS} days"}), 400
+
+    with get_db_connection() as conn:
+        daily = rollups.daily_rollups(conn, window_start, window_end)
+        current, longest = rollups.overall_streak(conn, today)
+        categories = rollups.category_rollups(conn)
+        habits = rollups.habit_rollups(conn, today, limit)
+
+    scheduled = sum(row[1] for row in daily)
+    completed = sum(row[2] for row in daily)
+    return jsonify({
+        'start': window_start,
+        'end': window_end,
+        'scheduled': scheduled,
+        'completed': completed,
+        'completionRate': round(completed / scheduled * 100, 1) if scheduled else None,
+        'streak': {'current': current, 'longest': longest},
+        'days': [
+            {'date': day, 'scheduled': day_scheduled, 'completed': day_completed}
+            for day, day_scheduled, day_completed in daily
+        ],
+        'categories': categories,
+        'habits': habits,
+    })
+
+def cached_analytics(kind, window_start, window_end, build, *filters):
+    """Serve an analytics body from the cache while its version token holds"""
+    with get_db_connection() as conn:
+        token = analytics.cache_token(conn, window_start, window_end)
+        etag = make_etag(token, kind, window_start, window_end, *filters)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag, None)
+
+        key = (window_start, window_end, kind, *filters)
+        body = analytics.analytics_cache.get(key, token)
+        if body is None:
+            body = dumps(build(conn))
+            analytics.analytics_cache.put(key, token, body, True)
 
-        # Get user's habits for context
-        c.execute("""
-            SELECT habit FROM habits 
-            WHERE date >= date('now', '-7 days')
-            GROUP BY habit
-        """)
-        user_habits = [row[0] for row in c.fetchall()]
+    return set_validators(json_response(body), etag, None)
 
-        # Get progress data
+@main_bp.route('/analytics/heatmap', methods=['GET'])
+def get_heatmap():
+    """Completions per day over a window (a year by default), with heatmap levels"""
+    try:
+        window_end = (request.args.get('end') or '')[:10] or (date.today() + timedelta(days=1)).isoformat()
+        window_start = (request.args.get('start') or '')[:10] or (
+            date.fromisoformat(window_end) - timedelta(days=analytics.HEATMAP_DAYS)
+        ).isoformat()
+        days = (date.fromisoformat(window_end) - date.fromisoformat(window_start)).days
+        habit_id = request.args.get('habit_id')
+        habit_id = int(habit_id) if habit_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid start, end or habit_id'}), 400
+    if not 0 < days <= analytics.MAX_ANALYTICS_DAYS:
+        return jsonify({'error': f"Window must be 1-{analytics.MAX_ANALYTICS_DAYS} days"}), 400
+    category = request.args.get('category') or None
+
+    return cached_analytics(
+        'heatmap', window_start, window_end,
+        lambda conn: analytics.heatmap(conn, window_start, window_end, category, habit_id),
+        category, habit_id
+    )
+
+@main_bp.route('/analytics/trends', methods=['GET'])
+def get_trends():
+    """Weekly completion counts and rates per category, with a rolling average"""
+    today = date.today()
+    try:
+        # Weeks run Monday to Sunday; the default window ends with this one
+        this_week = today - timedelta(days=today.weekday())
+        window_end = (request.args.get('end') or '')[:10] or (this_week + timedelta(weeks=1)).isoformat()
+        start = (request.args.get('start') or '')[:10]
+        start = date.fromisoformat(start) if start else (
+            date.fromisoformat(window_end) - timedelta(weeks=analytics.TREND_WEEKS)
+        )
+        window_start = (start - timedelta(days=start.weekday())).isoformat()
+        days = (date.fromisoformat(window_end) - date.fromisoformat(window_start)).days
+    except ValueError:
+        return jsonify({'error': 'Invalid start or end'}), 400
+    if not 0 < days <= analytics.MAX_ANALYTICS_DAYS:
+        return jsonify({'error': f"Window must be 1-{analytics.MAX_ANALYTICS_DAYS} days"}), 400
+    category = request.args.get('category') or None
+
+    return cached_analytics(
+        'trends', window_start, window_end,
+        lambda conn: analytics.trends(conn, window_start, window_end, category),
+        category
+    )
+
+@main_bp.route('/schedule/auto', methods=['POST'])
+def auto_schedule():
+    """Place unscheduled tasks into free time and save them in one transaction"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object with a tasks list'}), 400
+
+    try:
+        window_start = (payload.get('start') or '')[:10] or date.today().isoformat()
+        window_end = (payload.get('end') or '')[:10] or (
+            date.fromisoformat(window_start) + timedelta(days=7)
+        ).isoformat()
+        days = (date.fromisoformat(window_end) - date.fromisoformat(window_start)).days
+        working_hours = (
+            payload.get('day_start', freebusy.WORKING_HOURS[0]),
+            payload.get('day_end', freebusy.WORKING_HOURS[1]),
+        )
+        for value in working_hours:
+            datetime.strptime(value, '%H:%M')
+        time_limit = min(float(payload.get('time_limit', scheduler.LOCAL_SEARCH_SECONDS)), 10.0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid start, end, working hours or time limit'}), 400
+    if not 0 < days <= freebusy.MAX_FREEBUSY_DAYS:
+        return jsonify({'error': f"Window must be 1-{freebusy.MAX_FREEBUSY_DAYS} days"}), 400
+
+    tasks, errors = scheduler.parse_tasks(payload.get('tasks'), window_start)
+    if errors:
+        return jsonify({'error': 'Invalid tasks', 'errors': errors}), 400
+
+    with get_db_connection() as conn:
         try:
-            c.execute("SELECT completed FROM habits LIMIT 1")
-        except sqlite3.OperationalError:
-            # Add completed column if it doesn't exist
-            c.execute("ALTER TABLE habits ADD COLUMN completed INTEGER DEFAULT 0")
+            placements, unscheduled, stats = scheduler.plan(
+                conn, tasks, window_start, window_end, working_hours, time_limit
+            )
+            if payload.get('dry_run') or not placements:
+                return json_response({'placements': placements, 'unscheduled': unscheduled, 'stats': stats})
+
+            # Planned without the write lock; recheck the slots under it
+            conn.execute("BEGIN IMMEDIATE")
+            ids = scheduler.write_schedule(conn, tasks, placements)
+            if ids is None:
+                conn.rollback()
+                return jsonify({'error': 'The calendar changed while scheduling; please retry'}), 409
             conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return str(e), 500
 
-        c.execute("""
-            SELECT COUNT(*) as total,
-                   SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END) as completed
-            FROM habits 
-            WHERE date >= date('now', '-7 days')
-        """)
-        total, completed = c.fetchone()
-        
-    # Format progress info
-    progress = None
-    if total > 0:
-        completion_rate = (completed / total * 100) if completed else 0
-        progress = f"Completed {completed}/{total} habits ({completion_rate:.1f}% success rate) in the past week"
+    for placement, habit_id in zip(placements, ids):
+        placement['id'] = habit_id
+    return json_response({'placements': placements, 'unscheduled': unscheduled, 'stats': stats})
+
+@main_bp.route('/habits/search', methods=['GET'])
+def search_habits_route():
+    """Ranked full-text search over habit titles and descriptions"""
+    term = request.args.get('q', '').strip()
+    if not term:
+        return jsonify({'error': 'No search term provided'}), 400
+
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    with get_db_connection() as conn:
+        results = search_habits(conn, term, limit)
+    return jsonify(results)
+
+def fallback_reply(message):
+    """Canned answer used when the Gemini service isn't initialized"""
+    if "hello" in message or "hi" in message:
+        return "Hello! I'm running in fallback mode right now, but I can still help with basic tasks! 👋"
+    elif "schedule" in message or "calendar" in message:
+        return "I can help you manage your schedule, but some features might be limited at the moment. What would you like to do? 📅"
+    else:
+        return "I'm currently operating in fallback mode with limited capabilities. I can still help with scheduling and basic tasks! 🤖"
+
+def submit_chat(work, *args):
+    """(job, None) for a queued chat job, or (None, error response) if refused"""
+    try:
+        return chat_jobs.submit(request.remote_addr, work, *args), None
+    except ClientLimit:
+        return None, (jsonify({'error': 'Please wait for your previous messages to be answered'}), 429)
+    except QueueFull:
+        response = jsonify({'error': 'The assistant is busy, please try again shortly'})
+        response.headers['Retry-After'] = '5'
+        return None, (response, 503)
+
+@main_bp.route('/chat', methods=['POST'])
+def chat():
+    """Enhanced chatbot with Gemini AI and context awareness"""
+    data = request.get_json()
+    message = data.get('message', '').lower()
 
     # Get AI response with context
     if gemini_service is None:
         # Use fallback responses if service isn't initialized
-        if "hello" in message or "hi" in message:
-            response = "Hello! I'm running in fallback mode right now, but I can still help with basic tasks! 👋"
-        elif "schedule" in message or "calendar" in message:
-            response = "I can help you manage your schedule, but some features might be limited at the moment. What would you like to do? 📅"
-        else:
-            response = "I'm currently operating in fallback mode with limited capabilities. I can still help with scheduling and basic tasks! 🤖"
-        return jsonify({'response': response})
-        
+        return jsonify({'response': fallback_reply(message)})
+
+    # The Gemini round trip runs on the chat pool; the client polls or
+    # streams the job instead of holding this worker for seconds. The
+    # service takes the schedule, habits and progress from the cached
+    # prompt context, so this request does no database work.
+    job, refused = submit_chat(answer_chat, message)
+    if refused:
+        return refused
+
+    return jsonify({
+        'job': job.id,
+        'state': job.state,
+        'poll': url_for('main.chat_job', job_id=job.id),
+        'stream': url_for('main.chat_job_stream', job_id=job.id),
+    }), 202
+
+@main_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Chat answer streamed as Server-Sent Events while Gemini generates it
+
+    Sends a status event, a token event per piece of text and a final
+    result event with the whole response, like /chat/jobs/<id>/stream.
+    """
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '').lower()
+
+    job, refused = submit_chat(stream_chat, message)
+    if refused:
+        return refused
+
+    response = sse_response(chat_jobs.stream(job))
+    response.headers['X-Chat-Job'] = job.id
+    return response
+
+# Still an answer when the chat itself fails, to maintain user experience
+CHAT_ERROR_REPLY = "I'm having some trouble with my advanced features, but I'm still here to help with basic tasks! How can I assist you? 🤖"
+
+def answer_chat(message):
+    """Run one chat message through Gemini; used as a chat job"""
     try:
-        response = gemini_service.get_response(
-            message=message,
-            user_habits=user_habits,
-            progress=progress
-        )
-        return jsonify({'response': response})
+        response = gemini_service.get_response(message=message)
+        return {'response': response}
     except Exception as e:
         print(f"Error in chat: {str(e)}")
         with open('gemini_errors.log', 'a') as f:
             f.write(f"[{datetime.now()}] Chat Error: {str(e)}\n")
-        return jsonify({
-            'response': "I'm having some trouble with my advanced features, but I'm still here to help with basic tasks! How can I assist you? 🤖"
-        }), 200  # Return 200 to maintain user experience
+        return {'response': CHAT_ERROR_REPLY}
+
+def stream_chat(message):
+    """Yield a chat answer piece by piece; used as a streamed chat job"""
+    if gemini_service is None:
+        yield fallback_reply(message)
+        return
+    try:
+        yield from gemini_service.stream_response(message=message)
+    except Exception as e:
+        print(f"Error in chat stream: {str(e)}")
+        with open('gemini_errors.log', 'a') as f:
+            f.write(f"[{datetime.now()}] Chat Error: {str(e)}\n")
+        yield CHAT_ERROR_REPLY
+
+@main_bp.route('/chat/jobs/<job_id>', methods=['GET'])
+def chat_job(job_id):
+    """State of a chat job, with its response once done"""
+    job = chat_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@main_bp.route('/chat/jobs/<job_id>/stream')
+def chat_job_stream(job_id):
+    """Server-Sent Events for a chat job: a status event, then the result"""
+    job = chat_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return sse_response(chat_jobs.stream(job))
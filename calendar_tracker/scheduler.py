@@ -0,0 +1,381 @@
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from freebusy import WORKING_HOURS, find_free_slots
+from intervals import DAY_MINUTES, format_minutes, interval_index, to_minutes
+from batch import apply_operations, validate_operations
+
+# Upper bound on tasks accepted by one /schedule/auto request
+MAX_AUTO_TASKS = 2000
+
+# Start times are aligned to this grid, like FullCalendar's default slotDuration
+SLOT_MINUTES = 15
+
+# Time-of-day windows a task may prefer (minutes since midnight)
+PREFERRED_TIMES = {
+    'morning': (6 * 60, 12 * 60),
+    'afternoon': (12 * 60, 17 * 60),
+    'evening': (17 * 60, 22 * 60),
+}
+
+# habits.priority (1 low .. 3 high) to how strongly a task wants an early slot
+PRIORITY_WEIGHTS = {1: 1, 2: 2, 3: 4}
+
+# Cost of starting a weight-1 task one day later, and of each hour it runs
+# outside its preferred time of day
+EARLINESS_PER_DAY = 4.0
+PREFERENCE_PER_HOUR = 3.0
+
+# Extra cost (times weight) of leaving a task unscheduled, on top of the
+# worst possible placement, so placing a task always beats dropping it
+UNSCHEDULED_PENALTY = 100.0
+
+# Time budget for local search after the greedy pass
+LOCAL_SEARCH_SECONDS = 2.0
+
+# Lower-priority placements tried per unscheduled task when making room
+EJECT_CANDIDATES = 20
+
+NEVER = float('inf')
+
+Task = namedtuple('Task', 'title duration priority weight deadline preferred category description color')
+
+def parse_tasks(items, window_start):
+    """Validate task dicts; returns (tasks, errors) like batch.validate_operations
+
+    Deadlines and times are turned into minutes since window_start 00:00.
+    """
+    if not isinstance(items, list) or not items:
+        return [], [{'index': None, 'error': "Expected a non-empty list of tasks"}]
+    if len(items) > MAX_AUTO_TASKS:
+        return [], [{'index': None, 'error': f"At most {MAX_AUTO_TASKS} tasks per request"}]
+
+    base = datetime.fromisoformat(window_start)
+    tasks = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not str(item.get('title') or '').strip():
+            errors.append({'index': index, 'error': "Missing title"})
+            continue
+        try:
+            duration = int(item.get('duration', 30))
+            priority = int(item.get('priority') or 1)
+        except (TypeError, ValueError):
+            errors.append({'index': index, 'error': "Invalid duration or priority"})
+            continue
+        if not 0 < duration <= DAY_MINUTES or priority not in PRIORITY_WEIGHTS:
+            errors.append({'index': index, 'error': "Duration must be 1-1440 minutes and priority 1-3"})
+            continue
+
+        deadline = NEVER
+        if item.get('deadline'):
+            try:
+                value = str(item['deadline'])
+                due = datetime.fromisoformat(value)
+                if len(value) == 10:
+                    # A bare date means "by the end of that day"
+                    due += timedelta(days=1)
+                deadline = int((due - base).total_seconds() // 60)
+            except ValueError:
+                errors.append({'index': index, 'error': "Invalid deadline"})
+                continue
+
+        preferred = item.get('preferred') or None
+        if preferred is not None and preferred not in PREFERRED_TIMES:
+            errors.append({'index': index, 'error': f"Preferred time must be one of {', '.join(PREFERRED_TIMES)}"})
+            continue
+
+        tasks.append(Task(
+            str(item['title']).strip(), duration, priority, PRIORITY_WEIGHTS[priority], deadline,
+            PREFERRED_TIMES[preferred] if preferred else None,
+            item.get('category') or 'default', item.get('description'), item.get('color')
+        ))
+    return tasks, errors
+
+def placement_cost(task, start):
+    """Cost of starting a task `start` minutes after the window opens"""
+    cost = task.weight * EARLINESS_PER_DAY * start / DAY_MINUTES
+    if task.preferred:
+        opens, closes = task.preferred
+        minute = start % DAY_MINUTES
+        outside = max(0, opens - minute) + max(0, minute + task.duration - closes)
+        cost += PREFERENCE_PER_HOUR * outside / 60
+    return cost
+
+class Schedule:
+    """Free gaps of the calendar plus the current start of every placed task.
+
+    Gaps are disjoint [start, end] minute ranges kept sorted by start, so
+    the search for a slot can stop as soon as a gap starts too late to beat
+    the best candidate found so far.
+    """
+
+    def __init__(self, tasks, gaps, horizon):
+        self.tasks = tasks
+        self.gaps = sorted([start, end] for start, end in gaps if end > start)
+        self.starts = [None] * len(tasks)
+        self.unscheduled_cost = [
+            task.weight * (EARLINESS_PER_DAY * (horizon / DAY_MINUTES + 1) + UNSCHEDULED_PENALTY)
+            for task in tasks
+        ]
+
+    def cost(self, index, start=None):
+        start = self.starts[index] if start is None else start
+        if start is None:
+            return self.unscheduled_cost[index]
+        return placement_cost(self.tasks[index], start)
+
+    def total_cost(self):
+        return sum(self.cost(index) for index in range(len(self.tasks)))
+
+    def best_start(self, index):
+        """(cost, start) of the cheapest free slot for a task, or (None, None)"""
+        task = self.tasks[index]
+        best_cost, best = None, None
+        for gap_start, gap_end in self.gaps:
+            lowest = -(-gap_start // SLOT_MINUTES) * SLOT_MINUTES
+            if lowest + task.duration > task.deadline:
+                break
+            # Earliness only grows, so later gaps cannot beat the best so far
+            if best_cost is not None and task.weight * EARLINESS_PER_DAY * lowest / DAY_MINUTES >= best_cost:
+                break
+            highest = min(gap_end, task.deadline) - task.duration
+            highest -= highest % SLOT_MINUTES
+            if lowest > highest:
+                continue
+
+            candidates = [lowest]
+            if task.preferred:
+                # The cost is lowest at the gap start or where the preferred window opens
+                opens = lowest - lowest % DAY_MINUTES + task.preferred[0]
+                opens = -(-opens // SLOT_MINUTES) * SLOT_MINUTES
+                if lowest < opens <= highest:
+                    candidates.append(opens)
+            for start in candidates:
+                cost = placement_cost(task, start)
+                if best_cost is None or cost < best_cost:
+                    best_cost, best = cost, start
+        return best_cost, best
+
+    def occupy(self, index, start):
+        """Place a task, carving its minutes out of the gap that holds them"""
+        end = start + self.tasks[index].duration
+        i = bisect_right(self.gaps, [start, NEVER]) - 1
+        gap_start, gap_end = self.gaps[i]
+        pieces = [piece for piece in ([gap_start, start], [end, gap_end]) if piece[1] > piece[0]]
+        self.gaps[i:i + 1] = pieces
+        self.starts[index] = start
+
+    def release(self, index):
+        """Unplace a task, merging its minutes back into the neighbouring gaps"""
+        start = self.starts[index]
+        end = start + self.tasks[index].duration
+        i = bisect_left(self.gaps, [start, start])
+        merged = [start, end]
+        if i > 0 and self.gaps[i - 1][1] == start:
+            i -= 1
+            merged[0] = self.gaps[i][0]
+            del self.gaps[i]
+        if i < len(self.gaps) and self.gaps[i][0] == end:
+            merged[1] = self.gaps[i][1]
+            del self.gaps[i]
+        self.gaps.insert(i, merged)
+        self.starts[index] = None
+        return start
+
+    def place(self, index):
+        """Put a task in its cheapest slot; returns False if none fits"""
+        _, start = self.best_start(index)
+        if start is None:
+            return False
+        self.occupy(index, start)
+        return True
+
+def greedy(schedule):
+    """Place tasks one by one, most important and most urgent first"""
+    order = sorted(
+        range(len(schedule.tasks)),
+        key=lambda i: (-schedule.tasks[i].weight, schedule.tasks[i].deadline, -schedule.tasks[i].duration)
+    )
+    for index in order:
+        schedule.place(index)
+
+def relocate(schedule, out_of_time):
+    """Move each placed task to its cheapest slot given everything else"""
+    improved = False
+    placed = [i for i, start in enumerate(schedule.starts) if start is not None]
+    placed.sort(key=schedule.cost, reverse=True)
+    for index in placed:
+        if out_of_time():
+            break
+        before = schedule.cost(index)
+        original = schedule.release(index)
+        cost, start = schedule.best_start(index)
+        if cost is not None and cost < before - 1e-9:
+            schedule.occupy(index, start)
+            improved = True
+        else:
+            schedule.occupy(index, original)
+    return improved
+
+def swap(schedule, out_of_time):
+    """Exchange the slots of equally long tasks when that lowers the cost"""
+    improved = False
+    by_duration = {}
+    for index, start in enumerate(schedule.starts):
+        if start is not None:
+            by_duration.setdefault(schedule.tasks[index].duration, []).append(index)
+    for group in by_duration.values():
+        for i, a in enumerate(group):
+            if out_of_time():
+                return improved
+            for b in group[i + 1:]:
+                sa, sb = schedule.starts[a], schedule.starts[b]
+                duration = schedule.tasks[a].duration
+                if sb + duration > schedule.tasks[a].deadline or sa + duration > schedule.tasks[b].deadline:
+                    continue
+                delta = (schedule.cost(a, sb) + schedule.cost(b, sa)
+                         - schedule.cost(a, sa) - schedule.cost(b, sb))
+                if delta < -1e-9:
+                    schedule.starts[a], schedule.starts[b] = sb, sa
+                    improved = True
+    return improved
+
+def make_room(schedule, out_of_time):
+    """Place unscheduled tasks, displacing less important ones where needed"""
+    improved = False
+    for index in range(len(schedule.tasks)):
+        if schedule.starts[index] is not None or out_of_time():
+            continue
+        if schedule.place(index):
+            improved = True
+            continue
+
+        weight = schedule.tasks[index].weight
+        victims = [
+            i for i, start in enumerate(schedule.starts)
+            if start is not None and schedule.tasks[i].weight < weight
+            and start < schedule.tasks[index].deadline
+        ]
+        victims.sort(key=lambda i: (schedule.tasks[i].weight, -schedule.tasks[i].duration))
+        for victim in victims[:EJECT_CANDIDATES]:
+            before = schedule.cost(index) + schedule.cost(victim)
+            original = schedule.release(victim)
+            if not schedule.place(index):
+                schedule.occupy(victim, original)
+                continue
+            schedule.place(victim)
+            if schedule.cost(index) + schedule.cost(victim) < before - 1e-9:
+                improved = True
+                break
+            # Not worth it; put both back
+            if schedule.starts[victim] is not None:
+                schedule.release(victim)
+            schedule.release(index)
+            schedule.occupy(victim, original)
+    return improved
+
+def solve(tasks, gaps, horizon, time_limit=LOCAL_SEARCH_SECONDS):
+    """Assign start minutes to tasks within free gaps; returns (schedule, stats)
+
+    A greedy pass places tasks in priority and deadline order, then local
+    search (relocation, equal-length swaps and displacing lower-priority
+    tasks) runs until nothing improves or the time budget is spent.
+    """
+    started = time.perf_counter()
+    schedule = Schedule(tasks, gaps, horizon)
+    greedy(schedule)
+    greedy_cost = schedule.total_cost()
+
+    stop_at = time.perf_counter() + time_limit
+    out_of_time = lambda: time.perf_counter() > stop_at
+    passes = 0
+    while not out_of_time():
+        passes += 1
+        improved = make_room(schedule, out_of_time)
+        improved = relocate(schedule, out_of_time) or improved
+        improved = swap(schedule, out_of_time) or improved
+        if not improved:
+            break
+
+    placed = [i for i, start in enumerate(schedule.starts) if start is not None]
+    preferred = [i for i in placed if tasks[i].preferred]
+    stats = {
+        'tasks': len(tasks),
+        'placed': len(placed),
+        'unscheduled': len(tasks) - len(placed),
+        'greedy_cost': round(greedy_cost, 2),
+        'cost': round(schedule.total_cost(), 2),
+        'preference_hits': sum(
+            1 for i in preferred
+            if tasks[i].preferred[0] <= schedule.starts[i] % DAY_MINUTES
+            and schedule.starts[i] % DAY_MINUTES + tasks[i].duration <= tasks[i].preferred[1]
+        ),
+        'preferred': len(preferred),
+        'passes': passes,
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    return schedule, stats
+
+def free_gaps(conn, window_start, window_end, min_duration, working_hours=WORKING_HOURS, now=None):
+    """Free time as (start, end) minutes since window_start 00:00"""
+    base = date.fromisoformat(window_start)
+    slots = find_free_slots(
+        conn, window_start, window_end, min_duration, working_hours, not_before=now or datetime.now()
+    )
+    gaps = []
+    for day, start, end in slots:
+        offset = (date.fromisoformat(day) - base).days * DAY_MINUTES
+        gaps.append((offset + start, offset + end))
+    return gaps
+
+def plan(conn, tasks, window_start, window_end, working_hours=WORKING_HOURS, time_limit=LOCAL_SEARCH_SECONDS):
+    """Solve against the calendar's free time; returns (placements, unscheduled, stats)"""
+    horizon = (date.fromisoformat(window_end) - date.fromisoformat(window_start)).days * DAY_MINUTES
+    gaps = free_gaps(conn, window_start, window_end, min(task.duration for task in tasks), working_hours)
+    schedule, stats = solve(tasks, gaps, horizon, time_limit)
+
+    base = date.fromisoformat(window_start)
+    placements = []
+    unscheduled = []
+    for index, (task, start) in enumerate(zip(tasks, schedule.starts)):
+        if start is None:
+            unscheduled.append({'index': index, 'title': task.title, 'reason': "No free slot before the deadline"})
+            continue
+        day = (base + timedelta(days=start // DAY_MINUTES)).isoformat()
+        placements.append({
+            'index': index,
+            'title': task.title,
+            'date': day,
+            'start_time': format_minutes(start % DAY_MINUTES),
+            'end_time': format_minutes(start % DAY_MINUTES + task.duration),
+            'priority': task.priority,
+            'category': task.category,
+        })
+    placements.sort(key=lambda p: (p['date'], p['start_time']))
+    return placements, unscheduled, stats
+
+def write_schedule(conn, tasks, placements):
+    """Create habits for the placements inside the caller's transaction
+
+    Returns the new habit ids, or None if the calendar changed since the
+    plan was made and one of the slots is no longer free.
+    """
+    slots = [(p['date'], to_minutes(p['start_time']), to_minutes(p['end_time'])) for p in placements]
+    if interval_index.conflicts(conn, slots):
+        return None
+
+    operations = []
+    for p in placements:
+        task = tasks[p['index']]
+        operations.append({
+            'op': 'create', 'habit': task.title, 'date': p['date'],
+            'start_time': p['start_time'], 'end_time': p['end_time'],
+            'description': task.description, 'category': task.category,
+            'priority': task.priority, 'color': task.color,
+        })
+    normalized, errors = validate_operations(conn, operations)
+    if errors:
+        raise ValueError(errors[0]['error'])
+    return [result['id'] for result in apply_operations(conn, normalized)]
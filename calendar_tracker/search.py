@@ -0,0 +1,94 @@
+import re
+
+# Weight title matches well above description matches when ranking
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+SEARCH_HABITS = f"""
+    SELECT h.id, h.date, h.habit, h.start_time, h.end_time, h.category,
+           snippet(habits_fts, -1, '<mark>', '</mark>', '…', 12),
+           bm25(habits_fts, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) AS score
+    FROM habits_fts
+    JOIN habits h ON h.id = habits_fts.rowid
+    WHERE habits_fts MATCH ?
+    ORDER BY score
+    LIMIT ?
+"""
+
+def create_search_index(c):
+    """Create the FTS5 index over habit titles/descriptions and its sync triggers"""
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'habits_fts'")
+    exists = c.fetchone() is not None
+
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS habits_fts USING fts5(
+            habit,
+            description,
+            content='habits',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+
+    # External-content table: the triggers mirror every change to habits
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS habits_fts_insert AFTER INSERT ON habits BEGIN
+            INSERT INTO habits_fts (rowid, habit, description)
+            VALUES (new.id, new.habit, new.description);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS habits_fts_delete AFTER DELETE ON habits BEGIN
+            INSERT INTO habits_fts (habits_fts, rowid, habit, description)
+            VALUES ('delete', old.id, old.habit, old.description);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS habits_fts_update
+        AFTER UPDATE OF habit, description ON habits BEGIN
+            INSERT INTO habits_fts (habits_fts, rowid, habit, description)
+            VALUES ('delete', old.id, old.habit, old.description);
+            INSERT INTO habits_fts (rowid, habit, description)
+            VALUES (new.id, new.habit, new.description);
+        END
+    ''')
+
+    if not exists:
+        # Index the rows that were there before the search table existed
+        c.execute("INSERT INTO habits_fts (habits_fts) VALUES ('rebuild')")
+
+def build_match_query(term, title_only=False):
+    """Turn free text into an FTS5 query where every word is a prefix match"""
+    tokens = TOKEN_PATTERN.findall(term or '')
+    if not tokens:
+        return None
+    query = ' '.join(f'"{token}"*' for token in tokens)
+    if title_only:
+        query = f'{{habit}} : ({query})'
+    return query
+
+def search_habits(conn, term, limit=20, title_only=False):
+    """Ranked habit search with highlighted snippets"""
+    match = build_match_query(term, title_only)
+    if not match:
+        return []
+
+    c = conn.cursor()
+    c.execute(SEARCH_HABITS, (match, limit))
+
+    return [
+        {
+            'id': habit_id,
+            'date': date,
+            'title': title,
+            'start_time': start_time,
+            'end_time': end_time,
+            'category': category,
+            'snippet': snippet,
+            'score': round(-score, 6),
+        }
+        for habit_id, date, title, start_time, end_time, category, snippet, score in c.fetchall()
+    ]
@@ -0,0 +1,190 @@
+import json
+from json.encoder import encode_basestring as _quote
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Row layout shared by every query that feeds the event serializer
+HABIT_COLUMNS = (
+    'id', 'date', 'habit', 'start_time', 'end_time', 'description',
+    'category', 'priority', 'color', 'recurrence_pattern', 'reminder_time',
+    'completed', 'last_modified'
+)
+
+HABITS_SELECT = """
+    SELECT h.id, h.date, h.habit, h.start_time, h.end_time, h.description,
+           h.category, h.priority, h.color, h.recurrence_pattern, h.reminder_time,
+           h.completed, h.last_modified
+    FROM habits h
+"""
+
+# The /habits window queries. {conditions} takes the filter conditions and
+# date bounds the routes add, {keyset} the position a stream resumes after.
+OCCURRENCES_WINDOW = """
+    SELECT h.id, o.date, h.habit, o.start_time, o.end_time, h.description,
+           h.category, h.priority, h.color, h.recurrence_pattern, h.reminder_time,
+           h.completed, h.last_modified, o.occurrence_date
+    FROM habit_occurrences o
+    JOIN habits h ON h.id = o.habit_id
+    WHERE o.date >= ? AND o.date < ?{keyset}{conditions}
+    ORDER BY o.date ASC, o.start_time ASC, o.habit_id ASC
+"""
+
+OCCURRENCES_KEYSET = " AND (o.date, COALESCE(o.start_time, ''), o.habit_id) > (?, ?, ?)"
+
+SINGLE_HABITS_WINDOW = HABITS_SELECT + """
+    WHERE (h.recurrence_pattern IS NULL OR h.recurrence_pattern = ''){conditions}
+    ORDER BY h.date ASC, h.start_time ASC
+"""
+
+SERIES_HABITS_WINDOW = HABITS_SELECT + """
+    WHERE h.recurrence_pattern IS NOT NULL AND h.recurrence_pattern != ''{conditions}
+"""
+
+# (backgroundColor, borderColor) for habits without a color, keyed by "is timed"
+DEFAULT_COLORS = {
+    True: ('#1e40af', '#1e3a8a'),
+    False: ('#3b82f6', '#2563eb'),
+}
+
+class EventSerializer:
+    """Turns habit rows into FullCalendar events.
+
+    Fields that only depend on the habit are built (and, for encode(),
+    JSON-encoded) once per habit and shared by every occurrence of it;
+    only the timing fields are produced per event.
+    """
+
+    __slots__ = ('_static', '_timed_fields', '_all_day_fields')
+
+    def __init__(self):
+        self._static = {}
+        self._timed_fields = {}
+        self._all_day_fields = {}
+
+    def _habit_fields(self, row, timed):
+        key = (row[0], timed)
+        static = self._static.get(key)
+        if static is None:
+            color = row[8]
+            background, border = (color, color) if color else DEFAULT_COLORS[timed]
+            static = self._static[key] = {
+                'id': row[0],
+                'title': row[2],
+                'backgroundColor': background,
+                'borderColor': border,
+                'textColor': 'white',
+                'description': row[5],
+                'category': row[6],
+                'priority': row[7],
+                'recurrence': row[9],
+                'reminder': row[10],
+                'allDay': not timed,
+            }
+        return static
+
+    def event(self, row, occurrence=None):
+        """One event dict for a habits row, or for one occurrence of it"""
+        if occurrence:
+            occurrence_date, day, start_time, end_time = occurrence
+            props = {
+                'category': row[6],
+                'priority': row[7],
+                'recurring': True,
+                'occurrenceDate': occurrence_date,
+            }
+        else:
+            day, start_time, end_time = row[1], row[3], row[4]
+            props = {'category': row[6], 'priority': row[7]}
+
+        event = dict(self._habit_fields(row, bool(start_time and end_time)))
+        event['start'] = f"{day}T{start_time}" if start_time else day
+        event['end'] = f"{day}T{end_time}" if end_time else None
+        event['extendedProps'] = props
+        return event
+
+    def events(self, pairs):
+        """Event dicts for an iterable of (row, occurrence) pairs"""
+        event = self.event
+        return [event(row, occurrence) for row, occurrence in pairs]
+
+    def _encode_fields(self, row, timed):
+        """JSON fragment for a habit's static fields, ending inside extendedProps"""
+        color = row[8]
+        background, border = (color, color) if color else DEFAULT_COLORS[timed]
+        return (
+            f'"id":{_value(row[0])},"title":{_value(row[2])},'
+            f'"backgroundColor":{_quote(background)},"borderColor":{_quote(border)},'
+            f'"textColor":"white","description":{_value(row[5])},'
+            f'"category":{_value(row[6])},"priority":{_value(row[7])},'
+            f'"recurrence":{_value(row[9])},"reminder":{_value(row[10])},'
+            f'"allDay":{"false" if timed else "true"},'
+            f'"extendedProps":{{"category":{_value(row[6])},"priority":{_value(row[7])}'
+        )
+
+    def encode(self, pairs):
+        """JSON array of events for (row, occurrence) pairs, as UTF-8 bytes"""
+        return ('[' + ','.join(self.fragments(pairs)) + ']').encode('utf-8')
+
+    def fragments(self, pairs):
+        """One JSON object string per (row, occurrence) pair
+
+        Writes each event from a cached per-habit fragment plus its timing
+        fields instead of building a dict per event, which is what
+        dominates large views.
+        """
+        timed_fields, all_day_fields = self._timed_fields, self._all_day_fields
+        encode_fields = self._encode_fields
+        for row, occurrence in pairs:
+            if occurrence:
+                occurrence_date, day, start_time, end_time = occurrence
+            else:
+                day, start_time, end_time = row[1], row[3], row[4]
+
+            if start_time and end_time:
+                fields = timed_fields.get(row[0])
+                if fields is None:
+                    fields = timed_fields[row[0]] = encode_fields(row, True)
+            else:
+                fields = all_day_fields.get(row[0])
+                if fields is None:
+                    fields = all_day_fields[row[0]] = encode_fields(row, False)
+
+            start = _quote(f"{day}T{start_time}" if start_time else f"{day}")
+            end = _quote(f"{day}T{end_time}") if end_time else 'null'
+            if occurrence:
+                yield (f'{{"start":{start},"end":{end},{fields},'
+                       f'"recurring":true,"occurrenceDate":{_quote(occurrence_date)}}}}}')
+            else:
+                yield f'{{"start":{start},"end":{end},{fields}}}}}'
+
+def build_event(row, occurrence=None):
+    """Build a single FullCalendar event from a habits row"""
+    return EventSerializer().event(row, occurrence)
+
+def _dumps_str(payload):
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+
+def _value(value):
+    """JSON for a single column value; strings and ints skip the full encoder"""
+    if value is None:
+        return 'null'
+    if value.__class__ is str:
+        return _quote(value)
+    if value.__class__ is int:
+        return str(value)
+    return _dumps_str(value)
+
+def dumps(payload):
+    """Encode a payload as compact JSON bytes (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return _dumps_str(payload).encode('utf-8')
+
+def json_response(payload, status=200):
+    """JSON response that skips Flask's key-sorting encoder; payload may be pre-encoded bytes"""
+    body = payload if isinstance(payload, bytes) else dumps(payload)
+    return current_app.response_class(body, status=status, mimetype='application/json')
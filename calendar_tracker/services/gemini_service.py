@@ -1,13 +1,131 @@
 import os
+import hashlib
+import json
+import threading
+import time
 from datetime import datetime, timedelta
 import google.generativeai as genai
 from dotenv import load_dotenv
 import sqlite3
 from utils import get_db_connection
+from search import build_match_query
+from recurrence import is_recurring, set_exception
+from mutations import habit_changed
+from intervals import DEFAULT_DURATION_MINUTES, as_interval, end_time_after, interval_index
+from freebusy import first_free_slot
+from response_cache import ResponseCache, response_cache
+from prompt_context import prompt_context
 import re
 
 load_dotenv()
 
+MODEL_NAME = 'gemini-pro'
+
+# Initialization states; replies are fallback ones unless READY
+WARMING, READY, FAILED = 'warming', 'ready', 'failed'
+
+# Probe results are shared with later workers through a small file. A good
+# result is trusted for PROBE_TTL_SECONDS; a failed one stops other workers
+# from hammering the API and is retried after PROBE_FAILURE_TTL_SECONDS.
+# The file sits next to habits.db unless GEMINI_PROBE_CACHE says otherwise, so
+# every worker finds it whatever its working directory.
+PROBE_CACHE_PATH = os.path.abspath(
+    os.getenv('GEMINI_PROBE_CACHE')
+    or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gemini_probe.json')
+)
+PROBE_TTL_SECONDS = int(os.getenv('GEMINI_PROBE_TTL', 6 * 60 * 60))
+PROBE_FAILURE_TTL_SECONDS = int(os.getenv('GEMINI_PROBE_FAILURE_TTL', 5 * 60))
+
+# Queries behind the chat commands. The MATCH ones take a build_match_query()
+# expression restricted to habit titles.
+CHAT_HISTORY = """
+    SELECT user_message, bot_response, context
+    FROM chat_history
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+MATCH_EVENT = """
+    SELECT ce.id, ce.habit_id
+    FROM habits_fts
+    JOIN calendar_events ce ON ce.habit_id = habits_fts.rowid
+    WHERE habits_fts MATCH ?
+    ORDER BY habits_fts.rank, ce.start_datetime DESC
+    LIMIT 1
+"""
+
+MATCH_HABIT = """
+    SELECT h.id, h.recurrence_pattern, NULL
+    FROM habits_fts
+    JOIN habits h ON h.id = habits_fts.rowid
+    WHERE habits_fts MATCH ?
+    ORDER BY habits_fts.rank
+    LIMIT 1
+"""
+
+# Only a habit that occurs on the given date matches
+MATCH_OCCURRENCE = """
+    SELECT h.id, h.recurrence_pattern, o.occurrence_date
+    FROM habits_fts
+    JOIN habits h ON h.id = habits_fts.rowid
+    JOIN habit_occurrences o ON o.habit_id = h.id AND o.date = date(?)
+    WHERE habits_fts MATCH ?
+    ORDER BY habits_fts.rank
+    LIMIT 1
+"""
+
+DAY_SCHEDULE = """
+    SELECT h.habit, ce.start_datetime, ce.end_datetime, ce.all_day
+    FROM calendar_events ce
+    JOIN habits h ON h.id = ce.habit_id
+    WHERE ce.start_date = date(?)
+    ORDER BY ce.start_datetime
+"""
+
+NEXT_EVENT = """
+    SELECT title, start_datetime
+    FROM calendar_events
+    WHERE start_datetime > datetime('now')
+    ORDER BY start_datetime
+    LIMIT 1
+"""
+
+def _key_fingerprint(api_key):
+    """Identifies the key a probe was run with, without storing the key"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+def read_probe(api_key, path=PROBE_CACHE_PATH):
+    """Cached probe result for this key and model, or None if missing or expired"""
+    try:
+        with open(path) as f:
+            probe = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if probe.get('key') != _key_fingerprint(api_key) or probe.get('model') != MODEL_NAME:
+        return None
+    ttl = PROBE_TTL_SECONDS if probe.get('ok') else PROBE_FAILURE_TTL_SECONDS
+    if time.time() - probe.get('checked_at', 0) > ttl:
+        return None
+    return probe
+
+def write_probe(api_key, ok, error=None, path=PROBE_CACHE_PATH):
+    """Record a probe result for other workers; failures to write are ignored"""
+    probe = {
+        'key': _key_fingerprint(api_key),
+        'model': MODEL_NAME,
+        'ok': ok,
+        'error': error,
+        'checked_at': time.time(),
+    }
+    # Write then rename so readers never see a half-written file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump(probe, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not write Gemini probe cache: {str(e)}")
+
 class GeminiService:
     # Enhanced static responses with calendar integration
     FALLBACK_RESPONSES = {
@@ -48,7 +166,7 @@ class GeminiService:
         'list': r'(?i)(show|list|what are)\s+(my\s+)?(tasks|habits|events|schedule)(\s+for\s+(?P<date>.*))?'
     }
 
-    def __init__(self):
+    def __init__(self, warm=True):
         self.api_key = os.getenv('GEMINI_API_KEY')
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
@@ -56,66 +174,129 @@ class GeminiService:
         if not self.validate_api_key(self.api_key):
             raise ValueError("Invalid Gemini API key format")
 
+        # Until the background warm-up finishes, every reply is a fallback one
+        self.model = None
+        self.chat = None
+        self.use_fallback = True
+        self.state = WARMING
+        self.error = None
+        self.probe_source = None
+        self.warm_ms = None
+        self.failed_at = None
+        self._warm_lock = threading.Lock()
+        self._warm_thread = None
+        if warm:
+            self.warm_up()
+
+    def warm_up(self):
+        """Start initializing the model in a background thread; returns at once"""
+        with self._warm_lock:
+            if self._warm_thread and self._warm_thread.is_alive():
+                return self._warm_thread
+            self.state = WARMING
+            self._warm_thread = threading.Thread(target=self._initialize, name='gemini-warm-up', daemon=True)
+            self._warm_thread.start()
+            return self._warm_thread
+
+    def retry_if_failed(self):
+        """Warm up again once a failed initialization is old enough to retry"""
+        if self.state == FAILED and time.monotonic() - self.failed_at >= PROBE_FAILURE_TTL_SECONDS:
+            self.warm_up()
+
+    def _initialize(self):
+        """Configure the client, probe the API unless a recent probe is cached, and go live"""
+        started = time.monotonic()
         try:
-            # Configure with safety settings
             genai.configure(api_key=self.api_key)
-            
-            # List available models first
-            try:
-                models = genai.list_models()
-                available_models = [m.name for m in models]
-                print(f"Available models: {available_models}")
-                
-                if "models/gemini-pro" not in available_models:
-                    raise Exception("gemini-pro model not available")
-                    
-            except Exception as e:
-                print(f"Error listing models: {str(e)}")
-                raise Exception("Unable to access Gemini API models")
-            
-            # Initialize with safety settings
-            generation_config = {
-                "temperature": 0.9,
-                "top_p": 1,
-                "top_k": 1,
-                "max_output_tokens": 2048,
-            }
-            
-            safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            ]
-            
-            self.model = genai.GenerativeModel(
-                model_name="gemini-pro",
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
-            
-            # Test connection with retry
-            max_retries = 3
-            for attempt in range(max_retries):
+            model = self.build_model()
+
+            cached = read_probe(self.api_key)
+            if cached is None:
                 try:
-                    test_response = self.model.generate_content("Test connection")
-                    if test_response and test_response.text:
-                        print(f"API Test successful (attempt {attempt + 1}): {test_response.text[:50]}...")
-                        break
+                    self.probe(model)
                 except Exception as e:
-                    if attempt == max_retries - 1:
-                        raise e
-                    print(f"Attempt {attempt + 1} failed, retrying...")
-            
-            self.chat = self.model.start_chat(history=[])
-            self.use_fallback = False
+                    write_probe(self.api_key, False, str(e))
+                    raise
+                write_probe(self.api_key, True)
+                self.probe_source = 'live'
+            elif not cached['ok']:
+                raise RuntimeError(f"API probe failed recently: {cached.get('error')}")
+            else:
+                self.probe_source = 'cache'
+
+            self.model = model
+            self.chat = model.start_chat(history=[])
             self.load_chat_history()
-            print("Successfully initialized Gemini AI service")
+            self.error = None
+            self.warm_ms = round((time.monotonic() - started) * 1000)
+            self.use_fallback = False
+            self.state = READY
+            print(f"Successfully initialized Gemini AI service in {self.warm_ms} ms (probe: {self.probe_source})")
             
         except Exception as e:
             self.log_error("Error initializing Gemini AI", e)
+            self.error = str(e)
+            self.failed_at = time.monotonic()
             self.use_fallback = True
-            raise RuntimeError(f"Failed to initialize Gemini AI: {str(e)}")
+            self.state = FAILED
+
+    def build_model(self):
+        """GenerativeModel with the app's generation and safety settings (no network)"""
+        generation_config = {
+            "temperature": 0.9,
+            "top_p": 1,
+            "top_k": 1,
+            "max_output_tokens": 2048,
+        }
+        
+        safety_settings = [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+        ]
+        
+        return genai.GenerativeModel(
+            model_name=MODEL_NAME,
+            generation_config=generation_config,
+            safety_settings=safety_settings
+        )
+
+    def probe(self, model):
+        """Check the model is listed and answers a test prompt"""
+        # List available models first
+        try:
+            models = genai.list_models()
+            available_models = [m.name for m in models]
+            print(f"Available models: {available_models}")
+        except Exception as e:
+            print(f"Error listing models: {str(e)}")
+            raise Exception("Unable to access Gemini API models")
+        if f"models/{MODEL_NAME}" not in available_models:
+            raise Exception(f"{MODEL_NAME} model not available")
+        
+        # Test connection with retry
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                test_response = model.generate_content("Test connection")
+                if test_response and test_response.text:
+                    print(f"API Test successful (attempt {attempt + 1}): {test_response.text[:50]}...")
+                    return
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    raise e
+                print(f"Attempt {attempt + 1} failed, retrying...")
+        raise Exception("Empty response to test prompt")
+
+    def status(self):
+        """Initialization state for /stats/gemini"""
+        return {
+            'state': self.state,
+            'error': self.error,
+            'probe': self.probe_source,
+            'warm_ms': self.warm_ms,
+        }
 
     def validate_api_key(self, key):
         """Validate Gemini API key format"""
@@ -145,12 +326,7 @@ class GeminiService:
         try:
             with get_db_connection() as conn:
                 c = conn.cursor()
-                c.execute("""
-                    SELECT user_message, bot_response, context
-                    FROM chat_history
-                    ORDER BY timestamp DESC
-                    LIMIT ?
-                """, (limit,))
+                c.execute(CHAT_HISTORY, (limit,))
                 history = c.fetchall()
                 
                 # Add to Gemini chat history
@@ -172,43 +348,28 @@ class GeminiService:
             period = 'evening'
         return period, current.strftime('%I:%M %p')
 
-    def get_context(self, user_habits=None, progress=None):
+    def get_context(self, snapshot=None):
         """Build enhanced context including calendar information"""
         period, current_time = self.get_time_of_day()
-        today = datetime.now().date()
+        # Schedule, habits and progress come prebuilt from the context snapshot
+        snapshot = snapshot or prompt_context.snapshot()
 
         context = f"""
         You are an intelligent AI assistant for a calendar and habit tracking application.
         Current time: {current_time}
         Time of day: {period}
         """
+        return context + snapshot.text
 
-        # Add calendar events
-        try:
-            with get_db_connection() as conn:
-                c = conn.cursor()
-                c.execute("""
-                    SELECT title, start_datetime, end_datetime
-                    FROM calendar_events
-                    WHERE date(start_datetime) = date('now')
-                    ORDER BY start_datetime
-                """)
-                events = c.fetchall()
-                
-                if events:
-                    context += "\n\nToday's schedule:"
-                    for title, start, end in events:
-                        context += f"\n- {title}: {start} - {end}"
-
-        except Exception as e:
-            print(f"Error getting calendar context: {str(e)}")
-
-        if user_habits:
-            context += f"\n\nUser's tracked habits: {', '.join(user_habits)}"
-        if progress:
-            context += f"\nRecent progress: {progress}"
+    def response_key(self, message, snapshot, history):
+        """Response cache key for a chat message in its current context
 
-        return context
+        The prompt's clock time is left out: answers are keyed on the time
+        of day, the context snapshot's day and contents, and the chat
+        history lines the prompt carries.
+        """
+        period, _ = self.get_time_of_day()
+        return ResponseCache.make_key('chat', message, period, snapshot.digest, history)
 
     def get_greeting(self):
         """Get an enhanced context-aware greeting"""
@@ -234,11 +395,12 @@ class GeminiService:
             
         # TODO: Add more sophisticated datetime parsing
         # For now, expect ISO format or simple patterns
+        # A bare date leaves the time to the free-slot finder
         try:
-            return datetime.strptime(datetime_str, '%Y-%m-%d')
+            return datetime.strptime(datetime_str, '%Y-%m-%d').date()
         except ValueError:
             try:
-                return datetime.strptime(datetime_str, '%I:%M %p')
+                return datetime.combine(now.date(), datetime.strptime(datetime_str, '%I:%M %p').time())
             except ValueError:
                 return None
 
@@ -277,25 +439,97 @@ class GeminiService:
         
         return None  # Not a calendar command
 
-    def get_response(self, message, user_habits=None, progress=None):
+    def get_response(self, message):
         """Generate an enhanced response with calendar integration"""
-        if hasattr(self, 'use_fallback') and self.use_fallback:
-            return self._get_fallback_response(message, user_habits, progress)
+        # Calendar commands run locally, so they work while warming up too
+        calendar_response = self.handle_calendar_command(message)
+        if calendar_response:
+            return calendar_response
+
+        snapshot = prompt_context.snapshot()
+        if self.use_fallback:
+            self.retry_if_failed()
+            return self._get_fallback_response(message, snapshot.habits, snapshot.progress)
             
         try:
-            # First check for calendar commands
-            calendar_response = self.handle_calendar_command(message)
-            if calendar_response:
-                return calendar_response
+            context = self.get_context(snapshot)
+            history = self.format_chat_history()
+            key = self.response_key(message, snapshot, history)
+
+            response_text = response_cache.get(key)
+            if response_text is None:
+                # Generate response
+                response = self.model.generate_content(self.build_prompt(message, context, history))
+                if not response or not response.text:
+                    raise Exception("Empty response from Gemini API")
+
+                response_text = response.text
+                response_cache.put(key, response_text)
+            self.save_chat_history(message, response_text, context)
+            return response_text
 
-            context = self.get_context(user_habits, progress)
-            
-            # Prepare prompt
-            prompt = f"""
+        except Exception as e:
+            self.log_error(f"Error in Gemini service: {str(e)}", e)
+            return self._error_response(e, message, snapshot)
+
+    def stream_response(self, message):
+        """Yield the response in pieces as Gemini generates them
+
+        Calendar commands and fallback answers arrive as a single piece. The
+        exchange is saved to chat_history once the stream completes.
+        """
+        calendar_response = self.handle_calendar_command(message)
+        if calendar_response:
+            yield calendar_response
+            return
+
+        snapshot = prompt_context.snapshot()
+        if self.use_fallback:
+            self.retry_if_failed()
+            yield self._get_fallback_response(message, snapshot.habits, snapshot.progress)
+            return
+
+        parts = []
+        try:
+            context = self.get_context(snapshot)
+            history = self.format_chat_history()
+            key = self.response_key(message, snapshot, history)
+            cached = response_cache.get(key)
+            if cached is not None:
+                parts.append(cached)
+                yield cached
+                self.save_chat_history(message, cached, context)
+                return
+
+            for chunk in self.model.generate_content(self.build_prompt(message, context, history), stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts, e.g. a final safety verdict
+                    continue
+                if text:
+                    parts.append(text)
+                    yield text
+            if not parts:
+                raise Exception("Empty response from Gemini API")
+        except Exception as e:
+            self.log_error(f"Error in Gemini stream: {str(e)}", e)
+            # Text already shown stays; a stream that broke off is not saved
+            if not parts:
+                yield self._error_response(e, message, snapshot)
+            return
+
+        response_text = ''.join(parts)
+        response_cache.put(key, response_text)
+        self.save_chat_history(message, response_text, context)
+
+    def build_prompt(self, message, context, history):
+        """Prompt for one chat message with context and recent history"""
+        return f"""
             Context: {context}
             
             Chat History:
-            {self.format_chat_history()}
+            {history}
             
             User message: {message}
             
@@ -308,115 +542,131 @@ class GeminiService:
             6. Offer to schedule habits when appropriate
             """
 
-            # Generate response
-            response = self.model.generate_content(prompt)
-            if not response or not response.text:
-                raise Exception("Empty response from Gemini API")
-                
-            response_text = response.text
-            self.save_chat_history(message, response_text, context)
-            return response_text
-
-        except Exception as e:
-            error_msg = f"Error in Gemini service: {str(e)}"
-            self.log_error(error_msg, e)
-            
-            if "quota exceeded" in str(e).lower():
-                return "I'm currently busy with too many requests. Please try again in a moment. ⏳"
-            elif "invalid api key" in str(e).lower():
-                return "There seems to be an issue with my configuration. Please contact support. ⚠️"
-            else:
-                return self._get_fallback_response(message, user_habits, progress)
+    def _error_response(self, error, message, snapshot):
+        """Answer to show when a Gemini call failed"""
+        if "quota exceeded" in str(error).lower():
+            return "I'm currently busy with too many requests. Please try again in a moment. ⏳"
+        elif "invalid api key" in str(error).lower():
+            return "There seems to be an issue with my configuration. Please contact support. ⚠️"
+        else:
+            return self._get_fallback_response(message, snapshot.habits, snapshot.progress)
 
     def schedule_habit(self, habit, dt):
         """Schedule a new habit in the calendar"""
-        try:
-            with get_db_connection() as conn:
-                c = conn.cursor()
-                
-                # Check for conflicts
-                c.execute("""
-                    SELECT COUNT(*) FROM calendar_events
-                    WHERE date(start_datetime) = date(?)
-                    AND time(start_datetime) = time(?)
-                """, (dt, dt))
-                
-                if c.fetchone()[0] > 0:
-                    return self.FALLBACK_RESPONSES['schedule']['conflict']
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            try:
+                # Check and insert under the write lock so no other write can
+                # claim the slot in between
+                conn.execute("BEGIN IMMEDIATE")
+                if isinstance(dt, datetime):
+                    day = dt.strftime('%Y-%m-%d')
+                    start_time = dt.strftime('%H:%M')
+                    end_time = end_time_after(start_time)
+
+                    # Check for overlaps with anything already on that day
+                    if interval_index.conflicts(conn, [(day, *as_interval(start_time, end_time))]):
+                        conn.rollback()
+                        return self.FALLBACK_RESPONSES['schedule']['conflict']
+                else:
+                    # No time given: take the first free slot from that day on
+                    slot = first_free_slot(conn, dt.isoformat(), DEFAULT_DURATION_MINUTES)
+                    if not slot:
+                        conn.rollback()
+                        return self.FALLBACK_RESPONSES['schedule']['conflict']
+                    day, start_time, end_time = slot
+                    dt = datetime.strptime(f"{day} {start_time}", '%Y-%m-%d %H:%M')
                 
                 # Add the habit
                 c.execute("""
-                    INSERT INTO habits (date, habit)
-                    VALUES (date(?), ?)
-                """, (dt, habit))
+                    INSERT INTO habits (date, habit, start_time, end_time)
+                    VALUES (?, ?, ?, ?)
+                """, (day, habit, start_time, end_time))
                 habit_id = c.lastrowid
                 
                 # Create calendar event
                 c.execute("""
                     INSERT INTO calendar_events 
-                    (habit_id, title, start_datetime)
-                    VALUES (?, ?, ?)
-                """, (habit_id, habit, dt))
+                    (habit_id, title, start_datetime, end_datetime)
+                    VALUES (?, ?, ?, ?)
+                """, (habit_id, habit, dt, f"{day} {end_time}:00"))
                 
+                habit_changed(conn, habit_id)
                 conn.commit()
-                return self.FALLBACK_RESPONSES['schedule']['success']
+                return f"{self.FALLBACK_RESPONSES['schedule']['success']} {dt.strftime('%a %b %d, %I:%M %p')}"
                 
-        except Exception as e:
-            print(f"Error scheduling habit: {str(e)}")
-            return self.FALLBACK_RESPONSES['schedule']['error']
+            except Exception as e:
+                conn.rollback()
+                print(f"Error scheduling habit: {str(e)}")
+                return self.FALLBACK_RESPONSES['schedule']['error']
 
     def reschedule_habit(self, habit, new_dt):
         """Move an existing habit to a new date/time"""
-        try:
-            with get_db_connection() as conn:
-                c = conn.cursor()
-                
-                # Find the habit
-                c.execute("""
-                    SELECT ce.id, ce.habit_id 
-                    FROM calendar_events ce
-                    JOIN habits h ON h.id = ce.habit_id
-                    WHERE h.habit LIKE ?
-                    ORDER BY ce.start_datetime DESC
-                    LIMIT 1
-                """, (f'%{habit}%',))
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            try:
+                # Find the best-ranked matching habit
+                match = build_match_query(habit, title_only=True)
+                if not match:
+                    return "I couldn't find that habit. Please check the name and try again."
+
+                # Check and move under the write lock so no other write can
+                # claim the slot in between
+                conn.execute("BEGIN IMMEDIATE")
+                c.execute(MATCH_EVENT, (match,))
                 
                 result = c.fetchone()
                 if not result:
+                    conn.rollback()
                     return "I couldn't find that habit. Please check the name and try again."
                 
                 event_id, habit_id = result
                 
-                # Check for conflicts at new time
-                c.execute("""
-                    SELECT COUNT(*) FROM calendar_events
-                    WHERE date(start_datetime) = date(?)
-                    AND time(start_datetime) = time(?)
-                    AND id != ?
-                """, (new_dt, new_dt, event_id))
-                
-                if c.fetchone()[0] > 0:
-                    return self.FALLBACK_RESPONSES['schedule']['conflict']
+                # Keep the habit's length, or give untimed ones the default
+                c.execute("SELECT start_time, end_time FROM habits WHERE id = ?", (habit_id,))
+                old_start, old_end = c.fetchone()
+                current = as_interval(old_start, old_end)
+                duration = current[1] - current[0] if current else DEFAULT_DURATION_MINUTES
+
+                if isinstance(new_dt, datetime):
+                    day = new_dt.strftime('%Y-%m-%d')
+                    start_time = new_dt.strftime('%H:%M')
+                    end_time = end_time_after(start_time, duration)
+
+                    # Check for overlaps with anything else at the new time
+                    if interval_index.conflicts(conn, [(day, *as_interval(start_time, end_time))], exclude=[habit_id]):
+                        conn.rollback()
+                        return self.FALLBACK_RESPONSES['schedule']['conflict']
+                else:
+                    # No time given: move it to the first free slot from that day on
+                    slot = first_free_slot(conn, new_dt.isoformat(), duration)
+                    if not slot:
+                        conn.rollback()
+                        return self.FALLBACK_RESPONSES['schedule']['conflict']
+                    day, start_time, end_time = slot
+                    new_dt = datetime.strptime(f"{day} {start_time}", '%Y-%m-%d %H:%M')
                 
                 # Update both habit and calendar event
                 c.execute("""
                     UPDATE habits 
-                    SET date = date(?)
+                    SET date = ?, start_time = ?, end_time = ?, last_modified = CURRENT_TIMESTAMP
                     WHERE id = ?
-                """, (new_dt, habit_id))
+                """, (day, start_time, end_time, habit_id))
                 
                 c.execute("""
                     UPDATE calendar_events
-                    SET start_datetime = ?
+                    SET start_datetime = ?, end_datetime = ?
                     WHERE id = ?
-                """, (new_dt, event_id))
+                """, (new_dt, f"{day} {end_time}:00", event_id))
                 
+                habit_changed(conn, habit_id)
                 conn.commit()
                 return f"Successfully rescheduled '{habit}' to {new_dt.strftime('%Y-%m-%d %I:%M %p')} 📅"
                 
-        except Exception as e:
-            print(f"Error rescheduling habit: {str(e)}")
-            return "Sorry, I couldn't reschedule that habit. Please try again."
+            except Exception as e:
+                conn.rollback()
+                print(f"Error rescheduling habit: {str(e)}")
+                return "Sorry, I couldn't reschedule that habit. Please try again."
 
     def cancel_habit(self, habit, date=None):
         """Cancel/delete a habit from the calendar"""
@@ -424,29 +674,35 @@ class GeminiService:
             with get_db_connection() as conn:
                 c = conn.cursor()
                 
-                # Build query based on whether date is specified
-                query = """
-                    DELETE FROM calendar_events 
-                    WHERE id IN (
-                        SELECT ce.id
-                        FROM calendar_events ce
-                        JOIN habits h ON h.id = ce.habit_id
-                        WHERE h.habit LIKE ?
-                """
-                params = [f'%{habit}%']
-                
+                match = build_match_query(habit, title_only=True)
+                if not match:
+                    return f"I couldn't find '{habit}' in your calendar."
+
+                conn.execute("BEGIN IMMEDIATE")
+                # With a date, only a habit that occurs on it matches
                 if date:
-                    query += " AND date(ce.start_datetime) = date(?)"
-                    params.append(date)
-                    
-                query += " LIMIT 1)"
+                    c.execute(MATCH_OCCURRENCE, (date, match))
+                else:
+                    c.execute(MATCH_HABIT, (match,))
                 
-                c.execute(query, params)
+                result = c.fetchone()
+                if not result:
+                    conn.rollback()
+                    return f"I couldn't find '{habit}' in your calendar."
                 
-                if c.rowcount > 0:
-                    conn.commit()
-                    return f"Successfully cancelled '{habit}' ✅"
-                return f"I couldn't find '{habit}' in your calendar."
+                habit_id, pattern, occurrence_date = result
+                if occurrence_date and is_recurring(pattern):
+                    # Skip that one occurrence and keep the rest of the series
+                    set_exception(conn, habit_id, occurrence_date, cancelled=True)
+                else:
+                    c.execute("DELETE FROM habit_tracking WHERE habit_id = ?", (habit_id,))
+                    c.execute("DELETE FROM habit_exceptions WHERE habit_id = ?", (habit_id,))
+                    c.execute("DELETE FROM calendar_events WHERE habit_id = ?", (habit_id,))
+                    c.execute("DELETE FROM habits WHERE id = ?", (habit_id,))
+                
+                habit_changed(conn, habit_id)
+                conn.commit()
+                return f"Successfully cancelled '{habit}' ✅"
                 
         except Exception as e:
             print(f"Error cancelling habit: {str(e)}")
@@ -468,16 +724,7 @@ class GeminiService:
                 else:
                     target_date = datetime.now().date()
                 
-                c.execute("""
-                    SELECT h.habit, 
-                           ce.start_datetime,
-                           ce.end_datetime,
-                           ce.all_day
-                    FROM calendar_events ce
-                    JOIN habits h ON h.id = ce.habit_id
-                    WHERE date(ce.start_datetime) = date(?)
-                    ORDER BY ce.start_datetime
-                """, (target_date,))
+                c.execute(DAY_SCHEDULE, (target_date,))
                 
                 events = c.fetchall()
                 
@@ -536,17 +783,17 @@ class GeminiService:
                 upcoming_events = []
                 with get_db_connection() as conn:
                     c = conn.cursor()
-                    c.execute("""
-                        SELECT title, start_datetime
-                        FROM calendar_events
-                        WHERE start_datetime > datetime('now')
-                        ORDER BY start_datetime
-                        LIMIT 1
-                    """)
+                    c.execute(NEXT_EVENT)
                     upcoming = c.fetchone()
                     if upcoming:
                         upcoming_events.append(upcoming)
 
+                upcoming = upcoming_events[0] if upcoming_events else None
+                key = ResponseCache.make_key('encouragement', sentiment, context, upcoming)
+                cached = response_cache.get(key)
+                if cached is not None:
+                    return cached
+
                 prompt = f"""
                 Generate an encouraging message for a habit tracking app user.
                 Sentiment: {sentiment}
@@ -562,7 +809,9 @@ class GeminiService:
                 """
 
                 response = self.model.generate_content(prompt)
-                return response.text.strip()
+                encouragement = response.text.strip()
+                response_cache.put(key, encouragement)
+                return encouragement
 
         except Exception as e:
             print(f"Error generating encouragement: {str(e)}")
@@ -590,6 +839,8 @@ class GeminiService:
             
         # Check for progress/motivation queries
         if any(word in message for word in ['progress', 'track', 'goal', 'achievement']):
+            if progress and 'streak' in progress:
+                return self.FALLBACK_RESPONSES['encouragement']['streak']
             if progress and 'completed' in progress.lower():
                 return self.FALLBACK_RESPONSES['encouragement']['achievement']
             return self.FALLBACK_RESPONSES['motivation']['general']
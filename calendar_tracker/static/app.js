@@ -1,4 +1,12 @@
 document.addEventListener('DOMContentLoaded', function() {
+    // Last response per /habits URL, revalidated with If-None-Match
+    const habitsCache = new Map();
+
+    // Change journal position and window of the events currently shown,
+    // so edits can be applied as deltas instead of full refetches
+    let changeCursor = null;
+    let currentRange = null;
+
     // Calendar initialization with monthly view
     var calendar = new FullCalendar.Calendar(document.getElementById('calendar'), {
         initialView: 'dayGridMonth',
@@ -15,9 +23,33 @@ document.addEventListener('DOMContentLoaded', function() {
                 priority: document.getElementById('filterPriority')?.value || '',
             };
             
+            currentRange = { start: info.startStr, end: info.endStr };
+
             const params = new URLSearchParams(filters);
-            fetch(`/habits?${params.toString()}`)
-                .then(response => response.json())
+            const url = `/habits?${params.toString()}`;
+            const cached = habitsCache.get(url);
+            const headers = cached ? { 'If-None-Match': cached.etag } : {};
+
+            fetch(url, { headers: headers, cache: 'no-store' })
+                .then(response => {
+                    const cursor = response.headers.get('X-Change-Cursor');
+                    if (cursor !== null) {
+                        changeCursor = cursor;
+                    }
+                    if (response.status === 304 && cached) {
+                        return cached.events;
+                    }
+                    if (!response.ok) {
+                        throw new Error(`Failed to load habits (${response.status})`);
+                    }
+                    return response.json().then(events => {
+                        const etag = response.headers.get('ETag');
+                        if (etag) {
+                            habitsCache.set(url, { etag: etag, events: events });
+                        }
+                        return events;
+                    });
+                })
                 .then(events => successCallback(events))
                 .catch(error => failureCallback(error));
         },
@@ -42,6 +74,98 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     calendar.render();
 
+    let syncing = false;
+    let syncPending = false;
+
+    // Pull changes since the last sync and patch them into the calendar
+    function syncChanges() {
+        if (changeCursor === null || !currentRange) {
+            calendar.refetchEvents();
+            return;
+        }
+        // Coalesce bursts (local edits plus pushed notifications) into one follow-up
+        if (syncing) {
+            syncPending = true;
+            return;
+        }
+        syncing = true;
+
+        const params = new URLSearchParams({
+            since: changeCursor,
+            start: currentRange.start,
+            end: currentRange.end,
+            category: document.getElementById('filterCategory')?.value || '',
+            priority: document.getElementById('filterPriority')?.value || '',
+        });
+
+        fetch(`/habits/changes?${params.toString()}`, { cache: 'no-store' })
+            .then(response => response.ok ? response.json() : Promise.reject())
+            .then(data => {
+                if (data.reset) {
+                    changeCursor = null;
+                    calendar.refetchEvents();
+                    return;
+                }
+
+                const source = calendar.getEventSources()[0];
+                calendar.batchRendering(() => {
+                    data.changes.forEach(change => {
+                        removeHabitEvents(change.id);
+                        change.events.forEach(e => calendar.addEvent(e, source));
+                    });
+                });
+
+                changeCursor = data.cursor;
+                if (data.more) {
+                    syncPending = true;
+                }
+            })
+            .catch(() => calendar.refetchEvents())
+            .finally(() => {
+                syncing = false;
+                if (syncPending) {
+                    syncPending = false;
+                    syncChanges();
+                }
+            });
+    }
+
+    function removeHabitEvents(habitId) {
+        calendar.getEvents()
+            .filter(e => e.id === String(habitId))
+            .forEach(e => e.remove());
+    }
+
+    // Live updates: the server pushes a compact list of changed habit ids
+    // whenever a change commits, including ones made through the chatbot
+    if (window.EventSource) {
+        const stream = new EventSource('/events/stream');
+
+        stream.addEventListener('habits', message => {
+            const data = JSON.parse(message.data);
+            if (changeCursor !== null && Number(data.cursor) <= Number(changeCursor)) {
+                return;  // Already applied, e.g. our own edit
+            }
+            // Deletions need no round-trip; everything else is pulled as a delta
+            calendar.batchRendering(() => {
+                data.changes
+                    .filter(change => change.op === 'delete')
+                    .forEach(change => removeHabitEvents(change.id));
+            });
+            if (data.changes.some(change => change.op !== 'delete')) {
+                syncChanges();
+            }
+        });
+
+        stream.addEventListener('reset', () => {
+            changeCursor = null;
+            calendar.refetchEvents();
+        });
+
+        // After a reconnect, catch up on anything the replay could not cover
+        stream.addEventListener('open', () => syncChanges());
+    }
+
     // Event handlers
     function handleEventDrop(info) {
         const event = info.event;
@@ -55,12 +179,19 @@ document.addEventListener('DOMContentLoaded', function() {
                 'id': event.id,
                 'date': newDate,
                 'start_time': newStart,
-                'end_time': newEnd
+                'end_time': newEnd || '',
+                // Recurring events move only the dragged occurrence
+                'occurrence_date': event.extendedProps.occurrenceDate || ''
             })
         }).then(response => {
-            if (!response.ok) {
+            if (response.status === 409) {
+                info.revert();
+                response.json().then(data => showConflict(data.conflicts));
+            } else if (!response.ok) {
                 info.revert();
                 showError('Failed to reschedule');
+            } else {
+                syncChanges();
             }
         });
     }
@@ -75,10 +206,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 'id': event.id,
                 'date': event.start.toISOString().split('T')[0],
                 'start_time': event.start.toTimeString().split(' ')[0].substring(0, 5),
-                'end_time': newEnd
+                'end_time': newEnd,
+                'occurrence_date': event.extendedProps.occurrenceDate || ''
             })
         }).then(response => {
-            if (!response.ok) {
+            if (response.status === 409) {
+                info.revert();
+                response.json().then(data => showConflict(data.conflicts));
+            } else if (!response.ok) {
                 info.revert();
                 showError('Failed to update duration');
             }
@@ -123,23 +258,31 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function deleteEvent(event) {
+        const recurring = event.extendedProps.recurring;
         Swal.fire({
             title: 'Delete Habit?',
-            text: 'This action cannot be undone.',
+            text: recurring
+                ? 'This habit repeats. Delete only this occurrence or the whole series?'
+                : 'This action cannot be undone.',
             icon: 'warning',
             showCancelButton: true,
-            confirmButtonText: 'Yes, delete it',
+            showDenyButton: recurring,
+            confirmButtonText: recurring ? 'Only this one' : 'Yes, delete it',
+            denyButtonText: 'Whole series',
             cancelButtonText: 'Cancel',
             confirmButtonColor: '#dc3545'
         }).then((result) => {
-            if (result.isConfirmed) {
+            if (result.isConfirmed || result.isDenied) {
+                const params = { 'id': event.id };
+                if (recurring && result.isConfirmed) {
+                    params['occurrence_date'] = event.extendedProps.occurrenceDate;
+                }
                 fetch('/removeHabit', {
                     method: 'POST',
-                    body: new URLSearchParams({ 'id': event.id })
+                    body: new URLSearchParams(params)
                 }).then(response => {
                     if (response.ok) {
-                        event.remove();
-                        calendar.refetchEvents();
+                        syncChanges();
                         Swal.fire('Deleted!', 'Habit has been removed.', 'success');
                     }
                 });
@@ -243,6 +386,121 @@ document.addEventListener('DOMContentLoaded', function() {
             this.input.value = '';
             this.input.focus();
 
+            // Stream the answer token by token where fetch exposes the body
+            if (window.ReadableStream && window.TextDecoder) {
+                this.streamMessage(message);
+            } else {
+                this.requestMessage(message);
+            }
+        },
+
+        // Message type for styling; a scheduling answer also resyncs the calendar
+        messageType: function(text) {
+            if (text.includes('scheduled') || text.includes('Schedule')) {
+                syncChanges();
+                return 'calendar';
+            } else if (text.includes('🌟') || text.includes('✨')) {
+                return 'motivation';
+            }
+            return '';
+        },
+
+        showError: function(error) {
+            setTimeout(() => {
+                this.addMessage(
+                    error && error.message && error.message !== 'Chat request failed'
+                        ? error.message
+                        : "I apologize, but I'm having trouble responding right now. Please try again.",
+                    'bot',
+                    'error'
+                );
+            }, 500);
+        },
+
+        streamMessage: function(message) {
+            const typingDiv = document.createElement('div');
+            typingDiv.className = 'typing-indicator';
+            for (let i = 0; i < 3; i++) {
+                const dot = document.createElement('div');
+                dot.className = 'typing-dot';
+                typingDiv.appendChild(dot);
+            }
+            this.messages.appendChild(typingDiv);
+            this.scrollToBottom();
+
+            let messageDiv = null;
+            let result = null;
+            const handleEvent = (block) => {
+                let event = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) {
+                        event = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        data += line.slice(6);
+                    }
+                });
+                if (event === 'token') {
+                    if (!messageDiv) {
+                        typingDiv.remove();
+                        messageDiv = document.createElement('div');
+                        messageDiv.className = 'chat-message bot-message';
+                        this.messages.appendChild(messageDiv);
+                    }
+                    messageDiv.textContent += JSON.parse(data).text;
+                    this.scrollToBottom();
+                } else if (event === 'result') {
+                    result = JSON.parse(data);
+                }
+            };
+
+            fetch('/chat/stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ message: message })
+            })
+            .then(response => {
+                if (!response.ok) {
+                    return response.json().then(data => {
+                        throw new Error(data.error || 'Chat request failed');
+                    });
+                }
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffered = '';
+                const read = () => reader.read().then(({ done, value }) => {
+                    if (done) return result;
+                    buffered += decoder.decode(value, { stream: true });
+                    let end;
+                    while ((end = buffered.indexOf('\n\n')) >= 0) {
+                        handleEvent(buffered.slice(0, end));
+                        buffered = buffered.slice(end + 2);
+                    }
+                    return read();
+                });
+                return read();
+            })
+            .then(result => {
+                typingDiv.remove();
+                if (!result || result.state !== 'done') {
+                    throw new Error('Chat request failed');
+                }
+                const type = this.messageType(result.response);
+                if (!messageDiv) {
+                    this.addMessage(result.response, 'bot', type);
+                } else if (type) {
+                    messageDiv.setAttribute('data-type', type);
+                }
+            })
+            .catch((error) => {
+                typingDiv.remove();
+                this.showError(error);
+            });
+        },
+
+        requestMessage: function(message) {
             fetch('/chat', {
                 method: 'POST',
                 headers: {
@@ -250,27 +508,57 @@ document.addEventListener('DOMContentLoaded', function() {
                 },
                 body: JSON.stringify({ message: message })
             })
-            .then(response => response.json())
+            .then(response => response.json().then(data => {
+                if (!response.ok) {
+                    throw new Error(data.error || 'Chat request failed');
+                }
+                // Gemini answers arrive through a job; fallback ones come back at once
+                return data.job ? this.waitForJob(data) : data;
+            }))
             .then(data => {
                 setTimeout(() => {
-                    let type = '';
-                    if (data.response.includes('scheduled') || data.response.includes('Schedule')) {
-                        type = 'calendar';
-                        calendar.refetchEvents();
-                    } else if (data.response.includes('🌟') || data.response.includes('✨')) {
-                        type = 'motivation';
-                    }
-                    this.addMessage(data.response, 'bot', type);
+                    this.addMessage(data.response, 'bot', this.messageType(data.response));
                 }, 500);
             })
-            .catch(() => {
-                setTimeout(() => {
-                    this.addMessage(
-                        "I apologize, but I'm having trouble responding right now. Please try again.",
-                        'bot',
-                        'error'
-                    );
-                }, 500);
+            .catch((error) => this.showError(error));
+        },
+
+        // Resolve with a finished chat job, streaming it when possible
+        waitForJob: function(job) {
+            return new Promise((resolve, reject) => {
+                const finish = (result) => {
+                    if (result.state === 'done') {
+                        resolve(result);
+                    } else {
+                        reject(new Error('Chat request failed'));
+                    }
+                };
+                const poll = () => {
+                    fetch(job.poll)
+                        .then(response => response.json())
+                        .then(result => {
+                            if (result.state === 'queued' || result.state === 'running') {
+                                setTimeout(poll, 1000);
+                            } else {
+                                finish(result);
+                            }
+                        })
+                        .catch(reject);
+                };
+
+                if (!window.EventSource) {
+                    poll();
+                    return;
+                }
+                const source = new EventSource(job.stream);
+                source.addEventListener('result', (e) => {
+                    source.close();
+                    finish(JSON.parse(e.data));
+                });
+                source.onerror = () => {
+                    source.close();
+                    poll();
+                };
             });
         },
 
@@ -340,13 +628,33 @@ document.addEventListener('DOMContentLoaded', function() {
             };
             formData.append('color', categoryColors[category] || '#1e40af');
 
-            fetch('/addHabit', {
+            const submit = () => fetch('/addHabit', {
                 method: 'POST',
                 body: formData
             })
-            .then(response => response.ok ? response : Promise.reject())
+            .then(response => {
+                if (response.status !== 409) {
+                    return response.ok ? response : Promise.reject();
+                }
+                // Overlaps need an explicit confirmation
+                return response.json().then(data => Swal.fire({
+                    icon: 'warning',
+                    title: 'Time conflict',
+                    text: `Overlaps with ${describeConflicts(data.conflicts)}. Add it anyway?`,
+                    showCancelButton: true,
+                    confirmButtonText: 'Add anyway'
+                })).then(result => {
+                    if (!result.isConfirmed) {
+                        return Promise.reject('cancelled');
+                    }
+                    formData.set('allow_conflict', '1');
+                    return submit();
+                });
+            });
+
+            submit()
             .then(() => {
-                calendar.refetchEvents();
+                syncChanges();
                 habitForm.reset();
                 document.getElementById('date').valueAsDate = new Date();
                 
@@ -358,10 +666,24 @@ document.addEventListener('DOMContentLoaded', function() {
                     showConfirmButton: false
                 });
             })
-            .catch(() => showError('Failed to add habit'));
+            .catch(reason => {
+                if (reason !== 'cancelled') {
+                    showError('Failed to add habit');
+                }
+            });
         });
     }
 
+    function describeConflicts(conflicts) {
+        const first = conflicts[0];
+        const more = conflicts.length > 1 ? ` and ${conflicts.length - 1} more` : '';
+        return `"${first.title}" (${first.date} ${first.start}–${first.end})${more}`;
+    }
+
+    function showConflict(conflicts) {
+        showError(`That time overlaps ${describeConflicts(conflicts)}`);
+    }
+
     function showError(message) {
         Swal.fire({
             icon: 'error',
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Modules import each other as top-level names, and utils opens its pool on
+# DATABASE_PATH at import time, so both are set before any test module loads
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(), 'test.db')
+# Keep the app in fallback chat mode rather than reaching the Gemini API
+os.environ['GEMINI_API_KEY'] = ''
+
+@pytest.fixture(scope='session')
+def app():
+    """The Flask app on the test database, without the reminder thread"""
+    from app import app
+    import reminders
+    reminders.reminder_scheduler.stop()
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def conn(app):
+    from utils import get_db_connection
+    with get_db_connection() as conn:
+        yield conn
+
+@pytest.fixture
+def gemini(app, monkeypatch):
+    """A GeminiService that never warms up, for the chat-driven calendar writes"""
+    from services.gemini_service import GeminiService
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key-not-used')
+    return GeminiService(warm=False)
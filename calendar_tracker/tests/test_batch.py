@@ -0,0 +1,96 @@
+def add_gym(client, day):
+    response = client.post('/addHabit', data={
+        'date': day, 'habit': 'Gym', 'start_time': '09:00', 'end_time': '10:00',
+    })
+    assert response.status_code == 200
+    return response.get_json()['id']
+
+def test_batch_create_over_an_existing_habit_is_rejected(client):
+    add_gym(client, '2026-10-20')
+    assert client.post('/addHabit', data={
+        'date': '2026-10-20', 'habit': 'Call', 'start_time': '09:30', 'end_time': '09:45',
+    }).status_code == 409
+
+    response = client.post('/habits/batch', json={'operations': [
+        {'op': 'create', 'habit': 'Swim', 'date': '2026-10-20', 'start_time': '09:00', 'end_time': '10:00'},
+    ]})
+    assert response.status_code == 400
+    error = response.get_json()['errors'][0]
+    assert error['index'] == 0 and error['error'] == 'Time conflict'
+    assert error['conflicts'][0]['title'] == 'Gym'
+
+def test_batch_allow_conflict_per_op_and_per_batch(client):
+    add_gym(client, '2026-10-21')
+    create = {'op': 'create', 'habit': 'Swim', 'date': '2026-10-21', 'start_time': '09:00', 'end_time': '10:00'}
+
+    response = client.post('/habits/batch', json={'operations': [dict(create, allow_conflict=True)]})
+    assert response.status_code == 200
+    response = client.post('/habits/batch', json={'operations': [create], 'allow_conflict': True})
+    assert response.status_code == 200
+
+def test_batch_ops_conflicting_with_each_other_are_rejected(client):
+    response = client.post('/habits/batch', json={'operations': [
+        {'op': 'create', 'habit': 'Read', 'date': '2026-10-22', 'start_time': '18:00', 'end_time': '19:00'},
+        {'op': 'create', 'habit': 'Cook', 'date': '2026-10-22', 'start_time': '18:30', 'end_time': '19:30'},
+    ]})
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['errors']] == [0, 1]
+
+def test_batch_reschedule_into_a_slot_freed_by_the_batch(client):
+    gym = add_gym(client, '2026-10-23')
+    other = client.post('/habits/batch', json={'operations': [
+        {'op': 'create', 'habit': 'Walk', 'date': '2026-10-23', 'start_time': '12:00', 'end_time': '13:00'},
+    ]}).get_json()['results'][0]['id']
+
+    response = client.post('/habits/batch', json={'operations': [
+        {'op': 'reschedule', 'id': other, 'date': '2026-10-23', 'start_time': '09:00', 'end_time': '10:00'},
+    ]})
+    assert response.status_code == 400
+
+    response = client.post('/habits/batch', json={'operations': [
+        {'op': 'delete', 'id': gym},
+        {'op': 'reschedule', 'id': other, 'date': '2026-10-23', 'start_time': '09:00', 'end_time': '10:00'},
+    ]})
+    assert response.status_code == 200
+
+def add_series(client, day, title, start_time, end_time):
+    response = client.post('/addHabit', data={
+        'date': day, 'habit': title, 'start_time': start_time, 'end_time': end_time,
+        'recurrence': 'FREQ=DAILY;COUNT=3',
+    })
+    assert response.status_code == 200
+    return response.get_json()['id']
+
+def test_batch_ops_take_effect_in_index_order(client):
+    series = add_series(client, '2026-10-26', 'Stretch', '04:10', '04:40')
+
+    response = client.post('/habits/batch', json={'operations': [
+        {'op': 'delete', 'id': series, 'occurrence_date': '2026-10-27'},
+        {'op': 'reschedule', 'id': series, 'occurrence_date': '2026-10-27',
+         'date': '2026-10-27', 'start_time': '05:10', 'end_time': '05:40'},
+    ]})
+    assert response.status_code == 200
+    assert [result['index'] for result in response.get_json()['results']] == [0, 1]
+
+    events = client.get('/habits?start=2026-10-26&end=2026-10-29').get_json()
+    assert [event['start'][:16] for event in events if event['id'] == series] == [
+        '2026-10-26T04:10', '2026-10-27T05:10', '2026-10-28T04:10',
+    ]
+
+def test_batch_occurrence_move_only_frees_its_own_day(client):
+    series = add_series(client, '2026-10-29', 'Journal', '04:10', '04:40')
+
+    # Later the same morning: only its own old slot is free
+    response = client.post('/habits/batch', json={'operations': [
+        {'op': 'reschedule', 'id': series, 'occurrence_date': '2026-10-29',
+         'date': '2026-10-29', 'start_time': '04:20', 'end_time': '04:50'},
+    ]})
+    assert response.status_code == 200
+
+    # Onto the next day's occurrence of the same series
+    response = client.post('/habits/batch', json={'operations': [
+        {'op': 'reschedule', 'id': series, 'occurrence_date': '2026-10-29',
+         'date': '2026-10-30', 'start_time': '04:10', 'end_time': '04:40'},
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['conflicts'][0]['date'] == '2026-10-30'
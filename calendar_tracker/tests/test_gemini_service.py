@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+def add_habit(client, day, title, start_time='09:00', end_time='10:00', **fields):
+    response = client.post('/addHabit', data=dict(
+        date=day, habit=title, start_time=start_time, end_time=end_time, **fields
+    ))
+    assert response.status_code == 200
+    return response.get_json()['id']
+
+def habit_ids(client, start, end):
+    response = client.get(f'/habits?start={start}&end={end}')
+    assert response.status_code == 200
+    return [event['id'] for event in response.get_json()]
+
+def test_chat_cancel_removes_the_habit_from_habits(client, gemini):
+    habit_id = add_habit(client, '2026-11-02', 'Dentist')
+    assert habit_id in habit_ids(client, '2026-11-02', '2026-11-03')
+
+    assert gemini.cancel_habit('Dentist').startswith('Successfully cancelled')
+    assert habit_id not in habit_ids(client, '2026-11-02', '2026-11-03')
+
+def test_chat_cancel_on_a_date_skips_one_occurrence(client, gemini):
+    habit_id = add_habit(client, '2026-11-09', 'Piano', recurrence='daily')
+
+    assert gemini.cancel_habit('Piano', '2026-11-10').startswith('Successfully cancelled')
+    days = [
+        event['start'][:10] for event in client.get('/habits?start=2026-11-09&end=2026-11-12').get_json()
+        if event['id'] == habit_id
+    ]
+    assert days == ['2026-11-09', '2026-11-11']
+
+def test_chat_cancel_journals_a_tombstone(client, gemini):
+    habit_id = add_habit(client, '2026-11-16', 'Haircut', '13:00', '14:00')
+    cursor = client.get('/habits?start=2026-11-16&end=2026-11-17').headers['X-Change-Cursor']
+
+    gemini.cancel_habit('Haircut')
+    response = client.get(f'/habits/changes?since={cursor}&start=2026-11-16&end=2026-11-17')
+    assert response.get_json()['changes'] == [{'id': habit_id, 'op': 'delete', 'events': []}]
+
+def test_chat_cancel_reaches_event_stream_subscribers(client, conn, gemini):
+    from broker import Broker
+    from journal import current_cursor
+    habit_id = add_habit(client, '2026-11-24', 'Tailor', '15:00', '16:00')
+    feed = Broker()
+    subscription = feed.subscribe()
+    since = current_cursor(conn)
+    conn.commit()
+
+    gemini.cancel_habit('Tailor', '2026-11-24')
+    feed._poll(conn, since)
+    _, event, data = subscription.queue.get_nowait()
+    assert event == 'habits'
+    assert {'id': habit_id, 'op': 'delete'} in data['changes']
+
+def test_chat_scheduling_checks_conflicts_under_the_write_lock(client, gemini, monkeypatch):
+    import os
+    import sqlite3
+    from services import gemini_service
+    from intervals import interval_index
+    locked = []
+
+    class Probe:
+        """Tries to take the write lock from another connection during the check"""
+        def conflicts(self, conn, slots, exclude=()):
+            other = sqlite3.connect(os.environ['DATABASE_PATH'], timeout=0)
+            try:
+                other.execute("BEGIN IMMEDIATE")
+                other.rollback()
+                locked.append(False)
+            except sqlite3.OperationalError:
+                locked.append(True)
+            finally:
+                other.close()
+            return interval_index.conflicts(conn, slots, exclude)
+
+    monkeypatch.setattr(gemini_service, 'interval_index', Probe())
+    start = datetime(2026, 11, 30, 18, 0)
+    assert gemini.schedule_habit('Choir', start).startswith(gemini.FALLBACK_RESPONSES['schedule']['success'])
+    assert gemini.reschedule_habit('Choir', start + timedelta(hours=2)).startswith('Successfully rescheduled')
+    assert locked == [True, True]
+
+def test_cached_chat_replies_are_keyed_on_the_chat_history(gemini, monkeypatch):
+    from types import SimpleNamespace
+    prompts = []
+
+    class Model:
+        def generate_content(self, prompt):
+            prompts.append(prompt)
+            return SimpleNamespace(text=f'Reply {len(prompts)}')
+
+    gemini.model = Model()
+    gemini.chat = SimpleNamespace(history=[])
+    gemini.use_fallback = False
+    monkeypatch.setattr(gemini, 'save_chat_history', lambda *args: None)
+
+    message = 'what should I practise this evening'
+    assert gemini.get_response(message) == 'Reply 1'
+    assert gemini.get_response(message) == 'Reply 1'
+
+    gemini.chat.history += [
+        {'role': 'user', 'parts': ['I skipped piano yesterday']},
+        {'role': 'model', 'parts': ['No worries, pick it up today']},
+    ]
+    assert gemini.get_response(message) == 'Reply 2'
+    assert 'User: I skipped piano yesterday' in prompts[-1]
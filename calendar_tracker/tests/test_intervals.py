@@ -0,0 +1,17 @@
+from intervals import interval_index
+
+def test_conflict_checks_inside_write_transactions_reuse_cached_days(client):
+    assert client.post('/addHabit', data={
+        'date': '2026-12-07', 'habit': 'Standup', 'start_time': '06:00', 'end_time': '06:30',
+    }).status_code == 200
+
+    attempt = {'date': '2026-12-07', 'habit': 'Sync', 'start_time': '06:15', 'end_time': '06:45'}
+    assert client.post('/addHabit', data=attempt).status_code == 409
+    hits = interval_index.stats()['hits']
+    assert client.post('/addHabit', data=attempt).status_code == 409
+    assert interval_index.stats()['hits'] == hits + 1
+
+def test_a_write_drops_the_cached_day(client):
+    attempt = {'date': '2026-12-08', 'habit': 'Review', 'start_time': '05:00', 'end_time': '05:30'}
+    assert client.post('/addHabit', data=attempt).status_code == 200
+    assert client.post('/addHabit', data=attempt).status_code == 409
@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+from occurrences import HORIZON_FUTURE_DAYS, extend_horizon, get_horizon
+
+def test_extend_horizon_schedules_reminders_for_new_occurrences(conn):
+    today = date(2026, 10, 18)
+    old_end = (today + timedelta(days=30)).isoformat()
+    c = conn.cursor()
+    c.execute("""
+        INSERT INTO habits (date, habit, start_time, end_time, recurrence_pattern, reminder_time)
+        VALUES (?, 'Stretch', '08:00', '08:15', 'weekly', '15min')
+    """, (today.isoformat(),))
+    habit_id = c.lastrowid
+    c.execute("UPDATE occurrence_horizon SET horizon_end = ? WHERE id = 1", (old_end,))
+    conn.commit()
+
+    assert extend_horizon(conn, today)
+    assert get_horizon(conn)[1] == (today + timedelta(days=HORIZON_FUTURE_DAYS)).isoformat()
+
+    c.execute("""
+        SELECT occurrence_date, fire_at FROM reminders
+        WHERE habit_id = ? AND occurrence_date >= ? ORDER BY occurrence_date
+    """, (habit_id, old_end))
+    reminders = c.fetchall()
+    assert len(reminders) > 50
+    first_date, fire_at = reminders[0]
+    assert fire_at == f"{first_date} 07:45:00"
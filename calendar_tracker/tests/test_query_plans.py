@@ -0,0 +1,8 @@
+from query_plans import find_full_scans
+
+def test_hot_queries_use_an_index(conn):
+    assert find_full_scans(conn) == {}
+
+def test_a_table_scan_is_reported(conn):
+    scan = {'unindexed': ("SELECT id FROM habits WHERE description = ?", ('notes',))}
+    assert list(find_full_scans(conn, scan)) == ['unindexed']
@@ -0,0 +1,30 @@
+from recurrence import expand_habit
+
+def monthly_habit(pattern, base_date='2026-01-15'):
+    return {
+        'id': 1,
+        'date': base_date,
+        'recurrence_pattern': pattern,
+        'start_time': '09:00',
+        'end_time': '09:30',
+        'last_modified': '2026-01-01 00:00:00',
+    }
+
+def test_monthly_mixed_positive_and_negative_bymonthday():
+    habit = monthly_habit('FREQ=MONTHLY;BYMONTHDAY=15,-1')
+
+    window = expand_habit(habit, (), '2026-11-01', '2026-11-20')
+    assert [o.date for o in window] == ['2026-11-15']
+
+    window = expand_habit(habit, (), '2026-11-01', '2027-01-01')
+    assert [o.date for o in window] == ['2026-11-15', '2026-11-30', '2026-12-15', '2026-12-31']
+
+def test_monthly_bymonthday_resolving_to_the_same_day_yields_it_once():
+    habit = monthly_habit('FREQ=MONTHLY;BYMONTHDAY=28,-1')
+    window = expand_habit(habit, (), '2027-02-01', '2027-03-01')
+    assert [o.date for o in window] == ['2027-02-28']
+
+def test_monthly_count_is_not_cut_short_by_negative_bymonthday():
+    habit = monthly_habit('FREQ=MONTHLY;BYMONTHDAY=-1,10;COUNT=3', base_date='2026-01-01')
+    window = expand_habit(habit, (), '2026-01-01', '2026-12-31')
+    assert [o.date for o in window] == ['2026-01-10', '2026-01-31', '2026-02-10']
@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+import rollups
+from mutations import habit_changed
+
+def streak_rows(conn):
+    c = conn.cursor()
+    c.execute("""
+        SELECT habit_id, current_streak, longest_streak, streak_through, next_due, last_completed
+        FROM rollup_habits ORDER BY habit_id
+    """)
+    habits = c.fetchall()
+    c.execute("SELECT current_streak, longest_streak, streak_through FROM rollup_streak")
+    return habits, c.fetchall()
+
+def recomputed_rows(conn):
+    """Streaks as a full recompute leaves them, without keeping the recompute"""
+    c = conn.cursor()
+    c.execute("SAVEPOINT recompute")
+    c.execute("SELECT habit_id FROM rollup_habits")
+    rollups.refresh_streaks(conn, [row[0] for row in c.fetchall()])
+    rollups.refresh_overall_streak(conn)
+    rows = streak_rows(conn)
+    c.execute("ROLLBACK TO recompute")
+    c.execute("RELEASE recompute")
+    return rows
+
+def test_completions_update_streaks_like_a_full_recompute(conn):
+    today = date.today()
+    c = conn.cursor()
+    c.execute("""
+        INSERT INTO habits (date, habit, start_time, end_time, recurrence_pattern)
+        VALUES (?, 'Read', '21:00', '21:30', 'daily')
+    """, ((today - timedelta(days=20)).isoformat(),))
+    habit_id = c.lastrowid
+    habit_changed(conn, habit_id)
+
+    # Run up to today, a gap, a backfill that bridges it, then a break inside the run
+    steps = [(-10, True), (-9, True), (-7, True), (-6, True), (-5, True), (-4, True),
+             (-3, True), (-2, True), (-1, True), (0, True), (-8, True), (-4, False),
+             (-9, False), (-4, True), (0, False)]
+    for offset, completed in steps:
+        day = (today + timedelta(days=offset)).isoformat()
+        rollups.set_completion(conn, habit_id, day, completed)
+        assert streak_rows(conn) == recomputed_rows(conn)
+    conn.rollback()
+
+def test_completing_the_next_due_day_extends_the_streak(conn):
+    today = date.today()
+    c = conn.cursor()
+    c.execute("""
+        INSERT INTO habits (date, habit, start_time, end_time, recurrence_pattern)
+        VALUES (?, 'Walk', '07:00', '07:30', 'daily')
+    """, ((today - timedelta(days=2)).isoformat(),))
+    habit_id = c.lastrowid
+    habit_changed(conn, habit_id)
+
+    for offset in (-2, -1, 0):
+        rollups.set_completion(conn, habit_id, (today + timedelta(days=offset)).isoformat())
+    c.execute("""
+        SELECT current_streak, longest_streak, streak_through, next_due
+        FROM rollup_habits WHERE habit_id = ?
+    """, (habit_id,))
+    assert c.fetchone() == (3, 3, today.isoformat(), (today + timedelta(days=1)).isoformat())
+    conn.rollback()
+
+def test_future_completions_do_not_count_toward_the_overall_streak(client, conn):
+    today = date.today()
+    response = client.post('/addHabit', data={
+        'date': (today + timedelta(days=2)).isoformat(), 'habit': 'Plan trip',
+    })
+    habit_id = response.get_json()['id']
+    response = client.post('/completeHabit', data={'id': habit_id})
+    assert response.status_code == 400
+
+    before = streak_rows(conn)[1]
+    rollups.set_completion(conn, habit_id, (today + timedelta(days=2)).isoformat())
+    assert streak_rows(conn)[1] == before == recomputed_rows(conn)[1]
+    conn.rollback()
@@ -1,15 +1,176 @@
 from contextlib import contextmanager
+import os
+import queue
 import sqlite3
+import threading
+import time
 from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Database location - absolute so routes, services and scripts share one file
+# regardless of the working directory they were started from
+DATABASE_PATH = os.path.abspath(
+    os.getenv('DATABASE_PATH')
+    or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habits.db')
+)
+
+# Production pragmas applied once per physical connection
+DB_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.getenv('DB_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.getenv('DB_CACHE_SIZE', -20000)),  # negative = KiB
+    'busy_timeout': int(os.getenv('DB_BUSY_TIMEOUT', 5000)),
+    'temp_store': 'MEMORY',
+}
+
+class ConnectionPool:
+    """Bounded pool of tuned SQLite connections shared across worker threads.
+
+    A thread that already holds a connection gets the same one back on nested
+    use, so helpers can open a connection inside a route without deadlocking
+    the pool or splitting one request across several transactions.
+    """
+
+    def __init__(self, path, max_size=8, timeout=30.0):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'reentrant': 0,
+        }
+
+    def _connect(self):
+        """Open a new connection and apply the pragmas"""
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        for pragma, value in DB_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def _checkout(self):
+        """Take an idle connection, open a new one, or wait for one to be released"""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats['hits'] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+                self._stats['misses'] += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._stats['waits'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return conn
+
+    def _release(self, conn):
+        """Return a connection to the pool, discarding any unfinished transaction"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the with block"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            with self._lock:
+                self._stats['reentrant'] += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_connections'] = self._created
+        stats['idle_connections'] = self._idle.qsize()
+        stats['max_size'] = self.max_size
+        checkouts = stats['hits'] + stats['misses'] + stats['waits']
+        stats['hit_ratio'] = round(stats['hits'] / checkouts, 4) if checkouts else 0.0
+        stats['wait_time_avg'] = (
+            stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        )
+        stats['database'] = self.path
+        return stats
+
+    def close_all(self):
+        """Close every idle connection (used at shutdown and in scripts)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+db_pool = ConnectionPool(
+    DATABASE_PATH,
+    max_size=int(os.getenv('DB_POOL_SIZE', 8)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+)
 
-@contextmanager
 def get_db_connection():
-    """Database connection context manager"""
-    conn = sqlite3.connect('habits.db')
-    try:
-        yield conn
-    finally:
-        conn.close()
+    """Database connection context manager backed by the shared pool"""
+    return db_pool.connection()
+
+def get_pool_stats():
+    """Connection pool hit/miss and wait-time statistics"""
+    return db_pool.stats()
 
 def analyze_sentiment(message):
     """Analyze message sentiment using keyword matching"""
@@ -0,0 +1,109 @@
+import hashlib
+from datetime import datetime, timezone
+
+# Change counters for calendar data, bumped by triggers. One-off habits bump
+# the counter for their month; recurring series and their exceptions can
+# touch any month, so they bump the '*' counter that every range includes.
+SERIES_KEY = '*'
+
+def create_version_tracking(c):
+    """Create the calendar_versions counters and the triggers that bump them"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS calendar_versions (
+            month TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    bump = '''
+        INSERT INTO calendar_versions (month, version, changed_at)
+        VALUES ({key}, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (month) DO UPDATE SET
+            version = version + 1,
+            changed_at = excluded.changed_at;
+    '''
+    habit_key = "CASE WHEN COALESCE({row}.recurrence_pattern, '') != '' THEN '*' ELSE substr({row}.date, 1, 7) END"
+
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS calendar_version_habit_insert AFTER INSERT ON habits BEGIN
+            {bump.format(key=habit_key.format(row='new'))}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS calendar_version_habit_update AFTER UPDATE ON habits BEGIN
+            {bump.format(key=habit_key.format(row='old'))}
+            {bump.format(key=habit_key.format(row='new'))}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS calendar_version_habit_delete AFTER DELETE ON habits BEGIN
+            {bump.format(key=habit_key.format(row='old'))}
+        END
+    ''')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS calendar_version_exception_{event.lower()}
+            AFTER {event} ON habit_exceptions BEGIN
+                {bump.format(key="'*'")}
+            END
+        ''')
+
+    c.execute("INSERT OR IGNORE INTO calendar_versions (month, version) VALUES ('*', 0)")
+
+def create_change_counter(c, counter, table):
+    """Create a one-row change counter and the triggers that bump it on every write to table"""
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS {counter} (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute(f"INSERT OR IGNORE INTO {counter} (id, version) VALUES (1, 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {counter}_{event.lower()}
+            AFTER {event} ON {table} BEGIN
+                UPDATE {counter} SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+def create_tracking_version(c):
+    """Create the change counter for habit_tracking and the triggers that bump it"""
+    create_change_counter(c, 'tracking_version', 'habit_tracking')
+
+def create_event_version(c):
+    """Create the change counter for calendar_events and the triggers that bump it"""
+    create_change_counter(c, 'event_version', 'calendar_events')
+
+def tracking_version(conn):
+    """Current habit_tracking change counter"""
+    c = conn.cursor()
+    c.execute("SELECT version FROM tracking_version WHERE id = 1")
+    row = c.fetchone()
+    return row[0] if row else 0
+
+def range_version(conn, window_start=None, window_end=None):
+    """(version token, last change time) for the months a window touches"""
+    c = conn.cursor()
+    if window_start and window_end:
+        c.execute("""
+            SELECT month, version, changed_at FROM calendar_versions
+            WHERE month = ? OR (month >= ? AND month <= ?)
+            ORDER BY month
+        """, (SERIES_KEY, window_start[:7], window_end[:7]))
+    else:
+        c.execute("SELECT month, version, changed_at FROM calendar_versions ORDER BY month")
+    rows = c.fetchall()
+
+    token = ';'.join(f"{month}:{version}" for month, version, _ in rows)
+    changed = max((changed_at for _, _, changed_at in rows if changed_at), default=None)
+    last_modified = None
+    if changed:
+        last_modified = datetime.strptime(changed, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return token, last_modified
+
+def make_etag(token, *parts):
+    """Strong ETag over a version token and the request parameters that shape the body"""
+    digest = hashlib.sha1('|'.join([token, *(str(part) for part in parts)]).encode('utf-8'))
+    return digest.hexdigest()[:20]